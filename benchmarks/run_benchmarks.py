@@ -0,0 +1,207 @@
+"""
+Benchmarks for the boundingbox queries.
+
+Sweeps the number of targets, the radius, N, the source (equator, mid-latitude, near-pole, antimeridian)
+and uniform vs clustered targets, over get_points_within_distance, get_closest_points and the construction
+of a BoundingBox, times the import of the package, and writes the timings as JSON. Given a baseline JSON written by an earlier run,
+the benchmarks which got slower than the threshold are reported and the exit code is 1.
+
+    python -m benchmarks.run_benchmarks --output benchmarks.json
+    python -m benchmarks.run_benchmarks --sizes 1000 1000000 --baseline benchmarks.json
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from boundingbox.boundingbox import BoundingBox
+from boundingbox.distances import get_points_within_distance, get_closest_points
+from boundingbox.settings import INDICES
+
+SOURCES = {
+    'equator': (0.0, 0.0),
+    'mid_latitude': (48.8566, 2.3522),
+    'near_pole': (89.5, 45.0),
+    'antimeridian': (18.1248, 179.9),
+}
+UNIFORM = 'uniform'
+CLUSTERED = 'clustered'
+DISTRIBUTIONS = [UNIFORM, CLUSTERED]
+
+DEFAULT_SIZES = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]
+DEFAULT_LENGTHS = [10, 100, 1000]
+DEFAULT_NS = [1, 10, 100]
+DEFAULT_REPEAT = 5
+IMPORT_MODULES = ['boundingbox.boundingbox', 'boundingbox.distances']
+DEFAULT_THRESHOLD = 1.2
+# slowdowns smaller than this many seconds are timer noise rather than regressions
+DEFAULT_MIN_DIFFERENCE = 1e-4
+
+# the parameters which identify a benchmark, as opposed to its measurements
+KEY_FIELDS = ['benchmark', 'size', 'distribution', 'source', 'length', 'N']
+
+
+def make_targets(size, distribution, random):
+    """
+    :param size: number of targets
+    :param distribution: UNIFORM, uniform on the sphere, or CLUSTERED, gaussian clusters of about 50 km
+    around random centres and around each of SOURCES
+    :param random: np.random.RandomState
+    :return: np array of shape (size, 2) of lat-lon pairs in degrees
+    """
+    if distribution == UNIFORM:
+        lats = np.degrees(np.arcsin(random.uniform(-1, 1, size)))
+        lons = random.uniform(-180, 180, size)
+        return np.column_stack((lats, lons))
+
+    centres = np.concatenate((np.array(list(SOURCES.values())),
+                              make_targets(50, UNIFORM, random)))
+    cluster = random.randint(len(centres), size=size)
+    lats = np.clip(centres[cluster, 0] + random.normal(0, 0.5, size), -90, 90)
+    lons = (centres[cluster, 1] + random.normal(0, 0.5, size) + 180) % 360 - 180
+    return np.column_stack((lats, lons))
+
+
+def time_call(function, repeat):
+    """
+    :param function: called without arguments
+    :param repeat: number of timed calls
+    :return: (timings, result), a dict with the min and median wall time in seconds, and the last result
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - start)
+    return {'min': min(durations), 'median': float(np.median(durations))}, result
+
+
+def time_import(module, repeat):
+    """
+    Each import runs in a fresh interpreter, after numpy has been imported, so only the cost of the package
+    itself is measured.
+    :param module: name of the module to import
+    :param repeat: number of timed imports
+    :return: dict with the min and median import time in seconds
+    """
+    code = ('import time, numpy; start = time.perf_counter(); import {}; '
+            'print(time.perf_counter() - start)'.format(module))
+    durations = [float(subprocess.check_output([sys.executable, '-c', code])) for _ in range(repeat)]
+    return {'min': min(durations), 'median': float(np.median(durations))}
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, lengths=DEFAULT_LENGTHS, Ns=DEFAULT_NS, sources=tuple(SOURCES),
+                   distributions=DISTRIBUTIONS, repeat=DEFAULT_REPEAT, seed=0):
+    """
+    :return: list of dicts, one per benchmark, with the KEY_FIELDS, the timings and the number of results
+    """
+    records = []
+    for module in IMPORT_MODULES:
+        records.append(dict(benchmark='import ' + module, size=None, distribution=None, source=None,
+                            length=None, N=None, results=None, **time_import(module, repeat)))
+
+    for source_name in sources:
+        source = SOURCES[source_name]
+        for length in lengths:
+            timings, _ = time_call(lambda: BoundingBox(source, length), repeat)
+            records.append(dict(benchmark='BoundingBox', size=None, distribution=None, source=source_name,
+                                length=length, N=None, results=None, **timings))
+
+    for distribution in distributions:
+        for size in sizes:
+            targets = make_targets(size, distribution, np.random.RandomState(seed))
+            for source_name in sources:
+                source = SOURCES[source_name]
+                for length in lengths:
+                    timings, (indices, _) = time_call(lambda: get_points_within_distance(
+                        source, targets, length, return_format=INDICES), repeat)
+                    records.append(dict(benchmark='get_points_within_distance', size=size,
+                                        distribution=distribution, source=source_name, length=length, N=None,
+                                        results=len(indices), **timings))
+                for N in Ns:
+                    timings, (indices, _) = time_call(lambda: get_closest_points(
+                        source, targets, N, return_format=INDICES), repeat)
+                    records.append(dict(benchmark='get_closest_points', size=size, distribution=distribution,
+                                        source=source_name, length=None, N=N, results=len(indices), **timings))
+    return records
+
+
+def benchmark_key(record):
+    return tuple(record[field] for field in KEY_FIELDS)
+
+
+def compare_results(records, baseline_records, threshold=DEFAULT_THRESHOLD, min_difference=DEFAULT_MIN_DIFFERENCE):
+    """
+    :param records: list of benchmark dicts
+    :param baseline_records: list of benchmark dicts from an earlier run
+    :param threshold: a benchmark regressed when its min time exceeds threshold times the baseline min time
+    :param min_difference: and when it exceeds the baseline min time by more than this many seconds
+    :return: list of dicts with the KEY_FIELDS, the baseline and current min times and their ratio,
+    for the benchmarks which regressed
+    """
+    baseline = {benchmark_key(record): record for record in baseline_records}
+    regressions = []
+    for record in records:
+        previous = baseline.get(benchmark_key(record))
+        if previous is None or previous['min'] <= 0:
+            continue
+        ratio = record['min'] / previous['min']
+        if ratio > threshold and record['min'] - previous['min'] > min_difference:
+            regression = {field: record[field] for field in KEY_FIELDS}
+            regression.update(baseline_min=previous['min'], min=record['min'], ratio=ratio)
+            regressions.append(regression)
+    return regressions
+
+
+def environment():
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='numbers of targets, up to 10**8 given enough memory')
+    parser.add_argument('--lengths', type=float, nargs='+', default=DEFAULT_LENGTHS, help='radii in km')
+    parser.add_argument('--Ns', type=int, nargs='+', default=DEFAULT_NS, help='numbers of closest points')
+    parser.add_argument('--sources', nargs='+', choices=list(SOURCES), default=list(SOURCES))
+    parser.add_argument('--distributions', nargs='+', choices=DISTRIBUTIONS, default=DISTRIBUTIONS)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSON file for the results')
+    parser.add_argument('--baseline', help='JSON file of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='slowdown ratio of the min time flagged as a regression')
+    parser.add_argument('--min-difference', type=float, default=DEFAULT_MIN_DIFFERENCE,
+                        help='slowdowns of the min time below this many seconds are not flagged')
+    args = parser.parse_args(argv)
+
+    records = run_benchmarks(args.sizes, args.lengths, args.Ns, args.sources, args.distributions,
+                             args.repeat, args.seed)
+    output = {'environment': environment(), 'results': records}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=1)
+    else:
+        json.dump(output, sys.stdout, indent=1)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline_records = json.load(f)['results']
+        regressions = compare_results(records, baseline_records, args.threshold, args.min_difference)
+        for regression in regressions:
+            print('REGRESSION {}: {:.6f}s -> {:.6f}s ({:.2f}x)'.format(
+                ', '.join('{}={}'.format(field, regression[field]) for field in KEY_FIELDS
+                          if regression[field] is not None),
+                regression['baseline_min'], regression['min'], regression['ratio']), file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Vectorized bounding boxes and radius queries for many sources against one set of targets.
+
+The bounding boxes of all sources are computed as arrays, including the pole-crossing FRONT/REVERSE cases,
+and the candidate (source, target) pairs are generated from the latitude bands of a TargetIndex,
+so the work done per source is numpy work rather than Python work.
+"""
+
+import numpy as np
+
+from boundingbox.coordinates import as_latlon_array, mod_longitude_degrees
+from boundingbox.great_circle import haversine_distances_columns
+from boundingbox.instrumentation import stage, count, MAKE_BOUNDING_BOX, BBOX_FILTER, HAVERSINE, CANDIDATES, \
+    WITHIN_DISTANCE
+from boundingbox.settings import EARTH_RADIUS, KM, NORTH, SOUTH, EAST, WEST, FRONT, REVERSE
+from boundingbox.target_index import TargetIndex
+
+# upper bound on the number of candidate pairs held in memory at once
+MAX_PAIRS = 2 ** 22
+
+
+def make_bounding_box_arrays(sources_degrees, lengths, units=KM):
+    """
+    Vectorized counterpart of BoundingBox.make_bounding_box.
+    :param sources_degrees: np array of shape (S, 2) of lat-lon pairs in degrees
+    :param lengths: positive number or np array of shape (S,)
+    :param units: KM or MILES
+    :return: dict with keys = [FRONT, REVERSE],
+    values are dicts with keys = [north, south, east, west] and values np arrays of shape (S,) in degrees.
+    The REVERSE values are nan for the sources whose bounding box does not reach a pole.
+    """
+    sources_radians = np.radians(as_latlon_array(sources_degrees))
+    lat, lon = sources_radians[:, 0], sources_radians[:, 1]
+    d = np.broadcast_to(np.asarray(lengths, dtype=np.float64) / EARTH_RADIUS[units], lat.shape)
+
+    reaches_north = lat + d > np.pi / 2
+    reaches_south = lat - d < -np.pi / 2
+    reaches_pole = reaches_north | reaches_south
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # clipped as in BoundingBox, rounding can take the arguments out of their domains near the poles
+        max_longitude_diff = np.abs(np.arccos(np.clip(
+            np.sqrt(np.maximum(np.cos(d) ** 2 - np.sin(lat) ** 2, 0)) / np.cos(lat), -1, 1)))
+        # the latitude at which the circle intersects lon = source[1] +/- pi/2
+        reverse_latitude = np.arcsin(np.clip(np.cos(d) / np.sin(lat), -1, 1))
+
+    front_east = np.where(reaches_pole, lon + np.pi / 2, lon + max_longitude_diff)
+    front_west = np.where(reaches_pole, lon - np.pi / 2, lon - max_longitude_diff)
+    bbox_front = {
+        NORTH: np.where(reaches_north, np.pi / 2, lat + d),
+        SOUTH: np.where(reaches_south, -np.pi / 2, lat - d),
+        EAST: front_east,
+        WEST: front_west,
+    }
+    bbox_reverse = {
+        NORTH: np.where(reaches_north, np.pi / 2, np.where(reaches_south, reverse_latitude, np.nan)),
+        SOUTH: np.where(reaches_south, -np.pi / 2, np.where(reaches_north, reverse_latitude, np.nan)),
+        EAST: np.where(reaches_pole, front_west, np.nan),
+        WEST: np.where(reaches_pole, front_east, np.nan),
+    }
+
+    bbox = {}
+    for key, bbox_radians in [(FRONT, bbox_front), (REVERSE, bbox_reverse)]:
+        bbox_degrees = {k: np.degrees(v) for k, v in bbox_radians.items()}
+        bbox_degrees[EAST] = mod_longitude_degrees(bbox_degrees[EAST])
+        bbox_degrees[WEST] = mod_longitude_degrees(bbox_degrees[WEST])
+        bbox[key] = bbox_degrees
+    return bbox
+
+
+def longitudes_in_range(lons, west, east):
+    """
+    :param lons: np array of longitudes in degrees
+    :param west: np array of western bounds, broadcasting against lons
+    :param east: np array of eastern bounds, broadcasting against lons
+    :return: boolean np array, whether each longitude lies in [west, east], wrapping across the 180th meridian
+    """
+    return np.where(west <= east, (lons >= west) & (lons <= east), (lons >= west) | (lons <= east))
+
+
+def as_target_index(targets, validate=True):
+    """
+    :param targets: TargetIndex, LatLonColumns or an iterable of lat-lon pairs
+    :param validate: whether to validate the lat-lon pairs, a TargetIndex is never validated again
+    :return: TargetIndex
+    """
+    if isinstance(targets, TargetIndex):
+        return targets
+    return TargetIndex(targets, validate)
+
+
+def _chunk_bounds(counts, max_pairs):
+    """
+    :param counts: np array of candidate counts per segment
+    :param max_pairs: positive integer
+    :return: generator of (start, stop) such that each chunk of segments holds at most max_pairs candidates,
+    unless a single segment is larger.
+    """
+    cumulative = np.cumsum(counts)
+    start = 0
+    while start < len(counts):
+        done = cumulative[start - 1] if start > 0 else 0
+        stop = max(int(np.searchsorted(cumulative, done + max_pairs, side='right')), start + 1)
+        yield start, stop
+        start = stop
+
+
+def within_distance_pairs(sources_degrees, index, lengths, units=KM, max_pairs=MAX_PAIRS):
+    """
+    :param sources_degrees: np array of shape (S, 2) of lat-lon pairs in degrees
+    :param index: TargetIndex
+    :param lengths: positive number or np array of shape (S,)
+    :param units: KM or MILES
+    :param max_pairs: upper bound on the number of candidate pairs evaluated at once
+    :return: generator of (source_ids, positions, distances) np arrays, one element per target within
+    lengths[source_id] of its source. positions refer to the sorted targets of index.
+    """
+    sources = as_latlon_array(sources_degrees)
+    lengths = np.broadcast_to(np.asarray(lengths, dtype=np.float64), (len(sources),))
+    with stage(MAKE_BOUNDING_BOX):
+        bbox = make_bounding_box_arrays(sources, lengths, units)
+    bbox_front, bbox_reverse = bbox[FRONT], bbox[REVERSE]
+    has_reverse = ~np.isnan(bbox_reverse[NORTH])
+
+    # one segment of the latitude-sorted targets per box, a source has a FRONT box and possibly a REVERSE box
+    south = np.concatenate((bbox_front[SOUTH], np.where(has_reverse, bbox_reverse[SOUTH], np.inf)))
+    north = np.concatenate((bbox_front[NORTH], np.where(has_reverse, bbox_reverse[NORTH], -np.inf)))
+    segment_start = np.searchsorted(index.latitudes, south, side='left')
+    segment_count = np.maximum(np.searchsorted(index.latitudes, north, side='right') - segment_start, 0)
+    segment_source = np.concatenate((np.arange(len(sources)), np.arange(len(sources))))
+    segment_is_reverse = np.arange(2 * len(sources)) >= len(sources)
+
+    for start, stop in _chunk_bounds(segment_count, max_pairs):
+        with stage(BBOX_FILTER):
+            counts = segment_count[start:stop]
+            segment_ids = np.repeat(np.arange(stop - start), counts)
+            offsets = np.cumsum(counts) - counts
+            positions = segment_start[start:stop][segment_ids] + np.arange(len(segment_ids)) - offsets[segment_ids]
+            source_ids = segment_source[start:stop][segment_ids]
+
+            # REVERSE covers exactly the longitudes FRONT does not, so no target is matched twice by a source
+            in_front = longitudes_in_range(index.longitudes[positions],
+                                           bbox_front[WEST][source_ids], bbox_front[EAST][source_ids])
+            in_bbox = in_front != segment_is_reverse[start:stop][segment_ids]
+            positions, source_ids = positions[in_bbox], source_ids[in_bbox]
+        count(CANDIDATES, len(positions))
+
+        with stage(HAVERSINE):
+            distances = haversine_distances_columns((sources[source_ids, 0], sources[source_ids, 1]),
+                                                    index.latitudes[positions], index.longitudes[positions], units)
+        within_distance = distances <= lengths[source_ids]
+        count(WITHIN_DISTANCE, np.count_nonzero(within_distance))
+        yield source_ids[within_distance], positions[within_distance], distances[within_distance]
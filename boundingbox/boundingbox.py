@@ -1,18 +1,24 @@
 import numpy as np
 from math import degrees
-from haversine import haversine
-from importlib import reload
-import time
 
-import boundingbox.validations; reload(boundingbox.validations)
 from boundingbox.validations.numbers import validate_positive_number
-from boundingbox.validations.coordinates import validate_latlon_degrees, validate_latlons_degrees, validate_units
+from boundingbox.validations.coordinates import validate_latlon_degrees, validate_latlons_degrees, validate_units, \
+    validate_return_format
 
+from boundingbox.coordinates import convert_latlon_degrees_to_radians, mod_longitude_radians, as_latlon_array, \
+    LatLonColumns
+from boundingbox.great_circle import haversine_distances, haversine_distances_columns
+from boundingbox.instrumentation import query, stage, count, MAKE_BOUNDING_BOX, BBOX_FILTER, HAVERSINE, SORT, \
+    SHARDS, CANDIDATES, WITHIN_DISTANCE
+from boundingbox.parallel import map_shards, merge_shard_results
+from boundingbox.results import make_targets_distance_array, format_results
+from boundingbox.cell_index import CellIndex
+from boundingbox.target_index import TargetIndex, as_targets
 
-import boundingbox.coordinates; reload(boundingbox.coordinates)
-from boundingbox.coordinates import convert_latlon_degrees_to_radians, mod_longitude_radians
+from boundingbox.settings import EARTH_RADIUS, NORTH, SOUTH, EAST, WEST, KM, MILES, FRONT, REVERSE, TUPLES
 
-from boundingbox.settings import EARTH_RADIUS, NORTH, SOUTH, EAST, WEST, KM, MILES, FRONT, REVERSE
+# number of targets tested at a time by sweep_bboxs, small enough for the block to stay in cache
+BLOCK_SIZE = 2 ** 16
 
 class BoundingBox:
     def __init__(self, source, length, units=KM):
@@ -20,8 +26,10 @@ class BoundingBox:
         self.length = length
         self.units = units
         self.earth_radius = EARTH_RADIUS[units]
-        self.source_radians = convert_latlon_degrees_to_radians(self.source_degrees)
-        self.bbox = self.make_bounding_box(self.source_radians, self.length)
+        # the source_degrees setter validated the source
+        self.source_radians = convert_latlon_degrees_to_radians(self.source_degrees, validate=False)
+        with stage(MAKE_BOUNDING_BOX):
+            self.bbox = self.make_bounding_box(self.source_radians, self.length)
 
 
     @property
@@ -63,9 +71,10 @@ class BoundingBox:
         :return: the maximum longitude difference between the source and a circle of radius=length around it.
         """
         d = length / self.earth_radius
+        # when the circle just reaches a pole, rounding can take the arguments slightly out of their domains
         max_longitude_arg = np.cos(source_radians[0]) ** (-1) * \
-                            (np.cos(d) ** 2 - np.sin(source_radians[0]) ** 2) ** (1 / 2)
-        return np.abs(np.arccos(max_longitude_arg))
+                            max(np.cos(d) ** 2 - np.sin(source_radians[0]) ** 2, 0) ** (1 / 2)
+        return np.abs(np.arccos(np.clip(max_longitude_arg, -1, 1)))
 
 
     def make_bounding_box(self, source_radians, length):
@@ -92,16 +101,19 @@ class BoundingBox:
 
         # the bounding box surpasses at least one pole
         else:
-            bbox_front[EAST] = np.pi / 2
-            bbox_front[WEST] = -np.pi / 2
-            bbox_reverse[EAST] = -np.pi / 2
-            bbox_reverse[WEST] = np.pi / 2
+            # FRONT is the half of the globe within pi/2 longitude of the source, REVERSE is the other half
+            bbox_front[EAST] = mod_longitude_radians(source_radians[1] + np.pi / 2)
+            bbox_front[WEST] = mod_longitude_radians(source_radians[1] - np.pi / 2)
+            bbox_reverse[EAST] = bbox_front[WEST]
+            bbox_reverse[WEST] = bbox_front[EAST]
 
             # the bounding box surpasses both north and south poles
             if (source_radians[0] + max_latitude_diff > np.pi / 2 and \
                 source_radians[0] - max_latitude_diff < -np.pi / 2):
                 bbox_front[NORTH] = np.pi / 2
                 bbox_front[SOUTH] = -np.pi / 2
+                bbox_reverse[NORTH] = np.pi / 2
+                bbox_reverse[SOUTH] = -np.pi / 2
 
             # the bounding box surpasses the north pole
             elif source_radians[0] + max_latitude_diff > np.pi / 2:
@@ -110,7 +122,8 @@ class BoundingBox:
                 bbox_reverse[NORTH] = np.pi / 2
                 # bbox_reverse[SOUTH] is the point at which the circle intersects 
                 # lon = source[1] +/-  pi/2 .
-                bbox_reverse[SOUTH] = np.arcsin(np.cos(length / self.earth_radius) / np.sin(source_radians[0]))
+                bbox_reverse[SOUTH] = np.arcsin(
+                    np.clip(np.cos(length / self.earth_radius) / np.sin(source_radians[0]), -1, 1))
 
             # the bounding box surpasses the south pole
             elif source_radians[0] - max_latitude_diff < -np.pi / 2:
@@ -118,7 +131,8 @@ class BoundingBox:
                 bbox_front[SOUTH] = -np.pi / 2
                 # bbox_reverse[NORTH] is the point at which the circle intersects 
                 # lon = source[1] +/-  pi/2.
-                bbox_reverse[NORTH] = np.arcsin(np.cos(length / self.earth_radius) / np.sin(source_radians[0]))
+                bbox_reverse[NORTH] = np.arcsin(
+                    np.clip(np.cos(length / self.earth_radius) / np.sin(source_radians[0]), -1, 1))
                 bbox_reverse[SOUTH] = -np.pi / 2
             
             bbox_reverse = {k: degrees(v) for k, v in bbox_reverse.items()}
@@ -138,44 +152,163 @@ class BoundingBox:
         return 1 == (target[0] >= bbox[SOUTH]) & (target[0] <= bbox[NORTH]) & ~((target[1] >= bbox[EAST]) & (target[1] <= bbox[WEST]))
 
 
+    def target_in_bounding_box(self, target, bbox):
+        if bbox[WEST] <= bbox[EAST]:
+            return self.target_in_bounding_box_front(target, bbox)
+        return self.target_in_bounding_box_reverse(target, bbox)
+
+    def mask_in_bounding_boxes(self, lats, lons, bboxs):
+        """
+        :param lats: np array of latitudes
+        :param lons: np array of longitudes
+        :param bboxs: dict where values are dicts with keys = [north, south, east, west]
+        :return: boolean np array, whether each lat-lon pair is inside at least one of the bbox in bboxs.
+        Same test as target_in_bounding_box, evaluated in place to keep temporaries to one mask per bbox.
+        """
+        in_bboxs = np.zeros(len(lats), dtype=bool)
+        for bbox in bboxs.values():
+            in_bbox = lats >= bbox[SOUTH]
+            in_bbox &= lats <= bbox[NORTH]
+            if bbox[WEST] <= bbox[EAST]:
+                in_bbox &= lons >= bbox[WEST]
+                in_bbox &= lons <= bbox[EAST]
+            else:
+                in_bbox &= (lons < bbox[EAST]) | (lons > bbox[WEST])
+            in_bboxs |= in_bbox
+        return in_bboxs
+
+
+    def sweep_bboxs(self, targets, bboxs, block_size=BLOCK_SIZE):
+        """
+        A single pass over targets, block by block, which tests all the bbox in bboxs at once.
+        :param targets: An iterable of lat-lon pairs, LatLonColumns, a TargetIndex or a CellIndex.
+        :param bboxs: dict where values are dicts with keys = [north, south, east, west]
+        :param block_size: number of targets tested at a time
+        :return: generator of (indices, lats, lons) np arrays, the targets inside at least one of the bbox in bboxs,
+        each once, and their positions in targets (in the targets an index was built from)
+        """
+        targets = as_targets(targets)
+        if isinstance(targets, CellIndex):
+            yield from self.sweep_cells(targets, bboxs, block_size)
+            return
+        if isinstance(targets, TargetIndex):
+            # only the latitude band covering every bbox is read
+            band = targets.latitude_band(min(bbox[SOUTH] for bbox in bboxs.values()),
+                                         max(bbox[NORTH] for bbox in bboxs.values()))
+            lats, lons, offset = targets.latitudes[band], targets.longitudes[band], band.start
+        elif isinstance(targets, LatLonColumns):
+            lats, lons, offset = targets.lats, targets.lons, 0
+        else:
+            lats, lons, offset = targets[:, 0], targets[:, 1], 0
+
+        for start in range(0, len(lats), block_size):
+            lats_block = lats[start:start + block_size]
+            lons_block = lons[start:start + block_size]
+            with stage(BBOX_FILTER):
+                hits = np.flatnonzero(self.mask_in_bounding_boxes(lats_block, lons_block, bboxs))
+            positions = offset + start + hits
+            indices = targets.order[positions] if isinstance(targets, TargetIndex) else positions
+            yield indices, lats_block[hits], lons_block[hits]
+
+
+    def sweep_cells(self, index, bboxs, block_size=BLOCK_SIZE):
+        """
+        sweep_bboxs for a CellIndex: only the targets of the cells covering the bboxs are read, and only those
+        of the cells crossing the border of a bbox are tested.
+        :param index: CellIndex
+        :param bboxs: dict where values are dicts with keys = [north, south, east, west]
+        :param block_size: number of targets returned at a time
+        :return: generator of (indices, lats, lons) np arrays, as sweep_bboxs
+        """
+        with stage(BBOX_FILTER):
+            inside, border = index.positions_in_bboxs(bboxs)
+        for start in range(0, len(inside), block_size):
+            positions = inside[start:start + block_size]
+            yield index.order[positions], index.latitudes[positions], index.longitudes[positions]
+        for start in range(0, len(border), block_size):
+            positions = border[start:start + block_size]
+            lats_block, lons_block = index.latitudes[positions], index.longitudes[positions]
+            with stage(BBOX_FILTER):
+                hits = np.flatnonzero(self.mask_in_bounding_boxes(lats_block, lons_block, bboxs))
+            yield index.order[positions[hits]], lats_block[hits], lons_block[hits]
+
+
+    def filter_indices_in_bbox(self, targets, bbox):
+        """
+        :param targets: An iterable of lat-lon pairs or a TargetIndex.
+        :param bbox: dict with keys = [north, south, east, west]
+        :return: (indices, targets_filtered), the lat-lon pairs inside bbox and their positions in targets,
+        for a TargetIndex their positions in the targets it was built from
+        """
+        with stage(BBOX_FILTER):
+            if isinstance(targets, TargetIndex):
+                positions = targets.filter_positions_in_bbox(bbox)
+                return targets.order[positions], targets.targets_at(positions)
+
+            targets = as_latlon_array(targets)
+            indices = np.flatnonzero(self.target_in_bounding_box(np.transpose(targets), bbox))
+            return indices, targets[indices]
+
+
     def filter_targets_in_bbox(self, targets, bbox):
             """
-            :param targets: An iterable of lat-lon pairs. 
+            :param targets: An iterable of lat-lon pairs or a TargetIndex.
             :param bbox: dict with keys = [north, south, east, west]
             :return: An iterable of lat-lon pairs where each pair is inside bbox
             """
-            if bbox[WEST] <= bbox[EAST]:
-                target_in_bounding_box = self.target_in_bounding_box_front
-            else:
-                target_in_bounding_box = self.target_in_bounding_box_reverse
+            return self.filter_indices_in_bbox(targets, bbox)[1]
 
-            return targets[target_in_bounding_box(np.transpose(targets), bbox)]
+
+    def filter_indices_in_bboxs(self, targets, bboxs):
+        """
+        :param targets: An iterable of lat-lon pairs or a TargetIndex.
+        :param bboxs: dict where values are dicts with keys = [north, south, east, west]
+        :return: (indices, targets_filtered), the lat-lon pairs inside at least one of the bbox in bboxs
+        and their positions in targets
+        """
+        blocks = list(self.sweep_bboxs(targets, bboxs))
+        indices = np.concatenate([block[0] for block in blocks] + [np.empty(0, dtype=np.int64)])
+        lats = np.concatenate([block[1] for block in blocks] + [np.empty(0)])
+        lons = np.concatenate([block[2] for block in blocks] + [np.empty(0)])
+        return indices, np.column_stack((lats, lons))
 
 
     def filter_targets_in_bboxs(self, targets, bboxs):
         """
         :param bboxs: 
-        :param targets: An iterable of lat-lon pairs. 
-        :return: An iterable of lat-lon pairs where each pair is inside at least one of the bbox in bboxs
+        :param targets: An iterable of lat-lon pairs or a TargetIndex.
+        :return: np array of lat-lon pairs where each pair is inside at least one of the bbox in bboxs
+        """
+        return self.filter_indices_in_bboxs(targets, bboxs)[1]
+
+
+    def filter_indices_in_annulus(self, targets, bboxs, inner_bboxs):
+        """
+        :param targets: An iterable of lat-lon pairs or a TargetIndex.
+        :param bboxs: dict where values are dicts with keys = [north, south, east, west]
+        :param inner_bboxs: dict where values are dicts with keys = [north, south, east, west]
+        :return: (indices, targets_filtered), the lat-lon pairs which are inside at least one of the bbox in bboxs
+        but inside none of the bbox in inner_bboxs, and their positions in targets
         """
-        targets_filtered = []
-        for k,v in bboxs.items():
-            targets_filtered += list(self.filter_targets_in_bbox(targets, bboxs[k]))
-        return targets_filtered
+        indices, targets_filtered = self.filter_indices_in_bboxs(targets, bboxs)
+        outside = ~self.mask_in_bounding_boxes(targets_filtered[:, 0], targets_filtered[:, 1], inner_bboxs)
+        return indices[outside], targets_filtered[outside]
 
 
     def compute_distances_from_source(self, source_degrees, targets):
         """
         :param source_degrees: lat-lon pair in degrees
         :param targets: An iterable of lat-lon pairs. 
-        :return: np array where each element is of the form [(lat, lon), distance]
+        :return: np array where each element is of the form [(lat, lon), distance], sorted by distance
         """
-        if len(targets) == 0:
-            return []
-        targets_distance = np.array([[target, haversine(source_degrees, target)] for target in targets])
+        targets = as_latlon_array(targets)
+        count(CANDIDATES, len(targets))
+        with stage(HAVERSINE):
+            distances = haversine_distances(source_degrees, targets, self.units)
         # sort by haversine distance
-        targets_dist_sorted = targets_distance[targets_distance[:,1].argsort()]
-        return targets_dist_sorted
+        with stage(SORT):
+            order = np.argsort(distances, kind='stable')
+        return make_targets_distance_array(targets[order], distances[order])
 
 
     def get_points_within_bbox(self, targets, bbox):
@@ -184,19 +317,59 @@ class BoundingBox:
         :param targets: An iterable of lat-lon pairs. 
         :return: np array where each element is of the form [(lat, lon), distance] and is inside bbox
         """
-        targets_filtered = self.filter_targets_in_bbox(targets, bbox)
-        targets_dist = self.compute_distances_from_source(self.source_degrees, targets_filtered)
-        return targets_dist
+        with query('BoundingBox.get_points_within_bbox'):
+            targets_filtered = self.filter_targets_in_bbox(targets, bbox)
+            targets_dist = self.compute_distances_from_source(self.source_degrees, targets_filtered)
+            return targets_dist
 
 
-    def get_points_within_bboxs(self, targets, bboxs):
+    def compute_distances_in_bboxs(self, targets, bboxs, length=None):
         """
+        The distances are computed block by block in the same pass over targets as the bbox test,
+        and the radius cut is applied there too, so the targets are read once.
+        :param targets: An iterable of lat-lon pairs or a TargetIndex.
         :param bboxs: dict where values are dicts with keys = [north, south, east, west]
-        :param targets: An iterable of lat-lon pairs. 
-        :return: all locations in targets which are inside ANY of the bbox in bboxs
+        :param length: optional positive number, only targets at most this far from the source are kept
+        :return: (indices, targets_filtered, distances), the lat-lon pairs inside ANY of the bbox in bboxs,
+        their positions in targets and their distances to the source, unsorted
         """
-        targets_dist = []
-        
-        for k,v in bboxs.items():
-            targets_dist += list(self.get_points_within_bbox(targets, bboxs[k]))
-        return np.array(targets_dist)
+        indices, lats, lons, distances = [np.empty(0, dtype=np.int64)], [np.empty(0)], [np.empty(0)], [np.empty(0)]
+        for indices_block, lats_block, lons_block in self.sweep_bboxs(targets, bboxs):
+            count(CANDIDATES, len(indices_block))
+            with stage(HAVERSINE):
+                distances_block = haversine_distances_columns(self.source_degrees, lats_block, lons_block, self.units)
+            if length is not None:
+                within_distance = distances_block <= length
+                count(WITHIN_DISTANCE, np.count_nonzero(within_distance))
+                indices_block, distances_block = indices_block[within_distance], distances_block[within_distance]
+                lats_block, lons_block = lats_block[within_distance], lons_block[within_distance]
+            indices.append(indices_block)
+            lats.append(lats_block)
+            lons.append(lons_block)
+            distances.append(distances_block)
+        return np.concatenate(indices), np.column_stack((np.concatenate(lats), np.concatenate(lons))), \
+            np.concatenate(distances)
+
+
+    def get_points_within_bboxs(self, targets, bboxs, executor=None, return_format=TUPLES):
+        """
+        :param bboxs: dict where values are dicts with keys = [north, south, east, west]
+        :param targets: An iterable of lat-lon pairs, a TargetIndex or a CellIndex.
+        :param executor: optional concurrent.futures.Executor, the targets are then filtered in parallel shards.
+        A TargetIndex or a CellIndex is always filtered in the calling thread since it only scans part of the targets.
+        :param return_format: TUPLES, INDICES or STRUCTURED, see results.format_results
+        :return: all locations in targets which are inside ANY of the bbox in bboxs, sorted by distance.
+        With TUPLES, np array where each element is of the form [(lat, lon), distance].
+        """
+        validate_return_format(return_format)
+        with query('BoundingBox.get_points_within_bboxs'):
+            if executor is None or isinstance(targets, (TargetIndex, CellIndex)):
+                indices, targets_filtered, distances = self.compute_distances_in_bboxs(targets, bboxs)
+            else:
+                with stage(SHARDS):
+                    shards = map_shards(executor, self.compute_distances_in_bboxs, targets, bboxs)
+                indices, targets_filtered, distances = merge_shard_results(shards)
+
+            with stage(SORT):
+                order = np.argsort(distances, kind='stable')
+            return format_results(indices[order], targets_filtered[order], distances[order], return_format)
@@ -0,0 +1,248 @@
+"""
+An opt-in cache in front of the radius and closest points queries, for workloads which repeat the same sources.
+
+A QueryCache holds one set of targets, indexed once, and remembers the result of each query by
+(quantized source, length or N, units, dataset version). The source is rounded to `precision` decimal degrees and
+the query is run for the rounded source, so every source rounding to the same key gets the same result; the default
+of 6 decimals moves a source by at most about 6 cm. Results are stored as read-only arrays of indices and distances
+and evicted least recently used first once their total size exceeds max_bytes. The bounding boxes of the radius
+queries are cached too, by (quantized source, length, units), and are kept when the targets change.
+
+    cache = QueryCache(stores)
+    cache.get_points_within_distance(source, 10)
+    cache.set_targets(new_stores)  # drops every cached result
+"""
+
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from boundingbox.boundingbox import BoundingBox
+from boundingbox.coordinates import as_latlon_array
+from boundingbox.distances import points_within_distance, closest_points
+from boundingbox.frames import is_dataframe, as_target_columns
+from boundingbox.instrumentation import query, stage, count, SORT, WITHIN_DISTANCE
+from boundingbox.results import format_results
+from boundingbox.settings import KM, TUPLES
+from boundingbox.target_index import TargetIndex, as_targets
+from boundingbox.validations.coordinates import validate_latlon_degrees, validate_units, validate_return_format
+from boundingbox.validations.numbers import validate_positive_number, validate_strictly_positive_integer
+
+DEFAULT_MAX_BYTES = 64 * 2 ** 20
+# decimal degrees kept in the cache keys, 1e-6 degree is about 11 cm
+DEFAULT_PRECISION = 6
+# number of bounding boxes kept, each takes well under a kilobyte
+MAX_GEOMETRIES = 4096
+# bytes counted for the key and bookkeeping of each cached result, on top of its arrays
+ENTRY_OVERHEAD = 256
+
+WITHIN = 'within'
+CLOSEST = 'closest'
+
+CacheStats = namedtuple('CacheStats', ['hits', 'misses', 'evictions', 'entries', 'bytes', 'hit_ratio'])
+
+
+def quantize_source(source, precision=DEFAULT_PRECISION):
+    """
+    :param source: lat-lon tuple in degrees
+    :param precision: number of decimals kept, None to keep the source as it is
+    :return: lat-lon tuple of floats, usable as a dict key
+    """
+    if precision is None:
+        return float(source[0]), float(source[1])
+    return round(float(source[0]), precision), round(float(source[1]), precision)
+
+
+class QueryCache:
+    def __init__(self, targets, max_bytes=DEFAULT_MAX_BYTES, precision=DEFAULT_PRECISION, validate=True):
+        """
+        :param targets: An iterable of lat-lon pairs in degrees, LatLonColumns or a pandas DataFrame,
+        indexed once here.
+        :param max_bytes: upper bound on the memory taken by the cached results
+        :param precision: number of decimals of the sources kept in the keys, None for exact sources
+        :param validate: False to skip the validation of targets
+        """
+        validate_positive_number(max_bytes)
+        if precision is not None:
+            validate_positive_number(precision)
+            precision = int(precision)
+        self.max_bytes = max_bytes
+        self.precision = precision
+        self.version = 0
+        self._lock = threading.RLock()
+        self._results = OrderedDict()
+        self._bytes = 0
+        self._geometries = OrderedDict()
+        self._set_targets(targets, validate)
+        self._reset_stats()
+
+    def _set_targets(self, targets, validate):
+        self.frame = targets if is_dataframe(targets) else None
+        # the targets in their original order, to format the results
+        self.targets = as_targets(as_target_columns(targets))
+        self.index = TargetIndex(self.targets, validate)
+
+    def _reset_stats(self):
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def set_targets(self, targets, validate=True):
+        """
+        Replace the targets and drop every cached result, the cached bounding boxes are kept.
+        :param targets: An iterable of lat-lon pairs in degrees, LatLonColumns or a pandas DataFrame
+        :param validate: False to skip the validation of targets
+        """
+        with self._lock:
+            self._set_targets(targets, validate)
+            self.version += 1
+            self._results.clear()
+            self._bytes = 0
+
+    def clear(self):
+        """
+        Drop every cached result and bounding box.
+        """
+        with self._lock:
+            self._results.clear()
+            self._bytes = 0
+            self._geometries.clear()
+
+    def _get(self, key):
+        with self._lock:
+            result = self._results.get(key)
+            if result is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._results.move_to_end(key)
+            return result
+
+    def _put(self, key, indices, distances):
+        indices.setflags(write=False)
+        distances.setflags(write=False)
+        size = indices.nbytes + distances.nbytes + ENTRY_OVERHEAD
+        with self._lock:
+            # the targets changed while the query ran, or the result alone exceeds the cache
+            if key[-1] != self.version or size > self.max_bytes:
+                return
+            previous = self._results.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[0].nbytes + previous[1].nbytes + ENTRY_OVERHEAD
+            self._results[key] = (indices, distances)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (evicted_indices, evicted_distances) = self._results.popitem(last=False)
+                self._bytes -= evicted_indices.nbytes + evicted_distances.nbytes + ENTRY_OVERHEAD
+                self._evictions += 1
+
+    def _bounding_box(self, source, length, units):
+        key = (source, length, units)
+        with self._lock:
+            boundingbox = self._geometries.get(key)
+            if boundingbox is not None:
+                self._geometries.move_to_end(key)
+                return boundingbox
+        boundingbox = BoundingBox(source, length, units)
+        with self._lock:
+            self._geometries[key] = boundingbox
+            if len(self._geometries) > MAX_GEOMETRIES:
+                self._geometries.popitem(last=False)
+        return boundingbox
+
+    def _dataset(self):
+        """
+        :return: (version, targets, index, frame), consistent with each other even while set_targets runs
+        """
+        with self._lock:
+            return self.version, self.targets, self.index, self.frame
+
+    def _query(self, key, compute, return_format):
+        """
+        :param key: tuple identifying the query, the dataset version is appended to it
+        :param compute: called as compute(index) on a miss, returns (indices, distances) sorted by distance
+        :param return_format: TUPLES, INDICES or STRUCTURED
+        :return: the result of the query, cached or computed, formatted
+        """
+        version, targets, index, frame = self._dataset()
+        key = key + (version,)
+        result = self._get(key)
+        if result is None:
+            result = compute(index)
+            self._put(key, *result)
+        indices, distances = result
+        count(WITHIN_DISTANCE, len(indices))
+        return format_results(indices, as_latlon_array(targets[indices]), distances, return_format, frame)
+
+    def _points_within_distance(self, index, source, length, units):
+        boundingbox = self._bounding_box(source, length, units)
+        indices, _, distances = points_within_distance(index, boundingbox)
+        with stage(SORT):
+            order = np.argsort(distances, kind='stable')
+        return indices[order], distances[order]
+
+    def _closest_points(self, index, source, N, length, units):
+        indices, _, distances = closest_points(index, source, N, length, units)
+        return indices, distances
+
+    def get_points_within_distance(self, source, length, units=KM, return_format=TUPLES):
+        """
+        :param source: lat-lon tuple, rounded to the precision of the cache
+        :param length: positive number
+        :param units: KM or MILES
+        :param return_format: TUPLES, INDICES or STRUCTURED, see results.format_results.
+        The INDICES arrays are the cached ones and are read-only.
+        :return: the targets whose distance to the rounded source is at most length, sorted by dist,
+        as distances.get_points_within_distance
+        """
+        validate_latlon_degrees(source)
+        validate_positive_number(length)
+        validate_units(units)
+        validate_return_format(return_format)
+        source, length = quantize_source(source, self.precision), float(length)
+        with query('QueryCache.get_points_within_distance'):
+            return self._query((WITHIN, source, length, units),
+                               lambda index: self._points_within_distance(index, source, length, units),
+                               return_format)
+
+    def get_closest_points(self, source, N, length=None, units=KM, return_format=TUPLES):
+        """
+        :param source: lat-lon tuple, rounded to the precision of the cache
+        :param N: strictly positive integer
+        :param length: positive number, the size of the initial bounding box.
+        If None it is estimated from the number of targets.
+        :param units: KM or MILES
+        :param return_format: TUPLES, INDICES or STRUCTURED, see results.format_results.
+        The INDICES arrays are the cached ones and are read-only.
+        :return: the N targets closest to the rounded source, sorted by dist, as distances.get_closest_points
+        """
+        validate_latlon_degrees(source)
+        validate_strictly_positive_integer(N)
+        if length is not None:
+            validate_positive_number(length)
+        validate_units(units)
+        validate_return_format(return_format)
+        source = quantize_source(source, self.precision)
+        with query('QueryCache.get_closest_points'):
+            return self._query((CLOSEST, source, N, length, units),
+                               lambda index: self._closest_points(index, source, N, length, units),
+                               return_format)
+
+    def stats(self):
+        """
+        :return: CacheStats of the lookups since the cache was created or the last reset_stats,
+        and of the results cached now
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return CacheStats(hits=self._hits,
+                              misses=self._misses,
+                              evictions=self._evictions,
+                              entries=len(self._results),
+                              bytes=self._bytes,
+                              hit_ratio=self._hits / lookups if lookups else 0.0)
+
+    def reset_stats(self):
+        with self._lock:
+            self._reset_stats()
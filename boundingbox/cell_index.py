@@ -0,0 +1,231 @@
+"""
+A geohash-style index of static targets, for clustered targets where a latitude band still holds too many of them.
+
+Each target gets the key of its cell in a fine grid of 2 ** MAX_LEVEL x 2 ** MAX_LEVEL cells of the lat-lon plane,
+with the bits of the row and of the column interleaved (a Z-order curve, as a geohash). The targets are sorted by
+key, so every cell of every coarser level, obtained by dropping the last bits of the keys, is a contiguous range of
+the sorted targets, and the number of targets in a cell is two binary searches away.
+
+A query maps each rectangle of BoundingBox.bbox to the cells covering it at a level about its size, splitting
+the rectangles which wrap across the 180th meridian. Cells are then refined level by level where they are dense:
+cells inside a rectangle are taken whole without any test, cells with at most leaf_size targets are scanned with
+the bbox test, and denser cells crossing the border of a rectangle are split in four. The cell size therefore
+adapts to the local density of the targets and the number of targets scanned does not depend on the density
+elsewhere on the globe. The cells near the poles are plain cells of the grid, the rectangles reaching a pole
+include its row of cells.
+"""
+
+import math
+
+import numpy as np
+
+from boundingbox.coordinates import as_latlon_array, LatLonColumns
+from boundingbox.settings import NORTH, SOUTH, EAST, WEST
+from boundingbox.validations.numbers import validate_strictly_positive_integer
+
+# bits of the row and of the column in a key, the finest cells are about 0.3 m high
+MAX_LEVEL = 26
+# scanning this many targets costs about as much as refining the cells one more level
+DEFAULT_LEAF_SIZE = 1024
+# degrees by which the rectangles are grown to select the cells and shrunk to take the cells whole,
+# far above the rounding of the cell bounds so that only the bbox test decides near the border
+BOUND_MARGIN = 1e-9
+# a dense cell is split into the cells up to this many levels below it at once
+MAX_LEVELS_PER_SPLIT = 3
+
+
+def _make_spread_table():
+    """
+    :return: np array of int64 of length 2 ** 16, each index with its bits moved to the even positions
+    """
+    values = np.arange(2 ** 16, dtype=np.int64)
+    for shift, mask in [(8, 0x00FF00FF), (4, 0x0F0F0F0F), (2, 0x33333333), (1, 0x55555555)]:
+        values = (values | (values << shift)) & mask
+    return values
+
+
+SPREAD_TABLE = _make_spread_table()
+
+
+def _spread_bits(values):
+    """
+    :param values: np array of integers below 2 ** 32
+    :return: np array of int64, the bits of each value moved to the even positions
+    """
+    values = np.asarray(values, dtype=np.int64)
+    return SPREAD_TABLE[values & 0xFFFF] | (SPREAD_TABLE[values >> 16] << 32)
+
+
+def _children(levels):
+    """
+    :param levels: strictly positive integer
+    :return: (offsets, rows, cols), np arrays of the keys, rows and columns of the 4 ** levels cells
+    this many levels below a cell, relative to those of the cell
+    """
+    rows, cols = np.divmod(np.arange(4 ** levels), 2 ** levels)
+    return (_spread_bits(rows) << 1) | _spread_bits(cols), rows, cols
+
+
+CHILDREN = {levels: _children(levels) for levels in range(1, MAX_LEVELS_PER_SPLIT + 1)}
+
+
+def cell_keys(lats_degrees, lons_degrees):
+    """
+    :param lats_degrees: np array of latitudes in degrees
+    :param lons_degrees: np array of longitudes in degrees
+    :return: np array of int64, the key of the cell of MAX_LEVEL of each lat-lon pair.
+    The latitude 90 and the longitude 180 fall in the last row and column.
+    """
+    n = 2 ** MAX_LEVEL
+    rows = np.clip(np.floor((np.asarray(lats_degrees) + 90) * (n / 180)), 0, n - 1)
+    cols = np.clip(np.floor((np.asarray(lons_degrees) + 180) * (n / 360)), 0, n - 1)
+    return (_spread_bits(rows) << 1) | _spread_bits(cols)
+
+
+def bbox_rectangles(bboxs):
+    """
+    :param bboxs: dict where values are dicts with keys = [north, south, east, west]
+    :return: np array of shape (R, 4) of (south, north, west, east) rectangles covering the same area,
+    the bbox which wrap across the 180th meridian being split in two
+    """
+    rectangles = []
+    for bbox in bboxs.values():
+        if bbox[WEST] <= bbox[EAST]:
+            rectangles.append((bbox[SOUTH], bbox[NORTH], bbox[WEST], bbox[EAST]))
+        else:
+            rectangles.append((bbox[SOUTH], bbox[NORTH], bbox[WEST], 180))
+            rectangles.append((bbox[SOUTH], bbox[NORTH], -180, bbox[EAST]))
+    return np.array(rectangles, dtype=np.float64).reshape(-1, 4)
+
+
+def _ranges_positions(starts, stops):
+    """
+    :param starts: np array of int64
+    :param stops: np array of int64, stops >= starts
+    :return: np array of int64, the concatenation of range(start, stop) for each pair
+    """
+    lengths = stops - starts
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(lengths.sum(), dtype=np.int64)
+
+
+class CellIndex:
+    def __init__(self, targets, leaf_size=DEFAULT_LEAF_SIZE, validate=True):
+        """
+        :param targets: An iterable of lat-lon pairs in degrees, or LatLonColumns.
+        :param leaf_size: cells with at most this many targets are scanned rather than split
+        :param validate: False to skip the validation of targets
+        """
+        validate_strictly_positive_integer(leaf_size)
+        if not isinstance(targets, LatLonColumns):
+            targets = as_latlon_array(targets)
+            targets = LatLonColumns(targets[:, 0], targets[:, 1])
+        if validate:
+            targets.validate()
+        self.leaf_size = leaf_size
+        keys = cell_keys(targets.lats, targets.lons)
+        # order[i] is the position in the original targets of the i-th sorted target
+        self.order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.order]
+        self.latitudes = targets.lats[self.order]
+        self.longitudes = targets.lons[self.order]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __array__(self, dtype=None):
+        # the targets in their original order, for the functions which need lat-lon pairs
+        targets = np.empty((len(self), 2), dtype=dtype or np.float64)
+        targets[self.order, 0] = self.latitudes
+        targets[self.order, 1] = self.longitudes
+        return targets
+
+    def _start_cells(self, rectangles):
+        """
+        :param rectangles: np array of shape (R, 4) of (south, north, west, east)
+        :return: (level, prefixes, rows, cols), the cells of level covering every rectangle, a level at which
+        each rectangle spans at most a few cells along both axes
+        """
+        rectangles = rectangles.tolist()
+        # the cells are twice as wide as high in degrees
+        extent = max([north - south for south, north, _, _ in rectangles] +
+                     [(east - west) / 2 for _, _, west, east in rectangles] + [180 / 2 ** MAX_LEVEL])
+        level = min(max(math.floor(math.log2(180 / extent)), 0), MAX_LEVEL)
+        n = 2 ** level
+
+        cells = set()
+        for south, north, west, east in rectangles:
+            rows = range(max(math.floor((south + 90) * n / 180), 0), min(math.floor((north + 90) * n / 180), n - 1) + 1)
+            cols = range(max(math.floor((west + 180) * n / 360), 0), min(math.floor((east + 180) * n / 360), n - 1) + 1)
+            cells.update(row * n + col for row in rows for col in cols)
+        cells = np.array(sorted(cells), dtype=np.int64)
+        rows, cols = cells // n, cells % n
+        return level, (_spread_bits(rows) << 1) | _spread_bits(cols), rows, cols
+
+    def cell_ranges_in_bboxs(self, bboxs):
+        """
+        :param bboxs: dict where values are dicts with keys = [north, south, east, west]
+        :return: (inside_starts, inside_stops, border_starts, border_stops), np arrays of ranges of the sorted
+        targets. The targets of the inside ranges are all inside at least one bbox, those of the border ranges
+        may be, and no other target is.
+        """
+        rectangles = bbox_rectangles(bboxs)
+        outer = rectangles + [-BOUND_MARGIN, BOUND_MARGIN, -BOUND_MARGIN, BOUND_MARGIN]
+        inner = rectangles + [BOUND_MARGIN, -BOUND_MARGIN, BOUND_MARGIN, -BOUND_MARGIN]
+        # the edges of the domain are included, a rectangle reaching them covers the cells along them
+        inner[:, 0][rectangles[:, 0] <= -90] = -np.inf
+        inner[:, 1][rectangles[:, 1] >= 90] = np.inf
+        inner[:, 2][rectangles[:, 2] <= -180] = -np.inf
+        inner[:, 3][rectangles[:, 3] >= 180] = np.inf
+
+        level, prefixes, rows, cols = self._start_cells(outer)
+        inside_ranges, border_ranges = [], []
+        while len(prefixes):
+            shift = 2 * (MAX_LEVEL - level)
+            bounds = np.searchsorted(self.keys, np.concatenate((prefixes, prefixes + 1)) << shift)
+            starts, stops = bounds[:len(prefixes)], bounds[len(prefixes):]
+            height, width = 180 / 2 ** level, 360 / 2 ** level
+            # one row per cell, one column per rectangle
+            south = (rows * height - 90)[:, np.newaxis]
+            west = (cols * width - 180)[:, np.newaxis]
+            north, east = south + height, west + width
+            intersects = ((south <= outer[:, 1]) & (north >= outer[:, 0]) &
+                          (west <= outer[:, 3]) & (east >= outer[:, 2])).any(axis=1)
+            inside = ((south >= inner[:, 0]) & (north <= inner[:, 1]) &
+                      (west >= inner[:, 2]) & (east <= inner[:, 3])).any(axis=1)
+
+            keep = intersects & (stops > starts)
+            inside &= keep
+            inside_ranges.append((starts[inside], stops[inside]))
+            border = keep & ~inside
+            counts = stops - starts
+            split = border & (counts > self.leaf_size) if level < MAX_LEVEL else np.zeros_like(border)
+            border &= ~split
+            border_ranges.append((starts[border], stops[border]))
+            if not split.any():
+                break
+
+            # the least dense split cell would hold about leaf_size targets per cell that many levels below,
+            # if its targets were uniform within it
+            levels = int(np.log(counts[split].min() / self.leaf_size) / np.log(4))
+            levels = min(max(levels, 1), MAX_LEVELS_PER_SPLIT, MAX_LEVEL - level)
+            offsets, child_rows, child_cols = CHILDREN[levels]
+            prefixes = ((prefixes[split, np.newaxis] << 2 * levels) | offsets).ravel()
+            rows = ((rows[split, np.newaxis] << levels) | child_rows).ravel()
+            cols = ((cols[split, np.newaxis] << levels) | child_cols).ravel()
+            level += levels
+
+        empty = [np.empty(0, dtype=np.int64)]
+        return np.concatenate([ranges[0] for ranges in inside_ranges] + empty), \
+            np.concatenate([ranges[1] for ranges in inside_ranges] + empty), \
+            np.concatenate([ranges[0] for ranges in border_ranges] + empty), \
+            np.concatenate([ranges[1] for ranges in border_ranges] + empty)
+
+    def positions_in_bboxs(self, bboxs):
+        """
+        :param bboxs: dict where values are dicts with keys = [north, south, east, west]
+        :return: (inside_positions, border_positions), np arrays of positions in the sorted targets,
+        see cell_ranges_in_bboxs
+        """
+        inside_starts, inside_stops, border_starts, border_stops = self.cell_ranges_in_bboxs(bboxs)
+        return _ranges_positions(inside_starts, inside_stops), _ranges_positions(border_starts, border_stops)
@@ -2,18 +2,21 @@
 Functions which perform operations on the latitude-longitude coordinate system.
 """
 
+import numpy as np
 from math import radians
 from math import degrees
 
-from boundingbox.validations.coordinates import validate_latlon_degrees
+from boundingbox.validations.coordinates import validate_latlon_degrees, validate_latlon_columns
 
 
-def convert_latlon_degrees_to_radians(latlon_degrees):
+def convert_latlon_degrees_to_radians(latlon_degrees, validate=True):
     """
     :param latlon_degrees: lat-lon tuple in degrees
+    :param validate: False when latlon_degrees was already validated
     :return: lat-lon tuple in radians
     """
-    validate_latlon_degrees(latlon_degrees)
+    if validate:
+        validate_latlon_degrees(latlon_degrees)
     latlon_radians = (radians(latlon_degrees[0]), radians(latlon_degrees[1]))
     return latlon_radians
 
@@ -31,4 +34,48 @@ def mod_longitude_radians(lon_radians):
     :param lon_radians: float for longitude in radians
     :return: float for longitude in radians but shifted to the fundamental domain.
     """
-    return radians(mod_longitude_degrees(degrees(lon_radians)))
\ No newline at end of file
+    return radians(mod_longitude_degrees(degrees(lon_radians)))
+
+def as_latlon_array(latlons_degrees):
+    """
+    :param latlons_degrees: iterable of lat-lon pairs in degrees, or LatLonColumns
+    :return: np array of shape (M, 2) and dtype float64, a view when no conversion is needed
+    """
+    return np.asarray(latlons_degrees, dtype=np.float64).reshape(-1, 2)
+
+
+class LatLonColumns:
+    """
+    Targets given as two aligned columns of latitudes and longitudes, e.g. the columns of a DataFrame.
+    The bbox filters read the columns as they are, nothing is stacked into an (M, 2) array.
+    """
+
+    def __init__(self, lats_degrees, lons_degrees):
+        """
+        :param lats_degrees: iterable of latitudes in degrees, a float64 np array is used without copy
+        :param lons_degrees: iterable of longitudes in degrees, same length as lats_degrees
+        """
+        self.lats = np.asarray(lats_degrees, dtype=np.float64)
+        self.lons = np.asarray(lons_degrees, dtype=np.float64)
+        if self.lats.ndim != 1 or self.lats.shape != self.lons.shape:
+            raise ValueError('Latitudes and longitudes must be two columns of the same length')
+
+    def __len__(self):
+        return len(self.lats)
+
+    def __getitem__(self, rows):
+        """
+        :param rows: slice, or np array of positions
+        :return: LatLonColumns of these rows, views for a slice
+        """
+        return LatLonColumns(self.lats[rows], self.lons[rows])
+
+    def __array__(self, dtype=None):
+        # the functions which need lat-lon pairs get them through as_latlon_array, as a copy
+        return np.column_stack((self.lats, self.lons)).astype(dtype or np.float64, copy=False)
+
+    def validate(self, offset=0):
+        """
+        :param offset: added to the row indices reported
+        """
+        validate_latlon_columns(self.lats, self.lons, offset)
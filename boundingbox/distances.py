@@ -1,63 +1,368 @@
 from boundingbox.boundingbox import BoundingBox
-from haversine import haversine
+import logging
 import numpy as np
-import time
-from importlib import reload
 
-import boundingbox.validations; reload(boundingbox.validations)
 from boundingbox.validations.numbers import validate_strictly_positive_integer, validate_positive_number
+from boundingbox.validations.coordinates import validate_engine, validate_return_format, validate_latlon_degrees, \
+    validate_latlons_array, validate_units
 
+from boundingbox.batch import as_target_index, within_distance_pairs
+from boundingbox.cell_index import CellIndex
+from boundingbox.coordinates import as_latlon_array
+from boundingbox.frames import is_dataframe, as_target_columns
+from boundingbox.nearest import UnitVectorTree
+from boundingbox.great_circle import haversine_distances, haversine_distances_columns, cap_radius_for_fraction, \
+    scale_cap_radius
+from boundingbox.instrumentation import query, stage, count, MAKE_BOUNDING_BOX, HAVERSINE, SORT, SHARDS, \
+    KDTREE_QUERY, CANDIDATES, WITHIN_DISTANCE, RESCALES
+from boundingbox.results import format_results, make_ragged_result, RaggedResult
+from boundingbox.settings import EARTH_RADIUS, KM, BBOX, KDTREE, TUPLES
+from boundingbox.parallel import map_shards, merge_shard_results
+from boundingbox.target_index import TargetIndex, as_targets
+from boundingbox.unit_vectors import UnitVectorIndex
 
-def get_points_within_distance(source, targets, length):
+logger = logging.getLogger(__name__)
+
+
+def points_within_distance(targets, boundingbox):
+    """
+    :param targets: iterable of lat-lon pairs or a TargetIndex
+    :param boundingbox: BoundingBox
+    :return: (indices, targets_within_distance, distances), the targets whose distance to the source of
+    boundingbox is less than its length, their positions in targets and their distances, unsorted
+    """
+    return boundingbox.compute_distances_in_bboxs(targets, boundingbox.bbox, boundingbox.length)
+
+
+def get_points_within_distance(source, targets, length, units=KM, executor=None, return_format=TUPLES,
+                               validate=True):
     """
     It is possible for a point to be within the bbox but further than length from source.
     Here we remove such points.
     :param source: lat-lon tuple
-    :param targets: iterable of the form [(lat, lon), dist]
+    :param targets: iterable of lat-lon pairs, LatLonColumns, a pandas DataFrame with lat and lon columns,
+    a TargetIndex, a CellIndex or a UnitVectorIndex.
+    A UnitVectorIndex is filtered by dot products instead of the bounding box.
     :param length: positive number
-    :return: list of targets whose distance to source is less than length.
+    :param units: KM or MILES
+    :param executor: optional concurrent.futures.Executor, the targets are then filtered in parallel shards.
+    A TargetIndex or a CellIndex is always filtered in the calling thread since it only scans part of the targets.
+    :param return_format: TUPLES, INDICES or STRUCTURED, see results.format_results
+    :param validate: False to skip the validation of targets, a TargetIndex is never validated again
+    :return: the targets whose distance to source is less than length, sorted by dist.
+    With TUPLES, np array where each element is of the form [(lat, lon), dist],
+    or for a DataFrame the matching rows with their index and a distance column.
     """
     validate_positive_number(length)
-    boundingbox = BoundingBox(source, length)
-    targets_in_bbox = boundingbox.get_points_within_bboxs(targets, boundingbox.bbox)
-    targets_within_distance = targets_in_bbox[np.transpose(targets_in_bbox)[1] <= length]
-    return targets_within_distance
+    validate_return_format(return_format)
+    frame = targets if is_dataframe(targets) else None
+    targets = as_targets(as_target_columns(targets), validate)
+    with query('get_points_within_distance'):
+        if isinstance(targets, UnitVectorIndex):
+            validate_latlon_degrees(source)
+            validate_units(units)
+            positions, distances = targets.positions_within_distance(source, length, units)
+            count(WITHIN_DISTANCE, len(positions))
+            with stage(SORT):
+                order = np.argsort(distances, kind='stable')
+            positions, distances = positions[order], distances[order]
+            return format_results(targets.order[positions], targets.targets_at(positions), distances, return_format)
+
+        boundingbox = BoundingBox(source, length, units)
+        if executor is None or isinstance(targets, (TargetIndex, CellIndex)):
+            indices, targets_within_distance, distances = points_within_distance(targets, boundingbox)
+        else:
+            with stage(SHARDS):
+                shards = map_shards(executor, points_within_distance, targets, boundingbox)
+            indices, targets_within_distance, distances = merge_shard_results(shards)
+
+        with stage(SORT):
+            order = np.argsort(distances, kind='stable')
+        return format_results(indices[order], targets_within_distance[order], distances[order], return_format,
+                              frame)
 
 
-def closest_points_are_within_length(targets_distance, N, length):
+def closest_points(targets, source_degrees, N, length=None, units=KM):
     """
-    :param targets_dist: iterable of the form [(lat, lon), dist]
+    When fewer than N targets lie within length of the source, the bounding box is enlarged and
+    only the targets in the newly covered region have their distance computed.
+    :param targets: iterable of lat-lon pairs or a TargetIndex
+    :param source_degrees: lat-lon tuple
     :param N: strictly positive integer
-    :param length: positive number
-    :return: boolean, whether the distance from source to the N-th point in targets_dist is leq to length
+    :param length: positive number, the size of the initial bounding box.
+    If None it is estimated from the number of targets.
+    :param units: KM or MILES
+    :return: (indices, targets_closest, distances), the N targets closest to source sorted by distance,
+    and their positions in targets
     """
-    return targets_distance[:N][-1][1] <= length
-
-
-def get_closest_points(source_degrees, targets, N, length=None):
-    validate_strictly_positive_integer(N)
+    targets = as_targets(targets)
     if N > len(targets):
         N = len(targets)
+    if length is None:
+        length = cap_radius_for_fraction(N / max(len(targets), 1), units)
 
-    boundingbox = BoundingBox(source_degrees, length)
-    targets_filtered = boundingbox.filter_targets_in_bboxs(targets, boundingbox.bbox)
-    targets_distance = boundingbox.compute_distances_from_source(source_degrees, targets_filtered)
+    boundingbox = BoundingBox(source_degrees, length, units)
+    indices, targets_filtered, distances = boundingbox.compute_distances_in_bboxs(targets, boundingbox.bbox)
+    # a box of this size contains every target
+    max_length = np.nextafter(np.pi * EARTH_RADIUS[units], np.inf)
 
-    while (len(targets_distance) < N) or not closest_points_are_within_length(targets_distance, N, boundingbox.length):
-        print('Rescaling box, consider using a larger initial length')
-    # rescale 
-        if len(targets_distance) < N:
-            boundingbox.length *= 1.25
+    iterations = 0
+    while np.count_nonzero(distances <= boundingbox.length) < N:
+        iterations += 1
+        if len(distances) >= N:
+            # the N-th closest target found so far bounds the distance of the N-th closest target
+            new_length = np.partition(distances, N - 1)[N - 1]
         else:
-            # set length to be the distance from source to the N-th point. 
-            Nth_point_distance = targets_distance[:N][-1][1]
-            if Nth_point_distance <= boundingbox.length:
-                boundingbox.length *= 1.25
+            # grow the box to the area expected to hold N targets at the density seen so far
+            area_ratio = np.clip(1.2 * N / max(len(distances), 1), 1.25 ** 2, 16)
+            if boundingbox.length > 0:
+                new_length = scale_cap_radius(boundingbox.length, area_ratio, units)
             else:
-                boundingbox.length = Nth_point_distance
+                # a zero length does not grow when scaled, start over at the size expected to hold N targets
+                new_length = cap_radius_for_fraction(N / len(targets), units)
+        boundingbox.length = min(float(new_length), max_length)
+
+        previous_bbox = boundingbox.bbox
+        with stage(MAKE_BOUNDING_BOX):
+            boundingbox.bbox = boundingbox.make_bounding_box(boundingbox.source_radians, boundingbox.length)
+        indices_new, targets_new = boundingbox.filter_indices_in_annulus(targets, boundingbox.bbox, previous_bbox)
+        count(CANDIDATES, len(indices_new))
+        indices = np.concatenate((indices, indices_new))
+        targets_filtered = np.concatenate((targets_filtered, targets_new))
+        with stage(HAVERSINE):
+            distances = np.concatenate((distances, haversine_distances(source_degrees, targets_new, units)))
+
+    if iterations:
+        logger.debug('get_closest_points rescaled the box %d times, consider using a larger initial length',
+                     iterations)
+    count(RESCALES, iterations)
+    count(WITHIN_DISTANCE, np.count_nonzero(distances <= boundingbox.length))
+
+    with stage(SORT):
+        closest = np.argpartition(distances, N - 1)[:N] if N < len(distances) else np.arange(len(distances))
+        closest = closest[np.argsort(distances[closest], kind='stable')]
+    return indices[closest], targets_filtered[closest], distances[closest]
+
+
+def get_closest_points(source_degrees, targets, N, length=None, units=KM, engine=BBOX, executor=None,
+                       return_format=TUPLES, validate=True):
+    """
+    With the BBOX engine, when fewer than N targets lie within length of the source, the bounding box is
+    enlarged and only the targets in the newly covered region have their distance computed.
+    The KDTREE engine answers exactly in one tree traversal and ignores length.
+    :param source_degrees: lat-lon tuple
+    :param targets: iterable of lat-lon pairs, LatLonColumns, a pandas DataFrame with lat and lon columns,
+    a TargetIndex, a CellIndex or a UnitVectorTree
+    :param N: strictly positive integer
+    :param length: positive number, the size of the initial bounding box.
+    If None it is estimated from the number of targets.
+    :param units: KM or MILES
+    :param engine: BBOX or KDTREE, a UnitVectorTree as targets always uses KDTREE
+    :param executor: optional concurrent.futures.Executor for the BBOX engine, each shard of the targets
+    then finds its own N closest targets in parallel and the shard results are merged.
+    A TargetIndex or a CellIndex is always searched in the calling thread.
+    :param return_format: TUPLES, INDICES or STRUCTURED, see results.format_results
+    :param validate: False to skip the validation of source and targets,
+    a TargetIndex or a UnitVectorTree is never validated again
+    :return: the N targets closest to source, sorted by dist.
+    With TUPLES, np array where each element is of the form [(lat, lon), dist],
+    or for a DataFrame the matching rows with their index and a distance column.
+    """
+    validate_strictly_positive_integer(N)
+    validate_engine(engine)
+    validate_return_format(return_format)
+    if validate:
+        validate_latlon_degrees(source_degrees)
+    frame = targets if is_dataframe(targets) else None
+    targets = as_target_columns(targets)
+    with query('get_closest_points'):
+        if isinstance(targets, UnitVectorTree) or engine == KDTREE:
+            with stage(KDTREE_QUERY):
+                tree = targets if isinstance(targets, UnitVectorTree) else UnitVectorTree(targets, validate=validate)
+                positions = tree.query_positions([source_degrees], N)[0] if N < len(tree) else np.arange(len(tree))
+            count(CANDIDATES, len(positions))
+            with stage(HAVERSINE):
+                distances = haversine_distances(source_degrees, tree.targets[positions], units)
+            with stage(SORT):
+                order = np.argsort(distances, kind='stable')
+            positions, distances = positions[order], distances[order]
+            return format_results(tree.original_indices(positions), tree.targets[positions], distances,
+                                  return_format, frame)
+
+        targets = as_targets(targets, validate)
+
+        if executor is None or isinstance(targets, (TargetIndex, CellIndex)):
+            return format_results(*closest_points(targets, source_degrees, N, length, units), return_format, frame)
+
+        with stage(SHARDS):
+            shards = map_shards(executor, closest_points, targets, source_degrees, N, length, units)
+        indices, targets_closest, distances = merge_shard_results(shards)
+        with stage(SORT):
+            closest = np.argsort(distances, kind='stable')[:N]
+        return format_results(indices[closest], targets_closest[closest], distances[closest], return_format,
+                              frame)
+
+
+def iter_distances_in_bbox(targets, boundingbox):
+    """
+    :param targets: iterable of lat-lon pairs or a TargetIndex
+    :param boundingbox: BoundingBox
+    :return: generator of np arrays, block by block, of the distances to the source of boundingbox
+    of the targets inside its bbox
+    """
+    for _, lats, lons in boundingbox.sweep_bboxs(targets, boundingbox.bbox):
+        count(CANDIDATES, len(lats))
+        with stage(HAVERSINE):
+            distances = haversine_distances_columns(boundingbox.source_degrees, lats, lons, boundingbox.units)
+        yield distances
+
+
+def count_points_within_distance(source, targets, length, units=KM, validate=True):
+    """
+    All the radii are counted in one pass over the targets, with the bounding box of the largest one.
+    Only counts are accumulated, the targets within distance are never gathered.
+    :param source: lat-lon tuple
+    :param targets: iterable of lat-lon pairs, LatLonColumns, a pandas DataFrame or a TargetIndex
+    :param length: positive number, or iterable of positive numbers
+    :param units: KM or MILES
+    :param validate: False to skip the validation of targets, a TargetIndex is never validated again
+    :return: the number of targets whose distance to source is at most length,
+    an int64 np array with one count per radius if length is an iterable
+    """
+    radii = np.asarray(length, dtype=np.float64)
+    for value in radii.ravel():
+        validate_positive_number(value)
+    targets = as_targets(as_target_columns(targets), validate)
+    with query('count_points_within_distance'):
+        order = np.argsort(radii.ravel())
+        sorted_radii = radii.ravel()[order]
+        # within_radius[j] counts the targets whose first radius at least as large as their distance is sorted_radii[j]
+        within_radius = np.zeros(len(sorted_radii) + 1, dtype=np.int64)
+        if len(sorted_radii):
+            boundingbox = BoundingBox(source, sorted_radii[-1], units)
+            for distances in iter_distances_in_bbox(targets, boundingbox):
+                within_radius += np.bincount(np.searchsorted(sorted_radii, distances, side='left'),
+                                             minlength=len(within_radius))
+        counts = np.empty(len(sorted_radii), dtype=np.int64)
+        counts[order] = np.cumsum(within_radius[:-1])
+        count(WITHIN_DISTANCE, counts.max(initial=0))
+    if radii.ndim == 0:
+        return int(counts[0])
+    return counts.reshape(radii.shape)
+
+
+def distance_histogram(source, targets, bins, units=KM, validate=True):
+    """
+    Only the targets inside the bounding box of the last edge are read, and only counts are accumulated.
+    :param source: lat-lon tuple
+    :param targets: iterable of lat-lon pairs, LatLonColumns, a pandas DataFrame or a TargetIndex
+    :param bins: iterable of increasing positive numbers, the edges of the distance bins
+    :param units: KM or MILES
+    :param validate: False to skip the validation of targets, a TargetIndex is never validated again
+    :return: int64 np array of length len(bins) - 1, the number of targets whose distance to source is in
+    each bin. As np.histogram, the bins are half-open [bins[i], bins[i + 1]) except the last which is closed.
+    """
+    bins = np.asarray(bins, dtype=np.float64)
+    if bins.ndim != 1 or len(bins) < 2 or np.any(np.diff(bins) <= 0):
+        raise ValueError('Bins must be at least two increasing distances')
+    validate_positive_number(bins[0])
+    targets = as_targets(as_target_columns(targets), validate)
+    with query('distance_histogram'):
+        histogram = np.zeros(len(bins) - 1, dtype=np.int64)
+        boundingbox = BoundingBox(source, bins[-1], units)
+        for distances in iter_distances_in_bbox(targets, boundingbox):
+            histogram += np.histogram(distances, bins)[0]
+        count(WITHIN_DISTANCE, histogram.sum())
+    return histogram
+
+
+def get_points_within_distance_many(sources, targets, length, units=KM, validate=True):
+    """
+    :param sources: iterable of lat-lon pairs, LatLonColumns or a pandas DataFrame
+    :param targets: iterable of lat-lon pairs, LatLonColumns, a pandas DataFrame or a TargetIndex
+    :param length: positive number, or np array with one length per source
+    :param units: KM or MILES
+    :param validate: False to skip the validation of sources and targets, a TargetIndex is never validated again
+    :return: RaggedResult(offsets, indices, distances), where the targets within length of sources[i] are
+    targets[indices[offsets[i]:offsets[i + 1]]], sorted by distance.
+    """
+    for value in np.ravel(length):
+        validate_positive_number(value)
+    sources = as_latlon_array(as_target_columns(sources))
+    if validate:
+        validate_latlons_array(sources)
+    with query('get_points_within_distance_many'):
+        index = as_target_index(as_target_columns(targets), validate)
+
+        pairs = list(within_distance_pairs(sources, index, length, units))
+        source_ids = np.concatenate([p[0] for p in pairs] + [np.empty(0, dtype=np.int64)])
+        positions = np.concatenate([p[1] for p in pairs] + [np.empty(0, dtype=np.int64)])
+        distances = np.concatenate([p[2] for p in pairs] + [np.empty(0)])
+        with stage(SORT):
+            return make_ragged_result(len(sources), source_ids, index.order[positions], distances)
+
+
+def get_closest_points_many(sources, targets, N, length=None, units=KM, engine=BBOX, validate=True):
+    """
+    :param sources: iterable of lat-lon pairs, LatLonColumns or a pandas DataFrame
+    :param targets: iterable of lat-lon pairs, LatLonColumns, a pandas DataFrame, a TargetIndex or a UnitVectorTree
+    :param N: strictly positive integer
+    :param length: positive number, the size of the initial bounding boxes.
+    If None it is estimated from the number of targets. Ignored by the KDTREE engine.
+    :param units: KM or MILES
+    :param engine: BBOX or KDTREE, a UnitVectorTree as targets always uses KDTREE
+    :param validate: False to skip the validation of sources and targets,
+    a TargetIndex or a UnitVectorTree is never validated again
+    :return: RaggedResult(offsets, indices, distances), where the N targets closest to sources[i] are
+    targets[indices[offsets[i]:offsets[i + 1]]], sorted by distance.
+    """
+    validate_strictly_positive_integer(N)
+    validate_engine(engine)
+    sources = as_latlon_array(as_target_columns(sources))
+    if validate:
+        validate_latlons_array(sources)
+    targets = as_target_columns(targets)
+    with query('get_closest_points_many'):
+        if isinstance(targets, UnitVectorTree) or engine == KDTREE:
+            tree = targets if isinstance(targets, UnitVectorTree) else UnitVectorTree(targets, validate=validate)
+            N = min(N, len(tree))
+            offsets = np.arange(len(sources) + 1, dtype=np.int64) * N
+            if N == 0:
+                return RaggedResult(offsets, np.empty(0, dtype=np.int64), np.empty(0))
+            with stage(KDTREE_QUERY):
+                indices, distances = tree.query(sources, N, units)
+            return RaggedResult(offsets, indices.ravel(), distances.ravel())
+
+        index = as_target_index(targets, validate)
+        N = min(N, len(index))
+
+        if length is None:
+            length = cap_radius_for_fraction(N / max(len(index), 1), units)
+        validate_positive_number(length)
+        # a box of this size contains every target
+        max_length = np.nextafter(np.pi * EARTH_RADIUS[units], np.inf)
+        lengths = np.full(len(sources), min(float(length), max_length))
+
+        indices = np.empty((len(sources), N), dtype=np.int64)
+        distances = np.empty((len(sources), N))
+        pending = np.arange(len(sources))
+        while len(pending):
+            within = get_points_within_distance_many(sources[pending], index, lengths[pending], units, validate=False)
+            counts = np.diff(within.offsets)
+            done = counts >= N
+
+            closest = within.offsets[:-1][done, np.newaxis] + np.arange(N)
+            indices[pending[done]] = within.indices[closest]
+            distances[pending[done]] = within.distances[closest]
+
+            # grow the remaining boxes to the area expected to hold N targets at the density seen so far
+            area_ratio = np.clip(1.2 * N / np.maximum(counts[~done], 1), 1.25 ** 2, 16)
+            pending = pending[~done]
+            # a zero length does not grow when scaled, those boxes start over at the size expected to hold N targets
+            lengths[pending] = np.where(lengths[pending] > 0, scale_cap_radius(lengths[pending], area_ratio, units),
+                                        cap_radius_for_fraction(N / len(index), units))
+            lengths[pending] = np.minimum(lengths[pending], max_length)
+            count(RESCALES, len(pending))
 
-        boundingbox.bbox = boundingbox.make_bounding_box(boundingbox.source_radians, boundingbox.length)
-        targets_filtered = boundingbox.filter_targets_in_bboxs(targets, boundingbox.bbox)
-        targets_distance = boundingbox.compute_distances_from_source(source_degrees, targets_filtered)
-        
-    return targets_distance[:N]
+        offsets = np.arange(len(sources) + 1, dtype=np.int64) * N
+        return RaggedResult(offsets, indices.ravel(), distances.ravel())
@@ -0,0 +1,263 @@
+"""
+A mutable index of targets identified by stable ids, for point sets which change between queries.
+
+The targets are kept in slots of growable arrays and bucketed by the cell of a regular grid (see grid.py).
+Inserting appends a slot to its cell's bucket. Deleting marks the slot dead. Moving updates the slot in place
+within the same cell, and otherwise deletes and re-inserts. A query only reads the buckets of the cells covering
+its bounding box before applying the bbox test and the haversine distance. Dead slots are dropped by compact(),
+which runs automatically once they outnumber the live ones, so every operation is amortized O(1) in the number
+of targets.
+"""
+
+from itertools import chain
+
+import numpy as np
+
+from boundingbox.boundingbox import BoundingBox
+from boundingbox.great_circle import haversine_distances_columns, cap_radius_for_fraction, scale_cap_radius
+from boundingbox.grid import DEFAULT_CELL_SIZE, cell_ids, cells_in_bboxs
+from boundingbox.instrumentation import query, stage, count, BBOX_FILTER, HAVERSINE, SORT, CANDIDATES, \
+    WITHIN_DISTANCE, RESCALES
+from boundingbox.settings import EARTH_RADIUS, KM
+from boundingbox.validations.coordinates import validate_latlon_degrees, validate_latlons_array
+from boundingbox.validations.numbers import validate_positive_number, validate_strictly_positive_integer, \
+    validate_strictly_positive_number
+
+INITIAL_CAPACITY = 1024
+# dead slots are dropped once there are more of them than this and than live slots
+MIN_DEAD_SLOTS_TO_COMPACT = 1024
+
+
+def make_ids_array(ids):
+    """
+    :param ids: list of ids
+    :return: np array of shape (len(ids),), of the dtype numpy gives to ids when they all have the same type,
+    e.g. int64, otherwise of dtype object
+    """
+    if len({type(target_id) for target_id in ids}) == 1:
+        array = np.asarray(ids)
+        if array.shape == (len(ids),):
+            return array
+    array = np.empty(len(ids), dtype=object)
+    array[:] = ids
+    return array
+
+
+class DynamicIndex:
+    def __init__(self, cell_size=DEFAULT_CELL_SIZE):
+        """
+        :param cell_size: size of the grid cells in degrees, about the radius of the typical query works well
+        """
+        validate_strictly_positive_number(cell_size)
+        self.cell_size = cell_size
+        self._lats = np.empty(INITIAL_CAPACITY)
+        self._lons = np.empty(INITIAL_CAPACITY)
+        self._cells = np.empty(INITIAL_CAPACITY, dtype=np.int64)
+        self._alive = np.zeros(INITIAL_CAPACITY, dtype=bool)
+        # _ids[slot] is the id of the target in slot, None for a dead slot
+        self._ids = []
+        self._slots = {}
+        self._buckets = {}
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, target_id):
+        return target_id in self._slots
+
+    @property
+    def ids(self):
+        """
+        :return: list of the ids of the targets in the index
+        """
+        return list(self._slots)
+
+    def position(self, target_id):
+        """
+        :param target_id: id of a target in the index
+        :return: lat-lon tuple of the target
+        """
+        slot = self._slots[target_id]
+        return float(self._lats[slot]), float(self._lons[slot])
+
+    def _grow(self, capacity):
+        self._lats = np.resize(self._lats, capacity)
+        self._lons = np.resize(self._lons, capacity)
+        self._cells = np.resize(self._cells, capacity)
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:len(self._ids)] = self._alive[:len(self._ids)]
+        self._alive = alive
+
+    def _append_slot(self, target_id, lat, lon, cell):
+        slot = len(self._ids)
+        if slot == len(self._lats):
+            self._grow(2 * len(self._lats))
+        self._lats[slot], self._lons[slot], self._cells[slot], self._alive[slot] = lat, lon, cell, True
+        self._ids.append(target_id)
+        self._slots[target_id] = slot
+        self._buckets.setdefault(cell, []).append(slot)
+
+    def _kill_slot(self, slot):
+        self._alive[slot] = False
+        self._ids[slot] = None
+
+    def insert(self, target_id, latlon):
+        """
+        :param target_id: hashable id, not already in the index
+        :param latlon: lat-lon tuple in degrees
+        """
+        if target_id in self._slots:
+            raise ValueError('Id {!r} is already in the index, use move'.format(target_id))
+        validate_latlon_degrees(latlon)
+        lat, lon = float(latlon[0]), float(latlon[1])
+        self._append_slot(target_id, lat, lon, int(cell_ids(lat, lon, self.cell_size)))
+
+    def insert_many(self, target_ids, latlons):
+        """
+        :param target_ids: iterable of hashable ids, none already in the index
+        :param latlons: iterable of lat-lon pairs in degrees, one per id
+        """
+        target_ids = list(target_ids)
+        latlons = np.asarray(latlons, dtype=np.float64).reshape(-1, 2)
+        if len(target_ids) != len(latlons):
+            raise ValueError('There must be one lat-lon pair per id')
+        if len(set(target_ids)) != len(target_ids) or any(target_id in self._slots for target_id in target_ids):
+            raise ValueError('Ids must be unique and not already in the index')
+        validate_latlons_array(latlons)
+        cells = cell_ids(latlons[:, 0], latlons[:, 1], self.cell_size).tolist()
+        for target_id, (lat, lon), cell in zip(target_ids, latlons.tolist(), cells):
+            self._append_slot(target_id, lat, lon, cell)
+
+    def delete(self, target_id):
+        """
+        :param target_id: id of a target in the index, KeyError otherwise
+        """
+        self._kill_slot(self._slots.pop(target_id))
+        self._maybe_compact()
+
+    def move(self, target_id, latlon):
+        """
+        :param target_id: id of a target in the index, KeyError otherwise
+        :param latlon: new lat-lon tuple in degrees
+        """
+        slot = self._slots[target_id]
+        validate_latlon_degrees(latlon)
+        lat, lon = float(latlon[0]), float(latlon[1])
+        cell = int(cell_ids(lat, lon, self.cell_size))
+        if cell == self._cells[slot]:
+            self._lats[slot], self._lons[slot] = lat, lon
+            return
+        self._kill_slot(slot)
+        del self._slots[target_id]
+        self._append_slot(target_id, lat, lon, cell)
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        dead = len(self._ids) - len(self._slots)
+        if dead > MIN_DEAD_SLOTS_TO_COMPACT and dead > len(self._slots):
+            self.compact()
+
+    def compact(self):
+        """
+        Drop the dead slots and rebuild the buckets, O(number of targets).
+        """
+        alive = np.flatnonzero(self._alive[:len(self._ids)])
+        capacity = max(INITIAL_CAPACITY, 2 * len(alive))
+        lats, lons, cells = np.empty(capacity), np.empty(capacity), np.empty(capacity, dtype=np.int64)
+        lats[:len(alive)] = self._lats[alive]
+        lons[:len(alive)] = self._lons[alive]
+        cells[:len(alive)] = self._cells[alive]
+        self._lats, self._lons, self._cells = lats, lons, cells
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._alive[:len(alive)] = True
+        self._ids = [self._ids[slot] for slot in alive.tolist()]
+        self._slots = {target_id: slot for slot, target_id in enumerate(self._ids)}
+
+        order = np.argsort(cells[:len(alive)], kind='stable')
+        sorted_cells = cells[order]
+        starts = np.flatnonzero(np.diff(sorted_cells, prepend=-1))
+        self._buckets = {cell: bucket.tolist() for cell, bucket in
+                         zip(sorted_cells[starts].tolist(), np.split(order, starts[1:]))}
+
+    def _slots_in_bboxs(self, boundingbox):
+        """
+        :param boundingbox: BoundingBox
+        :return: np array of the live slots inside the bbox of boundingbox
+        """
+        with stage(BBOX_FILTER):
+            cells = cells_in_bboxs(boundingbox.bbox, self.cell_size)
+            if len(cells) < len(self._buckets):
+                buckets = [self._buckets.get(cell) for cell in cells.tolist()]
+            else:
+                # a large box, reading every bucket is cheaper than looking up its cells
+                buckets = self._buckets.values()
+            slots = np.fromiter(chain.from_iterable(bucket for bucket in buckets if bucket), dtype=np.int64)
+            slots = slots[self._alive[slots]]
+            in_bbox = boundingbox.mask_in_bounding_boxes(self._lats[slots], self._lons[slots], boundingbox.bbox)
+            return slots[in_bbox]
+
+    def _distances_within(self, source, length, units):
+        """
+        :return: (slots, distances) of the live targets at most length from source, unsorted
+        """
+        boundingbox = BoundingBox(source, length, units)
+        slots = self._slots_in_bboxs(boundingbox)
+        count(CANDIDATES, len(slots))
+        with stage(HAVERSINE):
+            distances = haversine_distances_columns(source, self._lats[slots], self._lons[slots], units)
+        within_distance = distances <= length
+        return slots[within_distance], distances[within_distance]
+
+    def _results(self, slots, distances, N=None):
+        with stage(SORT):
+            order = np.argsort(distances, kind='stable')[:N]
+        return make_ids_array([self._ids[slot] for slot in slots[order].tolist()]), distances[order]
+
+    def get_points_within_distance(self, source, length, units=KM):
+        """
+        :param source: lat-lon tuple
+        :param length: positive number
+        :param units: KM or MILES
+        :return: (ids, distances), np arrays of the ids of the targets whose distance to source is at most length
+        and of their distances, sorted by distance
+        """
+        validate_positive_number(length)
+        with query('DynamicIndex.get_points_within_distance'):
+            slots, distances = self._distances_within(source, length, units)
+            count(WITHIN_DISTANCE, len(slots))
+            return self._results(slots, distances)
+
+    def get_closest_points(self, source, N, length=None, units=KM):
+        """
+        When fewer than N targets lie within length of the source, the length is increased until they do.
+        :param source: lat-lon tuple
+        :param N: strictly positive integer
+        :param length: positive number, the size of the initial bounding box.
+        If None it is estimated from the number of targets.
+        :param units: KM or MILES
+        :return: (ids, distances), np arrays of the ids of the N targets closest to source
+        and of their distances, sorted by distance
+        """
+        validate_strictly_positive_integer(N)
+        N = min(N, len(self))
+        if length is None:
+            length = cap_radius_for_fraction(N / max(len(self), 1), units)
+        validate_positive_number(length)
+        # a box of this size contains every target
+        max_length = np.nextafter(np.pi * EARTH_RADIUS[units], np.inf)
+        length = min(float(length), max_length)
+
+        with query('DynamicIndex.get_closest_points'):
+            slots, distances = self._distances_within(source, length, units)
+            while len(slots) < N:
+                # grow the box to the area expected to hold N targets at the density seen so far
+                area_ratio = np.clip(1.2 * N / max(len(slots), 1), 1.25 ** 2, 16)
+                if length > 0:
+                    length = min(float(scale_cap_radius(length, area_ratio, units)), max_length)
+                else:
+                    # a zero length does not grow when scaled, start over at the size expected to hold N targets
+                    length = float(cap_radius_for_fraction(N / len(self), units))
+                count(RESCALES, 1)
+                slots, distances = self._distances_within(source, length, units)
+            count(WITHIN_DISTANCE, len(slots))
+            return self._results(slots, distances, N)
@@ -0,0 +1,58 @@
+"""
+pandas DataFrames as targets: a DataFrame with lat and lon columns is queried through views of these two columns,
+and the matching rows are returned as a slice of the DataFrame, with its index and a distance column.
+
+pandas is never imported here, a DataFrame can only be passed once the caller has imported it.
+"""
+
+import sys
+
+from boundingbox.coordinates import LatLonColumns
+
+LAT_COLUMN = 'lat'
+LON_COLUMN = 'lon'
+DISTANCE_COLUMN = 'distance'
+
+
+def is_dataframe(targets):
+    """
+    :param targets: any object
+    :return: whether targets is a pandas DataFrame
+    """
+    pandas = sys.modules.get('pandas')
+    return pandas is not None and isinstance(targets, pandas.DataFrame)
+
+
+def frame_columns(frame, lat_column=LAT_COLUMN, lon_column=LON_COLUMN):
+    """
+    :param frame: pandas DataFrame
+    :param lat_column: name of the column of latitudes in degrees
+    :param lon_column: name of the column of longitudes in degrees
+    :return: LatLonColumns, views of the two columns when they are float64
+    """
+    missing = [column for column in (lat_column, lon_column) if column not in frame.columns]
+    if missing:
+        raise ValueError('DataFrame targets must have columns {!r} and {!r}, missing {}'.format(
+            lat_column, lon_column, missing))
+    return LatLonColumns(frame[lat_column].to_numpy(), frame[lon_column].to_numpy())
+
+
+def as_target_columns(targets):
+    """
+    :param targets: pandas DataFrame, or any targets accepted by the queries
+    :return: LatLonColumns of a DataFrame, other targets unchanged
+    """
+    if is_dataframe(targets):
+        return frame_columns(targets)
+    return targets
+
+
+def make_frame_results(frame, indices, distances, distance_column=DISTANCE_COLUMN):
+    """
+    :param frame: pandas DataFrame
+    :param indices: np array of shape (M,) of row positions in frame
+    :param distances: np array of shape (M,) of distances
+    :param distance_column: name of the column of distances added, replaced if frame already has it
+    :return: DataFrame of the rows of frame at indices, in this order, with their index and the distance column
+    """
+    return frame.iloc[indices].assign(**{distance_column: distances})
@@ -0,0 +1,90 @@
+"""
+Vectorized great-circle distances between a source and arrays of lat-lon pairs.
+"""
+
+import numpy as np
+
+from boundingbox.settings import EARTH_RADIUS, KM
+
+
+def haversine_distances_columns(source_degrees, lats_degrees, lons_degrees, units=KM):
+    """
+    :param source_degrees: lat-lon pair in degrees, either entry may be an np array broadcasting against lats_degrees
+    :param lats_degrees: np array of latitudes in degrees
+    :param lons_degrees: np array of longitudes in degrees, same shape as lats_degrees
+    :param units: KM or MILES
+    :return: np array of great-circle distances from source to each (lat, lon)
+    """
+    source_lat = np.radians(source_degrees[0])
+    source_lon = np.radians(source_degrees[1])
+    lats = np.radians(lats_degrees)
+    lons = np.radians(lons_degrees)
+
+    a = np.sin((lats - source_lat) * 0.5) ** 2 + \
+        np.cos(source_lat) * np.cos(lats) * np.sin((lons - source_lon) * 0.5) ** 2
+    # rounding can push a marginally above 1 for antipodal points
+    np.clip(a, 0, 1, out=a)
+    return 2 * EARTH_RADIUS[units] * np.arcsin(np.sqrt(a))
+
+
+def haversine_distances(source_degrees, targets_degrees, units=KM):
+    """
+    :param source_degrees: lat-lon pair in degrees
+    :param targets_degrees: np array of shape (M, 2) of lat-lon pairs in degrees
+    :param units: KM or MILES
+    :return: np array of shape (M,) with the great-circle distance from source to each target
+    """
+    targets_degrees = np.asarray(targets_degrees, dtype=np.float64).reshape(-1, 2)
+    return haversine_distances_columns(source_degrees, targets_degrees[:, 0], targets_degrees[:, 1], units)
+
+
+def cap_radius_for_fraction(fraction, units=KM):
+    """
+    :param fraction: number or np array in [0, 1]
+    :param units: KM or MILES
+    :return: the radius of a spherical cap covering this fraction of the sphere's area
+    """
+    return EARTH_RADIUS[units] * np.arccos(np.clip(1 - 2 * np.asarray(fraction, dtype=np.float64), -1, 1))
+
+
+def scale_cap_radius(lengths, area_ratio, units=KM):
+    """
+    :param lengths: positive number or np array, radii of spherical caps
+    :param area_ratio: positive number or np array
+    :param units: KM or MILES
+    :return: the radii of the caps whose areas are area_ratio times the areas of the caps of radius lengths,
+    at most half the circumference of the sphere
+    """
+    # the area is proportional to sin(angle / 2) ** 2 rather than 1 - cos(angle), which is 0 below about 0.1 m
+    area = np.sin(np.asarray(lengths, dtype=np.float64) / (2 * EARTH_RADIUS[units])) ** 2 * area_ratio
+    return 2 * EARTH_RADIUS[units] * np.arcsin(np.sqrt(np.clip(area, 0, 1)))
+
+
+def latlon_degrees_to_unit_vectors(lats_degrees, lons_degrees):
+    """
+    :param lats_degrees: np array of latitudes in degrees
+    :param lons_degrees: np array of longitudes in degrees
+    :return: np array of shape (M, 3) of the points as cartesian vectors on the unit sphere
+    """
+    lats = np.radians(lats_degrees)
+    lons = np.radians(lons_degrees)
+    cos_lats = np.cos(lats)
+    return np.column_stack((cos_lats * np.cos(lons), cos_lats * np.sin(lons), np.sin(lats)))
+
+
+def chord_to_distance(chord, units=KM):
+    """
+    :param chord: number or np array, straight-line distances between points on the unit sphere
+    :param units: KM or MILES
+    :return: the great-circle distances between the same points
+    """
+    return 2 * EARTH_RADIUS[units] * np.arcsin(np.clip(np.asarray(chord) / 2, 0, 1))
+
+
+def distance_to_chord(length, units=KM):
+    """
+    :param length: number or np array, great-circle distances
+    :param units: KM or MILES
+    :return: the straight-line distances on the unit sphere between points this far apart
+    """
+    return 2 * np.sin(np.minimum(np.asarray(length) / EARTH_RADIUS[units], np.pi) / 2)
@@ -0,0 +1,77 @@
+"""
+A regular latitude-longitude grid of cells, and the cells covering the bounding boxes of BoundingBox.
+
+Cell ids number the cells row by row from the south-west corner: the cell of (lat, lon) is
+row * n_cols + col with row = floor((lat + 90) / cell_size) and col = floor((lon + 180) / cell_size).
+The latitude 90 and the longitude 180 fall in the last row and column.
+"""
+
+import numpy as np
+
+from boundingbox.settings import NORTH, SOUTH, EAST, WEST
+
+DEFAULT_CELL_SIZE = 1.0
+
+
+def grid_shape(cell_size=DEFAULT_CELL_SIZE):
+    """
+    :param cell_size: size of the cells in degrees
+    :return: (n_rows, n_cols), the number of cells along the latitudes and the longitudes
+    """
+    return int(np.ceil(180 / cell_size)), int(np.ceil(360 / cell_size))
+
+
+def cell_rows(lats_degrees, cell_size=DEFAULT_CELL_SIZE):
+    """
+    :param lats_degrees: latitude or np array of latitudes in degrees
+    :param cell_size: size of the cells in degrees
+    :return: the grid row of each latitude
+    """
+    n_rows = grid_shape(cell_size)[0]
+    return np.clip(np.floor((np.asarray(lats_degrees) + 90) / cell_size), 0, n_rows - 1).astype(np.int64)
+
+
+def cell_cols(lons_degrees, cell_size=DEFAULT_CELL_SIZE):
+    """
+    :param lons_degrees: longitude or np array of longitudes in degrees
+    :param cell_size: size of the cells in degrees
+    :return: the grid column of each longitude
+    """
+    n_cols = grid_shape(cell_size)[1]
+    return np.clip(np.floor((np.asarray(lons_degrees) + 180) / cell_size), 0, n_cols - 1).astype(np.int64)
+
+
+def cell_ids(lats_degrees, lons_degrees, cell_size=DEFAULT_CELL_SIZE):
+    """
+    :param lats_degrees: latitude or np array of latitudes in degrees
+    :param lons_degrees: longitude or np array of longitudes in degrees, same shape as lats_degrees
+    :param cell_size: size of the cells in degrees
+    :return: the id of the cell of each lat-lon pair
+    """
+    return cell_rows(lats_degrees, cell_size) * grid_shape(cell_size)[1] + cell_cols(lons_degrees, cell_size)
+
+
+def cells_in_bbox(bbox, cell_size=DEFAULT_CELL_SIZE):
+    """
+    :param bbox: dict with keys = [north, south, east, west], in degrees.
+    When west > east the bbox wraps across the 180th meridian.
+    :param cell_size: size of the cells in degrees
+    :return: np array of the ids of the cells intersecting bbox, sorted
+    """
+    n_cols = grid_shape(cell_size)[1]
+    rows = np.arange(cell_rows(bbox[SOUTH], cell_size), cell_rows(bbox[NORTH], cell_size) + 1)
+    west, east = cell_cols(bbox[WEST], cell_size), cell_cols(bbox[EAST], cell_size)
+    if bbox[WEST] <= bbox[EAST]:
+        cols = np.arange(west, east + 1)
+    else:
+        cols = np.concatenate((np.arange(0, east + 1), np.arange(west, n_cols)))
+    return (rows[:, np.newaxis] * n_cols + cols).ravel()
+
+
+def cells_in_bboxs(bboxs, cell_size=DEFAULT_CELL_SIZE):
+    """
+    :param bboxs: dict where values are dicts with keys = [north, south, east, west]
+    :param cell_size: size of the cells in degrees
+    :return: np array of the ids of the cells intersecting at least one of the bbox in bboxs, sorted and unique
+    """
+    return np.unique(np.concatenate([cells_in_bbox(bbox, cell_size) for bbox in bboxs.values()]))
@@ -0,0 +1,175 @@
+"""
+Per-query instrumentation of the boundingbox queries.
+
+A hook is a callable which receives one QueryStats per completed query. While no hook is registered,
+queries record nothing: query() and stage() return a shared no-op context manager and count() returns at once.
+
+    with record_queries() as queries:
+        get_closest_points(source, targets, 10)
+    queries[0].stages, queries[0].candidates, queries[0].false_positive_ratio, queries[0].rescales
+
+The current query is held in a context variable. Work done in the workers of an executor is therefore
+not broken down into stages; the time spent waiting on the shards is recorded as the 'shards' stage.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+import time
+
+# stages
+MAKE_BOUNDING_BOX = 'make_bounding_box'
+BBOX_FILTER = 'bbox_filter'
+HAVERSINE = 'haversine'
+DOT_PRODUCT = 'dot_product'
+SORT = 'sort'
+SHARDS = 'shards'
+KDTREE_QUERY = 'kdtree_query'
+
+# counters
+CANDIDATES = 'candidates'
+WITHIN_DISTANCE = 'within_distance'
+RESCALES = 'rescales'
+
+_hooks = []
+_current_query = ContextVar('boundingbox_current_query', default=None)
+
+
+class QueryStats:
+    def __init__(self, name):
+        """
+        :param name: name of the query, e.g. 'get_closest_points'
+        """
+        self.name = name
+        self.duration = 0.0
+        # seconds spent in each stage, summed over the blocks and iterations of the query
+        self.stages = {}
+        # WITHIN_DISTANCE is only counted by the queries which apply a radius test
+        self.counters = {CANDIDATES: 0, RESCALES: 0}
+
+    @property
+    def candidates(self):
+        """
+        :return: number of targets which passed the bbox filter and had their distance computed
+        """
+        return self.counters[CANDIDATES]
+
+    @property
+    def within_distance(self):
+        """
+        :return: number of candidates which passed the exact radius test, None if the query applied none
+        """
+        return self.counters.get(WITHIN_DISTANCE)
+
+    @property
+    def rescales(self):
+        """
+        :return: number of times the bounding box was enlarged
+        """
+        return self.counters[RESCALES]
+
+    @property
+    def false_positive_ratio(self):
+        """
+        :return: fraction of the candidates further than the radius from the source,
+        None without candidates or radius test
+        """
+        if not self.candidates or self.within_distance is None:
+            return None
+        return 1 - self.within_distance / self.candidates
+
+    def __repr__(self):
+        return 'QueryStats({!r}, duration={:.6f}, stages={!r}, counters={!r})'.format(
+            self.name, self.duration, self.stages, self.counters)
+
+
+class _NullContext:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_CONTEXT = _NullContext()
+
+
+def add_hook(hook):
+    """
+    :param hook: callable, called with the QueryStats of every query completed while it is registered
+    """
+    _hooks.append(hook)
+
+
+def remove_hook(hook):
+    """
+    :param hook: callable registered with add_hook
+    """
+    _hooks.remove(hook)
+
+
+@contextmanager
+def record_queries():
+    """
+    :return: context manager yielding the list to which the QueryStats of the queries run in its scope are appended
+    """
+    queries = []
+    add_hook(queries.append)
+    try:
+        yield queries
+    finally:
+        remove_hook(queries.append)
+
+
+@contextmanager
+def _query(name):
+    stats = QueryStats(name)
+    token = _current_query.set(stats)
+    start = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        stats.duration = time.perf_counter() - start
+        _current_query.reset(token)
+        for hook in list(_hooks):
+            hook(stats)
+
+
+def query(name):
+    """
+    :param name: name of the query
+    :return: context manager recording a QueryStats for the hooks. A query run inside another query
+    is recorded as part of the outer one.
+    """
+    if not _hooks or _current_query.get() is not None:
+        return _NULL_CONTEXT
+    return _query(name)
+
+
+@contextmanager
+def _stage(stats, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.stages[name] = stats.stages.get(name, 0.0) + time.perf_counter() - start
+
+
+def stage(name):
+    """
+    :param name: name of the stage
+    :return: context manager adding the time spent in its scope to the stage of the current query
+    """
+    stats = _current_query.get()
+    if stats is None:
+        return _NULL_CONTEXT
+    return _stage(stats, name)
+
+
+def count(name, value):
+    """
+    :param name: name of the counter
+    :param value: integer added to the counter of the current query
+    """
+    stats = _current_query.get()
+    if stats is not None:
+        stats.counters[name] = stats.counters.get(name, 0) + int(value)
@@ -0,0 +1,222 @@
+"""
+Distance join between two sets of lat-lon pairs: every pair (a, b) with a in A and b in B at most length apart.
+
+Both sets are bucketed by the rows of a latitude grid whose rows are about as high as the median bounding box, and
+sorted by longitude within each row. The points of B in a row and a longitude interval are then a contiguous range
+found by binary search, so each point of A only scans, row by row, the points of B in the rows and longitudes of
+its FRONT and REVERSE bounding boxes, rather than whole latitude bands. A is processed in the same order, so
+consecutive points of A scan the same ranges of B. A bounding box much taller than the rows scans its rows whole.
+The pairs are yielded in chunks of bounded size.
+"""
+
+import numpy as np
+
+from boundingbox.batch import make_bounding_box_arrays, longitudes_in_range, _chunk_bounds, MAX_PAIRS
+from boundingbox.coordinates import as_latlon_array, LatLonColumns
+from boundingbox.frames import as_target_columns
+from boundingbox.great_circle import haversine_distances_columns
+from boundingbox.instrumentation import stage, count, MAKE_BOUNDING_BOX, BBOX_FILTER, HAVERSINE, CANDIDATES, \
+    WITHIN_DISTANCE
+from boundingbox.settings import EARTH_RADIUS, KM, NORTH, SOUTH, EAST, WEST, FRONT, REVERSE
+from boundingbox.target_index import TargetIndex
+from boundingbox.validations.coordinates import validate_latlons_array, validate_units
+from boundingbox.validations.numbers import validate_positive_number
+
+# the rows are at least this many degrees high, about 300 m, so that there are at most 2 ** 16 of them
+MIN_ROW_HEIGHT = 180 / 2 ** 16
+# the key of a point is row * ROW_KEY_STRIDE + longitude + 180, the keys of a row all come before the next row
+ROW_KEY_STRIDE = 512.0
+# a bounding box spanning more rows than this scans its rows across all longitudes in one range
+MAX_ROWS_PER_BOX = 8
+
+
+def row_height(lengths, units=KM):
+    """
+    :param lengths: np array of positive numbers
+    :param units: KM or MILES
+    :return: the height in degrees of the rows of the grid, that of the median bounding box
+    """
+    if not len(lengths):
+        return 180.0
+    return float(np.clip(2 * np.degrees(np.median(lengths) / EARTH_RADIUS[units]), MIN_ROW_HEIGHT, 180))
+
+
+class RowBuckets:
+    """
+    Points sorted by the row of their latitude, then by longitude.
+    """
+
+    def __init__(self, lats_degrees, lons_degrees, height):
+        """
+        :param lats_degrees: np array of latitudes in degrees
+        :param lons_degrees: np array of longitudes in degrees, aligned with lats_degrees
+        :param height: height of the rows in degrees
+        """
+        self.height = height
+        keys = self.rows(lats_degrees) * ROW_KEY_STRIDE + (lons_degrees + 180)
+        # order[i] is the position in the original points of the i-th sorted point
+        self.order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.order]
+        self.latitudes = lats_degrees[self.order]
+        self.longitudes = lons_degrees[self.order]
+
+    def rows(self, lats_degrees):
+        """
+        :param lats_degrees: np array of latitudes in degrees
+        :return: np array of int64, the row of each latitude, the latitude 90 having a row of its own
+        """
+        return np.floor((np.asarray(lats_degrees) + 90) / self.height).astype(np.int64)
+
+    def ranges(self, first_rows, last_rows, west, east):
+        """
+        :param first_rows: np array of int64
+        :param last_rows: np array of int64, aligned with first_rows
+        :param west: np array of western bounds in degrees in [-180, 180], west <= east
+        :param east: np array of eastern bounds in degrees
+        :return: (starts, stops), np arrays of ranges of the sorted points holding at least the points of rows
+        first_rows to last_rows with a longitude in [west, east], and, when first_rows == last_rows, at most
+        the points of this row
+        """
+        # rounding the keys does not change their order, so the ranges can only include more points
+        starts = np.searchsorted(self.keys, first_rows * ROW_KEY_STRIDE + (west + 180), side='left')
+        stops = np.searchsorted(self.keys, last_rows * ROW_KEY_STRIDE + (east + 180), side='right')
+        return starts, np.maximum(stops, starts)
+
+
+def _box_segments(buckets, south, north, west, east):
+    """
+    :param buckets: RowBuckets
+    :param south: np array of the southern bounds of the boxes in degrees
+    :param north: np array of the northern bounds
+    :param west: np array of the western bounds, the box wrapping across the 180th meridian when west > east
+    :param east: np array of the eastern bounds
+    :return: (box_ids, starts, stops), np arrays of ranges of the sorted points, each point inside a box being
+    in exactly one range of the box
+    """
+    first_rows, last_rows = buckets.rows(south), buckets.rows(north)
+    n_rows = last_rows - first_rows + 1
+    tall = n_rows > MAX_ROWS_PER_BOX
+    # one row per segment, or all the rows of a tall box in a single segment
+    n_rows = np.where(tall, 1, n_rows)
+    box_ids = np.repeat(np.arange(len(south)), n_rows)
+    row_offsets = np.arange(len(box_ids)) - np.repeat(np.cumsum(n_rows) - n_rows, n_rows)
+    rows = first_rows[box_ids] + row_offsets
+    last = np.where(tall[box_ids], last_rows[box_ids], rows)
+
+    wraps = west[box_ids] > east[box_ids]
+    whole = tall[box_ids]
+    # the eastern part of a wrapping box, [west, 180], or the whole box
+    starts, stops = buckets.ranges(rows, last, np.where(whole, -180, west[box_ids]),
+                                   np.where(whole | wraps, 180, east[box_ids]))
+    # the western part of a wrapping box, [-180, east], before the eastern part in the row
+    west_starts, west_stops = buckets.ranges(rows, rows, np.full(len(rows), -180.0), east[box_ids])
+    west_stops = np.where(wraps & ~whole, np.minimum(west_stops, starts), west_starts)
+
+    return np.concatenate((box_ids, box_ids)), np.concatenate((west_starts, starts)), \
+        np.concatenate((west_stops, stops))
+
+
+def _join_columns(targets, validate):
+    """
+    :param targets: iterable of lat-lon pairs, LatLonColumns or a TargetIndex
+    :param validate: whether to validate the lat-lon pairs, a TargetIndex is never validated again
+    :return: (lats, lons, positions), np arrays where positions maps each point to its position in targets
+    """
+    if isinstance(targets, TargetIndex):
+        return targets.latitudes, targets.longitudes, targets.order
+    if not isinstance(targets, LatLonColumns):
+        targets = as_latlon_array(targets)
+        targets = LatLonColumns(targets[:, 0], targets[:, 1])
+    if validate:
+        targets.validate()
+    return targets.lats, targets.lons, np.arange(len(targets))
+
+
+def distance_join(A, B, length, units=KM, max_pairs=MAX_PAIRS, validate=True):
+    """
+    :param A: iterable of lat-lon pairs, LatLonColumns or a pandas DataFrame
+    :param B: iterable of lat-lon pairs, LatLonColumns, a pandas DataFrame or a TargetIndex
+    :param length: positive number, or np array with one length per point of A
+    :param units: KM or MILES
+    :param max_pairs: upper bound on the number of candidate pairs evaluated, and so yielded, at once
+    :param validate: False to skip the validation of A and B, a TargetIndex is never validated again
+    :return: generator of (a_indices, b_indices, distances) np arrays, one element per pair (A[a], B[b])
+    at most length apart, each pair once. Neither the chunks nor the pairs in a chunk are in any particular order.
+    """
+    validate_units(units)
+    for value in np.ravel(length):
+        validate_positive_number(value)
+    A = as_latlon_array(as_target_columns(A))
+    if validate:
+        validate_latlons_array(A)
+    b_lats, b_lons, b_positions = _join_columns(as_target_columns(B), validate)
+
+    lengths = np.broadcast_to(np.asarray(length, dtype=np.float64), (len(A),))
+    height = row_height(lengths, units)
+    sources = RowBuckets(A[:, 0], A[:, 1], height)
+    targets = RowBuckets(b_lats, b_lons, height)
+    lengths = lengths[sources.order]
+
+    with stage(MAKE_BOUNDING_BOX):
+        bbox = make_bounding_box_arrays(np.column_stack((sources.latitudes, sources.longitudes)), lengths, units)
+    bbox_front, bbox_reverse = bbox[FRONT], bbox[REVERSE]
+    reverse_sources = np.flatnonzero(~np.isnan(bbox_reverse[NORTH]))
+    # the FRONT box of every source, then the REVERSE boxes
+    box_source = np.concatenate((np.arange(len(A)), reverse_sources))
+    box_is_reverse = np.arange(len(box_source)) >= len(A)
+    box_bounds = {side: np.concatenate((bbox_front[side], bbox_reverse[side][reverse_sources]))
+                  for side in [NORTH, SOUTH, EAST, WEST]}
+    segment_box, segment_start, segment_stop = _box_segments(
+        targets, *(box_bounds[side] for side in [SOUTH, NORTH, WEST, EAST]))
+    # the segments of consecutive sources follow each other, so a chunk reads ranges of B close to each other
+    segment_order = np.argsort(box_source[segment_box], kind='stable')
+    segment_box, segment_start = segment_box[segment_order], segment_start[segment_order]
+    segment_count = segment_stop[segment_order] - segment_start
+
+    for start, stop in _chunk_bounds(segment_count, max_pairs):
+        with stage(BBOX_FILTER):
+            counts = segment_count[start:stop]
+            segment_ids = np.repeat(np.arange(stop - start), counts)
+            offsets = np.cumsum(counts) - counts
+            positions = segment_start[start:stop][segment_ids] + np.arange(len(segment_ids)) - offsets[segment_ids]
+            box_ids = segment_box[start:stop][segment_ids]
+            source_ids = box_source[box_ids]
+
+            # the ranges hold every target of the boxes, and the targets of the other rows of tall boxes
+            lats = targets.latitudes[positions]
+            in_rows = (lats >= box_bounds[SOUTH][box_ids]) & (lats <= box_bounds[NORTH][box_ids])
+            # REVERSE covers exactly the longitudes FRONT does not, so no target is matched twice by a source
+            in_front = longitudes_in_range(targets.longitudes[positions],
+                                           bbox_front[WEST][source_ids], bbox_front[EAST][source_ids])
+            in_bbox = in_rows & (in_front != box_is_reverse[box_ids])
+            positions, source_ids = positions[in_bbox], source_ids[in_bbox]
+        count(CANDIDATES, len(positions))
+
+        with stage(HAVERSINE):
+            distances = haversine_distances_columns((sources.latitudes[source_ids], sources.longitudes[source_ids]),
+                                                    targets.latitudes[positions], targets.longitudes[positions],
+                                                    units)
+        within_distance = distances <= lengths[source_ids]
+        count(WITHIN_DISTANCE, np.count_nonzero(within_distance))
+        if np.any(within_distance):
+            yield sources.order[source_ids[within_distance]], b_positions[targets.order[positions[within_distance]]], \
+                distances[within_distance]
+
+
+def distance_join_arrays(A, B, length, units=KM, max_pairs=MAX_PAIRS, validate=True):
+    """
+    :param A: iterable of lat-lon pairs, LatLonColumns or a pandas DataFrame
+    :param B: iterable of lat-lon pairs, LatLonColumns, a pandas DataFrame or a TargetIndex
+    :param length: positive number, or np array with one length per point of A
+    :param units: KM or MILES
+    :param max_pairs: upper bound on the number of candidate pairs evaluated at once
+    :param validate: False to skip the validation of A and B
+    :return: (a_indices, b_indices, distances), all the chunks of distance_join concatenated
+    and sorted by a_indices, then by distance
+    """
+    chunks = list(distance_join(A, B, length, units, max_pairs, validate))
+    a_indices = np.concatenate([chunk[0] for chunk in chunks] + [np.empty(0, dtype=np.int64)])
+    b_indices = np.concatenate([chunk[1] for chunk in chunks] + [np.empty(0, dtype=np.int64)])
+    distances = np.concatenate([chunk[2] for chunk in chunks] + [np.empty(0)])
+    order = np.lexsort((b_indices, distances, a_indices))
+    return a_indices[order], b_indices[order], distances[order]
@@ -0,0 +1,77 @@
+"""
+Exact k-nearest-neighbour queries with a KD-tree over the targets as unit vectors.
+
+The chord between two points on the unit sphere is monotone in their great-circle distance, so the N targets
+closest to a source in 3D are its N closest targets on the sphere. Unlike the bounding box search this needs no
+initial length, and the antimeridian and the poles need no special handling.
+scipy is only required when a tree is built.
+"""
+
+import numpy as np
+
+from boundingbox.coordinates import as_latlon_array
+from boundingbox.great_circle import latlon_degrees_to_unit_vectors, haversine_distances_columns
+from boundingbox.settings import KM
+from boundingbox.target_index import TargetIndex
+from boundingbox.validations.coordinates import validate_latlons_array
+
+
+class UnitVectorTree:
+    def __init__(self, targets, leafsize=16, validate=True):
+        """
+        :param targets: An iterable of lat-lon pairs in degrees or a TargetIndex.
+        :param leafsize: passed to scipy.spatial.cKDTree
+        :param validate: False to skip the validation of targets, a TargetIndex is never validated again
+        """
+        try:
+            from scipy.spatial import cKDTree
+        except ImportError:
+            raise ImportError('The kdtree engine requires scipy, install it with: pip install scipy')
+
+        if isinstance(targets, TargetIndex):
+            self.targets = targets.targets
+            self.order = np.asarray(targets.order)
+        else:
+            self.targets = as_latlon_array(targets)
+            self.order = None
+            if validate:
+                validate_latlons_array(self.targets)
+        self.tree = cKDTree(latlon_degrees_to_unit_vectors(self.targets[:, 0], self.targets[:, 1]), leafsize=leafsize)
+
+    def __len__(self):
+        return len(self.targets)
+
+    def query_positions(self, sources_degrees, N):
+        """
+        :param sources_degrees: np array of shape (S, 2) of lat-lon pairs in degrees
+        :param N: strictly positive integer, at most len(self)
+        :return: np array of shape (S, N) of positions in self.targets of the N closest targets to each source
+        """
+        sources_degrees = as_latlon_array(sources_degrees)
+        _, positions = self.tree.query(latlon_degrees_to_unit_vectors(sources_degrees[:, 0], sources_degrees[:, 1]), k=N)
+        return np.asarray(positions).reshape(len(sources_degrees), N)
+
+    def query(self, sources_degrees, N, units=KM):
+        """
+        :param sources_degrees: np array of shape (S, 2) of lat-lon pairs in degrees
+        :param N: strictly positive integer, at most len(self)
+        :param units: KM or MILES
+        :return: (indices, distances), np arrays of shape (S, N) of the N closest targets to each source,
+        as positions in the original targets, sorted by haversine distance.
+        """
+        sources_degrees = as_latlon_array(sources_degrees)
+        positions = self.query_positions(sources_degrees, N)
+        distances = haversine_distances_columns((sources_degrees[:, 0, np.newaxis], sources_degrees[:, 1, np.newaxis]),
+                                                self.targets[positions, 0], self.targets[positions, 1], units)
+        # the chord order can differ from the haversine order by rounding between near-ties
+        order = np.argsort(distances, axis=1, kind='stable')
+        positions = np.take_along_axis(positions, order, axis=1)
+        distances = np.take_along_axis(distances, order, axis=1)
+        return self.original_indices(positions), distances
+
+    def original_indices(self, positions):
+        """
+        :param positions: np array of positions in self.targets
+        :return: np array of the positions of the same targets in the targets the tree was built from
+        """
+        return positions if self.order is None else self.order[positions]
@@ -0,0 +1,96 @@
+"""
+Sharded execution of target filtering across the workers of a concurrent.futures executor.
+
+The targets are split into contiguous shards, one task per shard, and the shard results are returned in shard
+order so that merging them is deterministic. With a ThreadPoolExecutor the shards are views of the targets; the
+numpy work releases the GIL. With a ProcessPoolExecutor the targets are copied once into shared memory and each
+worker maps its shard from there instead of receiving a pickled copy.
+"""
+
+import os
+import sys
+
+import numpy as np
+
+from boundingbox.coordinates import as_latlon_array, LatLonColumns
+
+
+def shard_bounds(n_targets, n_shards):
+    """
+    :param n_targets: number of targets
+    :param n_shards: strictly positive integer
+    :return: list of (start, stop) covering range(n_targets) in contiguous, nearly equal shards
+    """
+    edges = np.linspace(0, n_targets, min(n_shards, max(n_targets, 1)) + 1).astype(np.int64)
+    return list(zip(edges[:-1].tolist(), edges[1:].tolist()))
+
+
+def is_process_pool(executor):
+    """
+    :param executor: concurrent.futures.Executor
+    :return: whether executor is a ProcessPoolExecutor. concurrent.futures.process imports multiprocessing,
+    so it is not imported here: if it was never imported, executor cannot be a ProcessPoolExecutor.
+    """
+    process = sys.modules.get('concurrent.futures.process')
+    return process is not None and isinstance(executor, process.ProcessPoolExecutor)
+
+
+def _call_on_shared_shard(function, name, shape, dtype, start, stop, args):
+    from multiprocessing import shared_memory
+
+    shared = shared_memory.SharedMemory(name=name)
+    try:
+        targets = np.ndarray(shape, dtype=dtype, buffer=shared.buf)[start:stop]
+        result = function(targets, *args)
+        # the buffer cannot be closed while a view of it is alive
+        del targets
+        return result
+    finally:
+        shared.close()
+
+
+def map_shards(executor, function, targets, *args, n_shards=None):
+    """
+    :param executor: concurrent.futures.Executor
+    :param function: called as function(targets_shard, *args), must be picklable for a ProcessPoolExecutor
+    and must not return views of targets_shard
+    :param targets: np array of shape (M, 2) of lat-lon pairs, or LatLonColumns
+    :param args: further arguments of function
+    :param n_shards: number of shards, defaults to the number of CPUs
+    :return: list of (start, result), the position of the first target of each shard in targets
+    and the result of function on the shard, in shard order
+    """
+    process_pool = is_process_pool(executor)
+    if process_pool or not isinstance(targets, LatLonColumns):
+        targets = as_latlon_array(targets)
+    bounds = shard_bounds(len(targets), n_shards or os.cpu_count() or 1)
+
+    if not process_pool:
+        futures = [executor.submit(function, targets[start:stop], *args) for start, stop in bounds]
+        return [(start, future.result()) for (start, _), future in zip(bounds, futures)]
+
+    from multiprocessing import shared_memory
+
+    shared = shared_memory.SharedMemory(create=True, size=max(targets.nbytes, 1))
+    try:
+        shared_targets = np.ndarray(targets.shape, dtype=targets.dtype, buffer=shared.buf)
+        shared_targets[:] = targets
+        del shared_targets
+        futures = [executor.submit(_call_on_shared_shard, function, shared.name, targets.shape, targets.dtype,
+                                   start, stop, args) for start, stop in bounds]
+        return [(start, future.result()) for (start, _), future in zip(bounds, futures)]
+    finally:
+        shared.close()
+        shared.unlink()
+
+
+def merge_shard_results(shards):
+    """
+    :param shards: list of (start, (indices, targets, distances)) as returned by map_shards,
+    where indices are positions in the shard
+    :return: (indices, targets, distances) concatenated in shard order, indices being positions in all targets
+    """
+    indices = np.concatenate([start + result[0] for start, result in shards])
+    targets = np.concatenate([result[1] for _, result in shards])
+    distances = np.concatenate([result[2] for _, result in shards])
+    return indices, targets, distances
@@ -0,0 +1,82 @@
+"""
+Functions which assemble query results from filtered targets and their distances.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from boundingbox.frames import make_frame_results
+from boundingbox.settings import TUPLES, INDICES, STRUCTURED
+
+RESULT_DTYPE = np.dtype([('lat', np.float64), ('lon', np.float64), ('dist', np.float64), ('index', np.int64)])
+
+
+def make_targets_distance_array(targets, distances):
+    """
+    :param targets: np array of shape (M, 2) of lat-lon pairs
+    :param distances: np array of shape (M,) of distances
+    :return: np array where each element is of the form [(lat, lon), distance]
+    """
+    targets_distance = np.empty((len(distances), 2), dtype=object)
+    # assign the tuples one at a time, numpy would otherwise broadcast them into a 2d block
+    for i, target in enumerate(map(tuple, np.asarray(targets).tolist())):
+        targets_distance[i, 0] = target
+    targets_distance[:, 1] = np.asarray(distances).tolist()
+    return targets_distance
+
+
+def make_structured_results(indices, targets, distances):
+    """
+    :param indices: np array of shape (M,) of positions in the queried targets
+    :param targets: np array of shape (M, 2) of lat-lon pairs
+    :param distances: np array of shape (M,) of distances
+    :return: np structured array of dtype RESULT_DTYPE, with fields lat, lon, dist and index
+    """
+    results = np.empty(len(distances), dtype=RESULT_DTYPE)
+    targets = np.asarray(targets).reshape(-1, 2)
+    results['lat'] = targets[:, 0]
+    results['lon'] = targets[:, 1]
+    results['dist'] = distances
+    results['index'] = indices
+    return results
+
+
+def format_results(indices, targets, distances, return_format=TUPLES, frame=None):
+    """
+    :param indices: np array of shape (M,) of positions in the queried targets
+    :param targets: np array of shape (M, 2) of lat-lon pairs
+    :param distances: np array of shape (M,) of distances
+    :param return_format: TUPLES, INDICES or STRUCTURED
+    :param frame: the pandas DataFrame queried, if the targets were one
+    :return: TUPLES: np array where each element is of the form [(lat, lon), distance],
+    or for a DataFrame the rows of frame at indices with a distance column, see frames.make_frame_results.
+    INDICES: (indices, distances), an int64 and a float64 np array.
+    STRUCTURED: np structured array with fields lat, lon, dist and index.
+    """
+    if return_format == INDICES:
+        return np.asarray(indices, dtype=np.int64), np.asarray(distances, dtype=np.float64)
+    if return_format == STRUCTURED:
+        return make_structured_results(indices, targets, distances)
+    if frame is not None:
+        return make_frame_results(frame, indices, distances)
+    return make_targets_distance_array(targets, distances)
+
+
+# The results of a query with many sources: the targets matched by sources[i] are
+# indices[offsets[i]:offsets[i + 1]], positions in targets, with their distances sorted ascending.
+RaggedResult = namedtuple('RaggedResult', ['offsets', 'indices', 'distances'])
+
+
+def make_ragged_result(n_sources, source_ids, indices, distances):
+    """
+    :param n_sources: number of sources in the query
+    :param source_ids: np array of the source matched by each (index, distance) pair
+    :param indices: np array of target positions
+    :param distances: np array of distances from source to target
+    :return: RaggedResult grouped by source and sorted by distance within each source
+    """
+    order = np.lexsort((distances, source_ids))
+    offsets = np.zeros(n_sources + 1, dtype=np.int64)
+    np.cumsum(np.bincount(source_ids, minlength=n_sources), out=offsets[1:])
+    return RaggedResult(offsets, indices[order], distances[order])
@@ -0,0 +1,260 @@
+"""
+An asyncio query server which holds one set of targets in memory and micro-batches concurrent requests.
+
+Requests arriving within a short window of the first pending one are answered together by a single vectorized
+query over the targets (distances.get_points_within_distance_many and get_closest_points_many), run in a worker
+thread so that the event loop keeps accepting requests meanwhile. The server is used in-process:
+
+    async with BatchingQueryServer(targets) as server:
+        points = await server.get_points_within_distance(source, 10)
+
+or from other processes through a local socket, see BatchingQueryServer.start_server.
+"""
+
+import asyncio
+import json
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+
+from boundingbox.coordinates import as_latlon_array
+from boundingbox.distances import get_points_within_distance_many, get_closest_points_many
+from boundingbox.results import format_results
+from boundingbox.settings import KM, BBOX, KDTREE, TUPLES, INDICES
+from boundingbox.target_index import TargetIndex
+from boundingbox.validations.coordinates import validate_engine, validate_units, validate_return_format, \
+    validate_latlon_degrees
+from boundingbox.validations.numbers import validate_positive_number, validate_strictly_positive_integer
+
+# seconds a request may wait for others to join its batch
+DEFAULT_WINDOW = 0.002
+DEFAULT_MAX_BATCH_SIZE = 1024
+# number of latencies kept for the percentiles of ServerStats
+LATENCY_SAMPLES = 10000
+
+WITHIN = 'within'
+CLOSEST = 'closest'
+
+ServerStats = namedtuple('ServerStats', ['requests', 'batches', 'mean_batch_size', 'mean_latency',
+                                         'p50_latency', 'p99_latency', 'max_latency', 'throughput'])
+
+
+class BatchingQueryServer:
+    def __init__(self, targets, units=KM, engine=BBOX, window=DEFAULT_WINDOW, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                 executor=None, validate=True):
+        """
+        :param targets: An iterable of lat-lon pairs in degrees, indexed once here.
+        :param units: KM or MILES
+        :param engine: BBOX or KDTREE, used for the closest points requests
+        :param window: seconds a request may wait for others to join its batch
+        :param max_batch_size: a batch is run as soon as this many requests are pending
+        :param executor: concurrent.futures.Executor running the batches, the event loop's default if None
+        :param validate: False to skip the validation of targets
+        """
+        validate_units(units)
+        validate_engine(engine)
+        validate_positive_number(window)
+        validate_strictly_positive_integer(max_batch_size)
+        self.targets = as_latlon_array(targets)
+        self.index = TargetIndex(self.targets, validate)
+        self.units = units
+        self.engine = engine
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.executor = executor
+        if engine == KDTREE:
+            from boundingbox.nearest import UnitVectorTree
+
+            # closest points requests search the tree, radius requests the TargetIndex
+            self.targets_closest = UnitVectorTree(self.index)
+        else:
+            self.targets_closest = self.index
+        self._pending = {WITHIN: [], CLOSEST: []}
+        self._flush_handles = {}
+        self._running = set()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._started = time.perf_counter()
+        self._requests = 0
+        self._batches = 0
+        self._total_latency = 0.0
+        self._max_latency = 0.0
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def get_points_within_distance(self, source, length, return_format=TUPLES):
+        """
+        :param source: lat-lon tuple
+        :param length: positive number
+        :param return_format: TUPLES, INDICES or STRUCTURED, see results.format_results
+        :return: the targets whose distance to source is at most length, sorted by dist,
+        as distances.get_points_within_distance
+        """
+        validate_latlon_degrees(source)
+        validate_positive_number(length)
+        validate_return_format(return_format)
+        return await self._submit(WITHIN, source, length, return_format)
+
+    async def get_closest_points(self, source, N, return_format=TUPLES):
+        """
+        :param source: lat-lon tuple
+        :param N: strictly positive integer
+        :param return_format: TUPLES, INDICES or STRUCTURED, see results.format_results
+        :return: the N targets closest to source, sorted by dist, as distances.get_closest_points
+        """
+        validate_latlon_degrees(source)
+        validate_strictly_positive_integer(N)
+        validate_return_format(return_format)
+        return await self._submit(CLOSEST, source, N, return_format)
+
+    async def _submit(self, kind, source, parameter, return_format):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending[kind]
+        pending.append((source, parameter, return_format, future, time.perf_counter()))
+        if len(pending) >= self.max_batch_size:
+            self._flush(kind)
+        elif kind not in self._flush_handles:
+            self._flush_handles[kind] = loop.call_later(self.window, self._flush, kind)
+        return await future
+
+    def _flush(self, kind):
+        handle = self._flush_handles.pop(kind, None)
+        if handle is not None:
+            handle.cancel()
+        batch, self._pending[kind] = self._pending[kind], []
+        if batch:
+            task = asyncio.ensure_future(self._run_batch(kind, batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run_batch(self, kind, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.executor, self._query_batch, kind, batch)
+        except Exception as e:
+            for request in batch:
+                if not request[3].done():
+                    request[3].set_exception(e)
+            return
+
+        self._batches += 1
+        now = time.perf_counter()
+        for (_, _, _, future, submitted), result in zip(batch, results):
+            latency = now - submitted
+            self._requests += 1
+            self._total_latency += latency
+            self._max_latency = max(self._max_latency, latency)
+            self._latencies.append(latency)
+            # the request may have been cancelled while its batch ran
+            if not future.done():
+                future.set_result(result)
+
+    def _query_batch(self, kind, batch):
+        """
+        :param kind: WITHIN or CLOSEST
+        :param batch: list of (source, length or N, return_format, future, submitted)
+        :return: list with the formatted result of each request
+        """
+        sources = np.array([request[0] for request in batch], dtype=np.float64)
+        parameters = [request[1] for request in batch]
+        if kind == WITHIN:
+            ragged = get_points_within_distance_many(sources, self.index, np.array(parameters, dtype=np.float64),
+                                                     self.units, validate=False)
+            requested = None
+        else:
+            # every request of the batch is answered from the max(N) closest targets to its source
+            ragged = get_closest_points_many(sources, self.targets_closest, max(parameters), units=self.units,
+                                             engine=self.engine, validate=False)
+            requested = parameters
+
+        results = []
+        for i, (_, _, return_format, _, _) in enumerate(batch):
+            start, stop = ragged.offsets[i], ragged.offsets[i + 1]
+            if requested is not None:
+                stop = min(stop, start + requested[i])
+            indices, distances = ragged.indices[start:stop], ragged.distances[start:stop]
+            results.append(format_results(indices, self.targets[indices], distances, return_format))
+        return results
+
+    def stats(self):
+        """
+        :return: ServerStats of the requests answered since the server was created or the last reset_stats.
+        Latencies are in seconds from the submission of a request to its result, throughput in requests per second.
+        """
+        latencies = np.array(self._latencies)
+        p50, p99 = np.percentile(latencies, [50, 99]) if len(latencies) else (0.0, 0.0)
+        elapsed = time.perf_counter() - self._started
+        return ServerStats(requests=self._requests,
+                           batches=self._batches,
+                           mean_batch_size=self._requests / self._batches if self._batches else 0.0,
+                           mean_latency=self._total_latency / self._requests if self._requests else 0.0,
+                           p50_latency=float(p50),
+                           p99_latency=float(p99),
+                           max_latency=self._max_latency,
+                           throughput=self._requests / elapsed if elapsed > 0 else 0.0)
+
+    def reset_stats(self):
+        self._reset_stats()
+
+    async def close(self):
+        """
+        Run the pending requests and wait for every batch to finish.
+        """
+        for kind in list(self._pending):
+            self._flush(kind)
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+
+    async def _handle_connection(self, reader, writer):
+        requests = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = asyncio.ensure_future(self._handle_request(line, writer))
+                requests.add(request)
+                request.add_done_callback(requests.discard)
+            if requests:
+                await asyncio.gather(*requests)
+        finally:
+            writer.close()
+
+    async def _handle_request(self, line, writer):
+        response = {}
+        try:
+            request = json.loads(line)
+            response['id'] = request.get('id')
+            if request['type'] == WITHIN:
+                indices, distances = await self.get_points_within_distance(
+                    tuple(request['source']), request['length'], INDICES)
+            elif request['type'] == CLOSEST:
+                indices, distances = await self.get_closest_points(tuple(request['source']), request['N'], INDICES)
+            else:
+                raise ValueError('Request type must be {} or {}'.format(WITHIN, CLOSEST))
+            response.update(indices=indices.tolist(), distances=distances.tolist())
+        except Exception as e:
+            response['error'] = str(e)
+        writer.write((json.dumps(response) + '\n').encode())
+        await writer.drain()
+
+    async def start_server(self, host='127.0.0.1', port=0):
+        """
+        Serve the queries over TCP, one JSON object per line in each direction. Requests are
+        {"id": ..., "type": "within", "source": [lat, lon], "length": ...} or
+        {"id": ..., "type": "closest", "source": [lat, lon], "N": ...}, and responses
+        {"id": ..., "indices": [...], "distances": [...]} or {"id": ..., "error": "..."}.
+        Responses on a connection are written as their batches complete, so in any order.
+        :param host: address to listen on
+        :param port: port to listen on, 0 picks a free port
+        :return: asyncio.Server, server.sockets[0].getsockname() gives the address
+        """
+        return await asyncio.start_server(self._handle_connection, host, port)
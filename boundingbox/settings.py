@@ -11,4 +11,12 @@ EAST = 'east'
 WEST = 'west'
 
 FRONT = 'front'
-REVERSE = 'reverse'
\ No newline at end of file
+REVERSE = 'reverse'
+
+BBOX = 'bbox'
+KDTREE = 'kdtree'
+
+
+TUPLES = 'tuples'
+INDICES = 'indices'
+STRUCTURED = 'structured'
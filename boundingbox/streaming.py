@@ -0,0 +1,141 @@
+"""
+Queries over target sets which do not fit in memory.
+
+The targets are read chunk by chunk, from a .npy file which is memory-mapped, an np array or memmap,
+or any iterable of (M, 2) chunks, so peak memory is bounded by the chunk size and the size of the result.
+"""
+
+import os
+
+import numpy as np
+
+from boundingbox.boundingbox import BoundingBox
+from boundingbox.coordinates import as_latlon_array
+from boundingbox.great_circle import haversine_distances
+from boundingbox.instrumentation import query, stage, count, HAVERSINE, SORT, CANDIDATES
+from boundingbox.results import format_results
+from boundingbox.settings import KM, TUPLES
+from boundingbox.validations.coordinates import validate_return_format, validate_latlon_degrees, \
+    validate_latlons_array
+from boundingbox.validations.numbers import validate_strictly_positive_integer, validate_positive_number
+
+DEFAULT_CHUNK_SIZE = 2 ** 20
+
+
+def iter_target_chunks(targets, chunk_size=DEFAULT_CHUNK_SIZE, validate=False):
+    """
+    :param targets: path to a .npy file of shape (M, 2), an np array, or an iterable of chunks of lat-lon pairs
+    :param chunk_size: number of targets per chunk when slicing a file or an array
+    :param validate: whether to validate each chunk, invalid rows are reported by their position in all targets
+    :return: generator of np arrays of shape (m, 2) and dtype float64
+    """
+    validate_strictly_positive_integer(chunk_size)
+    if isinstance(targets, (str, os.PathLike)):
+        targets = np.load(targets, mmap_mode='r')
+
+    if isinstance(targets, np.ndarray):
+        chunks = (targets[start:start + chunk_size] for start in range(0, len(targets), chunk_size))
+    else:
+        chunks = targets
+
+    offset = 0
+    for chunk in chunks:
+        chunk = as_latlon_array(chunk)
+        if validate:
+            validate_latlons_array(chunk, offset)
+        offset += len(chunk)
+        yield chunk
+
+
+def get_points_within_distance_streaming(source, targets, length, units=KM, chunk_size=DEFAULT_CHUNK_SIZE,
+                                         return_format=TUPLES, validate=True):
+    """
+    Streaming counterpart of distances.get_points_within_distance.
+    :param source: lat-lon tuple
+    :param targets: path to a .npy file, an np array, or an iterable of chunks of lat-lon pairs
+    :param length: positive number
+    :param units: KM or MILES
+    :param chunk_size: number of targets per chunk when slicing a file or an array
+    :param return_format: TUPLES, INDICES or STRUCTURED, indices count targets across all chunks
+    :param validate: False to skip the validation of the chunks
+    :return: the targets whose distance to source is less than length, sorted by dist.
+    With TUPLES, np array where each element is of the form [(lat, lon), dist].
+    """
+    validate_positive_number(length)
+    validate_return_format(return_format)
+    with query('get_points_within_distance_streaming'):
+        boundingbox = BoundingBox(source, length, units)
+
+        indices_within_distance = [np.empty(0, dtype=np.int64)]
+        targets_within_distance = [np.empty((0, 2))]
+        distances_within_distance = [np.empty(0)]
+        offset = 0
+        for chunk in iter_target_chunks(targets, chunk_size, validate):
+            indices, targets_in_bbox, distances = boundingbox.compute_distances_in_bboxs(chunk, boundingbox.bbox,
+                                                                                         length)
+            indices_within_distance.append(offset + indices)
+            targets_within_distance.append(targets_in_bbox)
+            distances_within_distance.append(distances)
+            offset += len(chunk)
+
+        indices_within_distance = np.concatenate(indices_within_distance)
+        targets_within_distance = np.concatenate(targets_within_distance)
+        distances_within_distance = np.concatenate(distances_within_distance)
+        with stage(SORT):
+            order = np.argsort(distances_within_distance, kind='stable')
+        return format_results(indices_within_distance[order], targets_within_distance[order],
+                              distances_within_distance[order], return_format)
+
+
+def get_closest_points_streaming(source, targets, N, units=KM, chunk_size=DEFAULT_CHUNK_SIZE, return_format=TUPLES,
+                                 validate=True):
+    """
+    Streaming counterpart of distances.get_closest_points.
+    A running top-N is kept across chunks. Once N targets have been seen, the distance to the N-th closest
+    so far bounds the bounding box used to filter the following chunks.
+    :param source: lat-lon tuple
+    :param targets: path to a .npy file, an np array, or an iterable of chunks of lat-lon pairs
+    :param N: strictly positive integer
+    :param units: KM or MILES
+    :param chunk_size: number of targets per chunk when slicing a file or an array
+    :param return_format: TUPLES, INDICES or STRUCTURED, indices count targets across all chunks
+    :param validate: False to skip the validation of source and the chunks
+    :return: the N targets closest to source, sorted by dist.
+    With TUPLES, np array where each element is of the form [(lat, lon), dist].
+    """
+    validate_strictly_positive_integer(N)
+    validate_return_format(return_format)
+    if validate:
+        validate_latlon_degrees(source)
+    with query('get_closest_points_streaming'):
+        closest_indices = np.empty(0, dtype=np.int64)
+        closest_targets = np.empty((0, 2))
+        closest_distances = np.empty(0)
+        boundingbox = None
+        offset = 0
+
+        for chunk in iter_target_chunks(targets, chunk_size, validate):
+            if boundingbox is None:
+                indices, chunk_filtered = np.arange(len(chunk)), chunk
+            else:
+                indices, chunk_filtered = boundingbox.filter_indices_in_bboxs(chunk, boundingbox.bbox)
+            count(CANDIDATES, len(indices))
+            closest_indices = np.concatenate((closest_indices, offset + indices))
+            closest_targets = np.concatenate((closest_targets, chunk_filtered))
+            with stage(HAVERSINE):
+                chunk_distances = haversine_distances(source, chunk_filtered, units)
+            closest_distances = np.concatenate((closest_distances, chunk_distances))
+            offset += len(chunk)
+
+            if len(closest_distances) > N:
+                closest = np.argpartition(closest_distances, N - 1)[:N]
+                closest_indices = closest_indices[closest]
+                closest_targets, closest_distances = closest_targets[closest], closest_distances[closest]
+            if len(closest_distances) == N:
+                bound = closest_distances.max()
+                if boundingbox is None or bound < boundingbox.length:
+                    boundingbox = BoundingBox(source, bound, units)
+
+        with stage(SORT):
+            order = np.argsort(closest_distances, kind='stable')
+        return format_results(closest_indices[order], closest_targets[order], closest_distances[order], return_format)
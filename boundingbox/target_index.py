@@ -0,0 +1,141 @@
+"""
+A latitude-sorted index over a static set of targets.
+
+Building the index sorts the targets once by latitude (and by longitude within equal latitudes).
+A bbox query then locates the latitude band [south, north] with a binary search and only applies
+the longitude test to the targets inside that band, instead of scanning every target.
+"""
+
+import os
+
+import numpy as np
+
+from boundingbox.cell_index import CellIndex
+from boundingbox.coordinates import as_latlon_array, LatLonColumns
+from boundingbox.settings import NORTH, SOUTH, EAST, WEST
+from boundingbox.validations.coordinates import validate_latlons_array
+
+
+LATITUDES_FILE = 'latitudes.npy'
+LONGITUDES_FILE = 'longitudes.npy'
+ORDER_FILE = 'order.npy'
+
+
+class TargetIndex:
+    def __init__(self, targets, validate=True):
+        """
+        :param targets: An iterable of lat-lon pairs in degrees, or LatLonColumns.
+        :param validate: False to skip the validation of targets, e.g. when they were already validated.
+        The queries trust the targets of a TargetIndex and do not validate them again.
+        """
+        if not isinstance(targets, LatLonColumns):
+            targets = as_latlon_array(targets)
+            targets = LatLonColumns(targets[:, 0], targets[:, 1])
+        if validate:
+            targets.validate()
+        order = np.lexsort((targets.lons, targets.lats))
+        self._set_sorted(targets.lats[order], targets.lons[order], order)
+
+    def _set_sorted(self, latitudes, longitudes, order):
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        # order[i] is the position in the original targets of the i-th sorted target
+        self.order = order
+
+    @classmethod
+    def from_sorted(cls, latitudes, longitudes, order):
+        """
+        :param latitudes: np array of latitudes, sorted ascending
+        :param longitudes: np array of longitudes, aligned with latitudes
+        :param order: np array of positions of each sorted target in the original targets
+        :return: TargetIndex wrapping the arrays without copying them, nor validating them
+        """
+        index = cls.__new__(cls)
+        index._set_sorted(latitudes, longitudes, order)
+        return index
+
+    def __len__(self):
+        return len(self.latitudes)
+
+    @property
+    def targets(self):
+        """
+        :return: np array of shape (M, 2) of the lat-lon pairs in sorted order
+        """
+        return np.column_stack((self.latitudes, self.longitudes))
+
+    def targets_at(self, positions):
+        """
+        :param positions: np array of positions in the sorted targets
+        :return: np array of shape (M, 2) of the lat-lon pairs at these positions
+        """
+        return np.column_stack((self.latitudes[positions], self.longitudes[positions]))
+
+    def latitude_band(self, south, north):
+        """
+        :param south: latitude in degrees
+        :param north: latitude in degrees
+        :return: slice of the sorted targets whose latitude lies in [south, north]
+        """
+        start = np.searchsorted(self.latitudes, south, side='left')
+        stop = np.searchsorted(self.latitudes, north, side='right')
+        return slice(start, max(start, stop))
+
+    def filter_positions_in_bbox(self, bbox):
+        """
+        :param bbox: dict with keys = [north, south, east, west]
+        :return: np array of positions in the sorted targets of the targets inside bbox
+        """
+        band = self.latitude_band(bbox[SOUTH], bbox[NORTH])
+        lons = self.longitudes[band]
+        if bbox[WEST] <= bbox[EAST]:
+            in_bbox = (lons >= bbox[WEST]) & (lons <= bbox[EAST])
+        else:
+            in_bbox = ~((lons >= bbox[EAST]) & (lons <= bbox[WEST]))
+        return band.start + np.flatnonzero(in_bbox)
+
+    def filter_targets_in_bbox(self, bbox):
+        """
+        :param bbox: dict with keys = [north, south, east, west]
+        :return: np array of lat-lon pairs where each pair is inside bbox
+        """
+        return self.targets_at(self.filter_positions_in_bbox(bbox))
+
+    def save(self, path):
+        """
+        Write the index as a directory of .npy files which load() can memory-map.
+        :param path: directory, created if it does not exist
+        """
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, LATITUDES_FILE), np.asarray(self.latitudes))
+        np.save(os.path.join(path, LONGITUDES_FILE), np.asarray(self.longitudes))
+        np.save(os.path.join(path, ORDER_FILE), np.asarray(self.order))
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """
+        :param path: directory written by save()
+        :param mmap_mode: passed to np.load, None reads the arrays into memory
+        :return: TargetIndex
+        """
+        return cls.from_sorted(np.load(os.path.join(path, LATITUDES_FILE), mmap_mode=mmap_mode),
+                               np.load(os.path.join(path, LONGITUDES_FILE), mmap_mode=mmap_mode),
+                               np.load(os.path.join(path, ORDER_FILE), mmap_mode=mmap_mode))
+
+
+def as_targets(targets, validate=False):
+    """
+    :param targets: TargetIndex, CellIndex, LatLonColumns or an iterable of lat-lon pairs
+    :param validate: whether to validate the lat-lon pairs, an index is never validated again
+    :return: the TargetIndex, the CellIndex or the LatLonColumns unchanged, otherwise an np array of shape (M, 2)
+    """
+    if isinstance(targets, (TargetIndex, CellIndex)):
+        return targets
+    if isinstance(targets, LatLonColumns):
+        if validate:
+            targets.validate()
+        return targets
+    targets = as_latlon_array(targets)
+    if validate:
+        validate_latlons_array(targets)
+    return targets
@@ -0,0 +1,131 @@
+"""
+A TargetIndex which also stores the targets as cartesian unit vectors, for trig-free radius tests.
+
+Two points on the unit sphere are at most length apart exactly when the dot product of their vectors is at least
+cos(length / EARTH_RADIUS[units]). A radius query therefore locates the latitude band of the radius with a binary
+search, as TargetIndex does, and tests the targets of the band with one matrix-vector product. The haversine
+distance is only computed for the targets which are returned, and for the few whose dot product is too close to
+the threshold to be decided at the precision of the vectors. With float32 vectors the index takes half the memory
+and the products half the bandwidth; the results are the same.
+"""
+
+import os
+
+import numpy as np
+
+from boundingbox.great_circle import latlon_degrees_to_unit_vectors, haversine_distances_columns
+from boundingbox.instrumentation import stage, count, BBOX_FILTER, DOT_PRODUCT, HAVERSINE, CANDIDATES
+from boundingbox.settings import EARTH_RADIUS, KM
+from boundingbox.target_index import TargetIndex, LATITUDES_FILE, LONGITUDES_FILE, ORDER_FILE
+
+# number of targets tested at a time, small enough for the block to stay in cache
+BLOCK_SIZE = 2 ** 16
+# dot products within this many machine epsilons of the threshold are decided by the haversine distance
+THRESHOLD_MARGIN_EPS = 8
+
+VECTORS_FILE = 'vectors.npy'
+
+
+def validate_vectors_dtype(dtype):
+    """
+    :param dtype: anything np.dtype accepts
+    :return: the np.dtype, float32 or float64
+    """
+    dtype = np.dtype(dtype)
+    if dtype not in (np.float32, np.float64):
+        raise ValueError('dtype must be float32 or float64')
+    return dtype
+
+
+class UnitVectorIndex(TargetIndex):
+    dtype = np.dtype(np.float64)
+
+    def __init__(self, targets, dtype=np.float64, validate=True):
+        """
+        :param targets: An iterable of lat-lon pairs in degrees.
+        :param dtype: np.float64 or np.float32, the precision of the stored unit vectors
+        :param validate: False to skip the validation of targets
+        """
+        self.dtype = validate_vectors_dtype(dtype)
+        super().__init__(targets, validate)
+
+    def _set_sorted(self, latitudes, longitudes, order, vectors=None):
+        super()._set_sorted(latitudes, longitudes, order)
+        if vectors is None:
+            vectors = latlon_degrees_to_unit_vectors(latitudes, longitudes).astype(self.dtype)
+        # vectors[i] is the unit vector of the i-th sorted target
+        self.vectors = vectors
+
+    @classmethod
+    def from_sorted(cls, latitudes, longitudes, order, vectors=None, dtype=None):
+        """
+        :param latitudes: np array of latitudes, sorted ascending
+        :param longitudes: np array of longitudes, aligned with latitudes
+        :param order: np array of positions of each sorted target in the original targets
+        :param vectors: np array of shape (M, 3) of the unit vectors of the sorted targets, computed if None
+        :param dtype: np.float64 or np.float32, the precision of the unit vectors.
+        If None it is the dtype of vectors, or np.float64 when they are computed.
+        :return: UnitVectorIndex wrapping the arrays without copying them unless dtype converts the vectors
+        """
+        if dtype is None:
+            dtype = np.float64 if vectors is None else vectors.dtype
+        index = cls.__new__(cls)
+        index.dtype = validate_vectors_dtype(dtype)
+        if vectors is not None and vectors.dtype != index.dtype:
+            vectors = vectors.astype(index.dtype)
+        index._set_sorted(latitudes, longitudes, order, vectors)
+        return index
+
+    def save(self, path):
+        """
+        Write the index as a directory of .npy files which load() can memory-map, the unit vectors included.
+        :param path: directory, created if it does not exist
+        """
+        super().save(path)
+        np.save(os.path.join(path, VECTORS_FILE), np.asarray(self.vectors))
+
+    @classmethod
+    def load(cls, path, mmap_mode='r', dtype=None):
+        """
+        :param path: directory written by save(), or by TargetIndex.save() in which case the vectors are computed
+        :param mmap_mode: passed to np.load, None reads the arrays into memory
+        :param dtype: np.float64 or np.float32, None to keep the precision the vectors were saved with
+        :return: UnitVectorIndex
+        """
+        vectors_path = os.path.join(path, VECTORS_FILE)
+        vectors = np.load(vectors_path, mmap_mode=mmap_mode) if os.path.exists(vectors_path) else None
+        return cls.from_sorted(np.load(os.path.join(path, LATITUDES_FILE), mmap_mode=mmap_mode),
+                               np.load(os.path.join(path, LONGITUDES_FILE), mmap_mode=mmap_mode),
+                               np.load(os.path.join(path, ORDER_FILE), mmap_mode=mmap_mode),
+                               vectors, dtype)
+
+    def positions_within_distance(self, source_degrees, length, units=KM):
+        """
+        :param source_degrees: lat-lon pair in degrees
+        :param length: positive number
+        :param units: KM or MILES
+        :return: (positions, distances), np arrays of the positions in the sorted targets of the targets
+        at most length from source_degrees and of their distances, in sorted order
+        """
+        angle = length / EARTH_RADIUS[units]
+        with stage(BBOX_FILTER):
+            band = self.latitude_band(source_degrees[0] - np.degrees(angle), source_degrees[0] + np.degrees(angle))
+        source_vector = latlon_degrees_to_unit_vectors(source_degrees[0], source_degrees[1])[0].astype(self.dtype)
+        threshold = np.cos(min(angle, np.pi))
+        margin = THRESHOLD_MARGIN_EPS * np.finfo(self.dtype).eps
+        count(CANDIDATES, band.stop - band.start)
+
+        positions = [np.empty(0, dtype=np.int64)]
+        with stage(DOT_PRODUCT):
+            for start in range(band.start, band.stop, BLOCK_SIZE):
+                dots = self.vectors[start:min(start + BLOCK_SIZE, band.stop)] @ source_vector
+                # the targets whose dot product is below threshold - margin are surely further than length
+                positions.append(start + np.flatnonzero(dots >= threshold - margin))
+        positions = np.concatenate(positions)
+
+        with stage(HAVERSINE):
+            distances = haversine_distances_columns(source_degrees, self.latitudes[positions],
+                                                    self.longitudes[positions], units)
+        # decides the targets near the threshold, and agrees with the other queries for the others
+        within_distance = distances <= length
+        return positions[within_distance], distances[within_distance]
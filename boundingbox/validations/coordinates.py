@@ -1,4 +1,9 @@
-from boundingbox.settings import KM, MILES
+import numpy as np
+
+from boundingbox.settings import KM, MILES, BBOX, KDTREE, TUPLES, INDICES, STRUCTURED
+# number of offending rows listed in the error of validate_latlons_array
+MAX_ROWS_REPORTED = 10
+
 
 def validate_latitude_degrees(lat):
     try:
@@ -25,10 +30,55 @@ def validate_latlon_degrees(latlon):
 
 
 def validate_latlons_degrees(latlons):
-    for latlon in latlons:
-        validate_latlon_degrees(latlon)
+    validate_latlons_array(latlons)
+
+
+def validate_latlons_array(latlons, offset=0):
+    """
+    Vectorized counterpart of validate_latlon_degrees for a whole array of lat-lon pairs.
+    :param latlons: np array of shape (N, 2) or iterable of lat-lon pairs in degrees
+    :param offset: added to the row indices reported, e.g. the position of a chunk in the full array
+    """
+    try:
+        latlons = np.asarray(latlons, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError('Argument should be numerical')
+    if latlons.size and (latlons.ndim > 2 or latlons.shape[-1] != 2):
+        raise ValueError('Argument must be lat-lon pairs of shape (N, 2)')
+    latlons = latlons.reshape(-1, 2)
+
+    validate_latlon_columns(latlons[:, 0], latlons[:, 1], offset)
+
+
+def validate_latlon_columns(lats, lons, offset=0):
+    """
+    validate_latlons_array for lat-lon pairs given as two columns.
+    :param lats: np array of shape (N,) of latitudes in degrees
+    :param lons: np array of shape (N,) of longitudes in degrees
+    :param offset: added to the row indices reported, e.g. the position of a chunk in the full array
+    """
+    # nan and inf fail both comparisons
+    valid = np.abs(lats) <= 90
+    valid &= np.abs(lons) <= 180
+    if not valid.all():
+        rows = offset + np.flatnonzero(~valid)
+        raise ValueError('Latitudes must be in degrees in [-90, 90] and longitudes in [-180, 180], '
+                         'invalid lat-lon pairs at rows {}{}'.format(
+                             rows[:MAX_ROWS_REPORTED].tolist(),
+                             ' and {} more'.format(len(rows) - MAX_ROWS_REPORTED) if len(rows) > MAX_ROWS_REPORTED
+                             else ''))
 
 
 def validate_units(units):
     if units not in [KM, MILES]:
-        raise ValueError("Units must be {} or {}".format(KM, MILES))
\ No newline at end of file
+        raise ValueError("Units must be {} or {}".format(KM, MILES))
+
+
+def validate_engine(engine):
+    if engine not in [BBOX, KDTREE]:
+        raise ValueError("Engine must be {} or {}".format(BBOX, KDTREE))
+
+
+def validate_return_format(return_format):
+    if return_format not in [TUPLES, INDICES, STRUCTURED]:
+        raise ValueError("Return format must be {}, {} or {}".format(TUPLES, INDICES, STRUCTURED))
\ No newline at end of file
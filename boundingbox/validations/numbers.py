@@ -20,3 +20,10 @@ def validate_positive_number(N):
             raise ValueError("The argument must be positive.")
 
 
+def validate_strictly_positive_number(N):
+    try:
+        val = float(N)
+    except (TypeError, ValueError):
+        raise ValueError("The argument must be numerical.")
+    if val <= 0:
+        raise ValueError("The argument must be strictly positive.")
@@ -1,3 +1,5 @@
+import numpy as np
+
 paris = (48.8566, 2.3522)
 vincennes = (48.8283, 2.4330)
 boulogne = (48.8624, 2.2492)
@@ -7,6 +9,19 @@ targets_paris = [vincennes, boulogne, st_denis, orleans]
 
 locations_paris = {'source': paris, 'targets': targets_paris}
 
+# paris, then sources whose bounding boxes reach a pole or wrap across the 180th meridian
+EDGE_SOURCES = [paris, (89, 170), (0, 179.9), (-89.5, 0)]
+
+
+def random_targets(seed, n):
+    """
+    :param seed: integer seed, or a np.random.RandomState to draw from
+    :param n: number of targets
+    :return: np array of shape (n, 2) of lat-lon pairs in degrees, uniform in latitude and in longitude
+    """
+    random = seed if isinstance(seed, np.random.RandomState) else np.random.RandomState(seed)
+    return np.column_stack((random.uniform(-90, 90, n), random.uniform(-180, 180, n)))
+
 
 # This edge case has the following properties
 # -- consider a bbox of size 1100 around edge_1_0
@@ -19,4 +34,4 @@ edge_1_3 = (10,0)
 edge_1_4 = (0,10.1)
 
 targets_edgecase_1 = [edge_1_1, edge_1_2, edge_1_3, edge_1_4]
-locations_edgecase_1 = {'source': edge_1_0, 'targets': targets_edgecase_1}
\ No newline at end of file
+locations_edgecase_1 = {'source': edge_1_0, 'targets': targets_edgecase_1}
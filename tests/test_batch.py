@@ -0,0 +1,110 @@
+import unittest
+import numpy as np
+
+from boundingbox.batch import make_bounding_box_arrays, within_distance_pairs
+from boundingbox.boundingbox import BoundingBox
+from boundingbox.distances import get_points_within_distance, get_points_within_distance_many, \
+    get_closest_points_many
+from boundingbox.great_circle import haversine_distances
+from boundingbox.target_index import TargetIndex
+from boundingbox.settings import FRONT, REVERSE
+
+from tests.resources.locations import locations_paris, locations_edgecase_1, random_targets
+
+
+source_paris = locations_paris['source']
+targets_paris = np.array(locations_paris['targets'])
+
+source_edgecase_1 = locations_edgecase_1['source']
+targets_edgecase_1 = np.array(locations_edgecase_1['targets'])
+
+# equator, mid-latitude, antimeridian, near both poles
+sources_edge = np.array([(0, 0), (48.8566, 2.3522), (18.1248, 178.4501), (60, -179.5),
+                         (89, 170), (-88, -120), (85, 30), (-45, 100)])
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(1)
+        self.targets_random = random_targets(random, 20000)
+        self.sources_random = np.concatenate((sources_edge, random_targets(random, 100)))
+
+    def test_make_bounding_box_arrays_matches_bounding_box(self):
+        for length in [100, 1000, 5000, 15000, 25000]:
+            bbox = make_bounding_box_arrays(self.sources_random, length)
+            for i, source in enumerate(self.sources_random):
+                bbox_scalar = BoundingBox(tuple(source), length).bbox
+                for key in [FRONT, REVERSE]:
+                    if key not in bbox_scalar:
+                        self.assertTrue(np.isnan(bbox[key]['north'][i]))
+                        continue
+                    for side, value in bbox_scalar[key].items():
+                        self.assertAlmostEqual(bbox[key][side][i], value, places=9)
+
+    def test_make_bounding_box_arrays_reaching_pole(self):
+        # lengths of exactly the distance to a pole, which rounding can put just short of or past it
+        sources = np.array([(60, 10), (-60, 10), (45.5, -120), (-10, 179.9)])
+        lengths = [haversine_distances(source, [(90 if source[0] > 0 else -90, 0)])[0] for source in sources]
+        bbox = make_bounding_box_arrays(sources, lengths)
+        for i, source in enumerate(sources):
+            self.assertFalse(np.isnan(bbox[FRONT]['east'][i]))
+            for side, value in BoundingBox(tuple(source), lengths[i]).bbox[FRONT].items():
+                self.assertAlmostEqual(bbox[FRONT][side][i], value, places=9)
+
+    def test_get_points_within_distance_many_brute_force(self):
+        lengths = np.repeat([500, 3000, 15000], len(self.sources_random))[:len(self.sources_random)]
+        result = get_points_within_distance_many(self.sources_random, self.targets_random, lengths)
+        self.assertEqual(len(result.offsets), len(self.sources_random) + 1)
+        for i, source in enumerate(self.sources_random):
+            distances = haversine_distances(source, self.targets_random)
+            expected = np.flatnonzero(distances <= lengths[i])
+            indices = result.indices[result.offsets[i]:result.offsets[i + 1]]
+            np.testing.assert_array_equal(np.sort(indices), expected)
+            self.assertTrue(np.all(np.diff(result.distances[result.offsets[i]:result.offsets[i + 1]]) >= 0))
+
+    def test_get_points_within_distance_many_matches_single(self):
+        result = get_points_within_distance_many([source_paris, source_paris], targets_paris, 200)
+        single = get_points_within_distance(source_paris, targets_paris, 200)
+        np.testing.assert_array_equal(result.distances[:4], single[:, 1].astype(float))
+        np.testing.assert_array_equal(targets_paris[result.indices[4:]], np.array(list(single[:, 0])))
+
+    def test_bounding_box_near_pole_brute_force(self):
+        for source in sources_edge:
+            points = get_points_within_distance(tuple(source), self.targets_random, 3000)
+            distances = haversine_distances(source, self.targets_random)
+            self.assertEqual(len(points), np.sum(distances <= 3000))
+
+    def test_within_distance_pairs_chunks(self):
+        index = TargetIndex(self.targets_random)
+        chunks = list(within_distance_pairs(self.sources_random, index, 2000, max_pairs=1000))
+        self.assertTrue(len(chunks) > 1)
+        pairs = sum(len(chunk[0]) for chunk in chunks)
+        result = get_points_within_distance_many(self.sources_random, index, 2000)
+        self.assertEqual(pairs, len(result.indices))
+
+    def test_get_closest_points_many(self):
+        result = get_closest_points_many(self.sources_random, self.targets_random, 5)
+        np.testing.assert_array_equal(result.offsets, 5 * np.arange(len(self.sources_random) + 1))
+        for i, source in enumerate(self.sources_random):
+            distances = haversine_distances(source, self.targets_random)
+            np.testing.assert_allclose(result.distances[5 * i:5 * (i + 1)], np.sort(distances)[:5])
+
+    def test_get_closest_points_many_edge_case_1(self):
+        result = get_closest_points_many([source_edgecase_1], targets_edgecase_1, 3, 1100)
+        np.testing.assert_allclose(result.distances, [1111.9492664455872, 1111.9492664455872, 1123.0687591100434])
+
+    def test_get_closest_points_many_tiny_length(self):
+        expected = get_closest_points_many(self.sources_random, self.targets_random, 5)
+        for length in [0, 1e-9]:
+            result = get_closest_points_many(self.sources_random, self.targets_random, 5, length)
+            np.testing.assert_array_equal(result.indices, expected.indices)
+            np.testing.assert_array_equal(result.distances, expected.distances)
+
+    def test_get_closest_points_many_more_than_targets(self):
+        result = get_closest_points_many([source_paris], targets_paris, 10)
+        self.assertEqual(len(result.indices), len(targets_paris))
+
+
+if __name__ == '__main__':
+    unittest.main()
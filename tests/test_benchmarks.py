@@ -0,0 +1,37 @@
+import unittest
+import numpy as np
+
+from benchmarks.run_benchmarks import make_targets, run_benchmarks, compare_results, UNIFORM, CLUSTERED
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_make_targets(self):
+        for distribution in [UNIFORM, CLUSTERED]:
+            targets = make_targets(1000, distribution, np.random.RandomState(0))
+            self.assertEqual(targets.shape, (1000, 2))
+            self.assertTrue(np.all(np.abs(targets[:, 0]) <= 90))
+            self.assertTrue(np.all(np.abs(targets[:, 1]) <= 180))
+
+    def test_run_benchmarks(self):
+        records = run_benchmarks(sizes=[100], lengths=[100], Ns=[5], sources=['near_pole', 'antimeridian'],
+                                 distributions=[CLUSTERED], repeat=1)
+        self.assertEqual(len(records), 8)
+        self.assertTrue(all(record['min'] > 0 for record in records if record['benchmark'].startswith('import')))
+        closest = [record for record in records if record['benchmark'] == 'get_closest_points']
+        self.assertEqual([record['results'] for record in closest], [5, 5])
+
+    def test_compare_results(self):
+        baseline = [{'benchmark': 'get_closest_points', 'size': 100, 'distribution': UNIFORM, 'source': 'equator',
+                     'length': None, 'N': 5, 'min': 1.0, 'median': 1.0}]
+        faster = [dict(baseline[0], min=1.1)]
+        slower = [dict(baseline[0], min=1.5)]
+        self.assertEqual(compare_results(faster, baseline), [])
+        regressions = compare_results(slower, baseline)
+        self.assertEqual(len(regressions), 1)
+        self.assertAlmostEqual(regressions[0]['ratio'], 1.5)
+        self.assertEqual(compare_results(slower, baseline, min_difference=1), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
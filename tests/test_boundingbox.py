@@ -6,7 +6,7 @@ from boundingbox.coordinates import convert_latlon_degrees_to_radians
 
 from boundingbox.settings import FRONT
 
-from tests.resources.locations import locations_paris, locations_edgecase_1
+from tests.resources.locations import locations_paris, locations_edgecase_1, random_targets
 
 distance_100 = 100
 distance_1100 = 1100
@@ -16,10 +16,10 @@ source_paris = locations_paris['source']
 targets_paris = locations_paris['targets']
 
 
-distances_paris_places = [[(48.8283, 2.433), 6.698235303709655],
-       [(48.8624, 2.2492), 7.562627816217736],
-       [(48.9362, 2.3574), 8.859287406231937],
-       [(47.903, 1.9093), 110.96572196425218]]
+distances_paris_places = [[(48.8283, 2.433), 6.698226051725781],
+       [(48.8624, 2.2492), 7.562617370285722],
+       [(48.9362, 2.3574), 8.85927516927989],
+       [(47.903, 1.9093), 110.96556869208072]]
 
 bbox_paris_100 = {'front': {'north': 49.75592160591873,
   'south': 47.957278394081264,
@@ -35,8 +35,8 @@ bbox_paris_100_switch = {'front': {'north': 49.75592160591873,
 
 source_edgecase_1 = locations_edgecase_1['source']
 targets_edgecase_1 = np.array(locations_edgecase_1['targets'])
-distances_edgecase_1_1 = np.array([1111.950802335329, 1111.950802335329])
-distances_edgecase_1_2 = np.array([1111.950802335329, 1111.950802335329, 1123.0703103586823])
+distances_edgecase_1_1 = np.array([1111.9492664455872, 1111.9492664455872])
+distances_edgecase_1_2 = np.array([1111.9492664455872, 1111.9492664455872, 1123.0687591100434])
 
 
 
@@ -84,5 +84,29 @@ class TestBoundingBox(unittest.TestCase):
         self.assertEqual(arr1[0][0], arr2[0][0])
         self.assertEqual(arr1[0][1], arr2[0][1])
 
+    def test_mask_in_bounding_boxes(self):
+        targets = random_targets(8, 5000)
+        for boundingbox in [self.boundingbox_paris, self.boundingbox_suva, BoundingBox((85, 30), 2000)]:
+            expected = np.zeros(len(targets), dtype=bool)
+            for bbox in boundingbox.bbox.values():
+                expected |= boundingbox.target_in_bounding_box(np.transpose(targets), bbox)
+            mask = boundingbox.mask_in_bounding_boxes(targets[:, 0], targets[:, 1], boundingbox.bbox)
+            self.assertEqual(np.array_equal(mask, expected), True)
+
+    def test_sweep_bboxs_single_pass(self):
+        targets = random_targets(9, 5000)
+        boundingbox = BoundingBox((-88, 120), 3000)
+        blocks = list(boundingbox.sweep_bboxs(targets, boundingbox.bbox, block_size=1000))
+        indices = np.concatenate([block[0] for block in blocks])
+        self.assertEqual(len(indices), len(np.unique(indices)))
+        mask = boundingbox.mask_in_bounding_boxes(targets[:, 0], targets[:, 1], boundingbox.bbox)
+        self.assertEqual(np.array_equal(indices, np.flatnonzero(mask)), True)
+
+    def test_compute_distances_in_bboxs_length(self):
+        indices, targets, distances = self.boundingbox_paris.compute_distances_in_bboxs(
+            targets_paris, self.boundingbox_paris.bbox, 8)
+        self.assertEqual(list(indices), [0, 1])
+        self.assertEqual(np.array_equal(distances, np.array([row[1] for row in distances_paris_places[:2]])), True)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,117 @@
+import unittest
+import numpy as np
+import pandas as pd
+
+from boundingbox.cache import QueryCache, quantize_source, ENTRY_OVERHEAD
+from boundingbox.distances import get_points_within_distance, get_closest_points
+from boundingbox.instrumentation import record_queries
+from boundingbox.settings import INDICES, MILES
+
+from tests.resources.locations import locations_paris, EDGE_SOURCES, random_targets
+
+
+source_paris = locations_paris['source']
+
+
+class TestQueryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.targets_random = random_targets(23, 20000)
+        self.sources = EDGE_SOURCES
+
+    def test_quantize_source(self):
+        self.assertEqual(quantize_source((48.85661234, 2.35221299)), (48.856612, 2.352213))
+        self.assertEqual(quantize_source((48.85661234, 2.35221299), 2), (48.86, 2.35))
+        self.assertEqual(quantize_source((48.85661234, 2.35221299), None), (48.85661234, 2.35221299))
+
+    def test_matches_queries(self):
+        cache = QueryCache(self.targets_random, precision=None)
+        for _ in range(2):
+            for source in self.sources:
+                for units in ['km', MILES]:
+                    indices, distances = cache.get_points_within_distance(source, 500, units, INDICES)
+                    expected = get_points_within_distance(source, self.targets_random, 500, units,
+                                                          return_format=INDICES)
+                    np.testing.assert_array_equal(indices, expected[0])
+                    np.testing.assert_array_equal(distances, expected[1])
+
+                    points = cache.get_closest_points(source, 7, units=units)
+                    expected = get_closest_points(source, self.targets_random, 7, units=units)
+                    np.testing.assert_array_equal(points[:, 1].astype(float), expected[:, 1].astype(float))
+        stats = cache.stats()
+        self.assertEqual((stats.hits, stats.misses, stats.entries), (16, 16, 16))
+        self.assertEqual(stats.hit_ratio, 0.5)
+
+    def test_quantized_sources_share_entries(self):
+        cache = QueryCache(self.targets_random, precision=3)
+        first = cache.get_points_within_distance((48.8566, 2.3522), 300, return_format=INDICES)
+        second = cache.get_points_within_distance((48.8574, 2.3516), 300, return_format=INDICES)
+        self.assertIs(first[0], second[0])
+        self.assertFalse(first[0].flags.writeable)
+        expected = get_points_within_distance((48.857, 2.352), self.targets_random, 300, return_format=INDICES)
+        np.testing.assert_array_equal(first[1], expected[1])
+        self.assertEqual(cache.stats().hits, 1)
+
+    def test_set_targets(self):
+        cache = QueryCache(self.targets_random)
+        cache.get_points_within_distance(source_paris, 500)
+        cache.set_targets(self.targets_random[:100])
+        self.assertEqual(cache.version, 1)
+        self.assertEqual(cache.stats().entries, 0)
+        indices, _ = cache.get_points_within_distance(source_paris, 500, return_format=INDICES)
+        expected = get_points_within_distance(source_paris, self.targets_random[:100], 500, return_format=INDICES)
+        np.testing.assert_array_equal(indices, expected[0])
+        self.assertEqual(cache.stats().misses, 2)
+        # the bounding box survives the new targets
+        self.assertEqual(len(cache._geometries), 1)
+
+    def test_eviction(self):
+        cache = QueryCache(self.targets_random)
+        cache.get_points_within_distance(self.sources[0], 1000)
+        size = cache.stats().bytes
+        cache.max_bytes = 2 * size
+        cache.get_points_within_distance(self.sources[0], 999)
+        cache.get_points_within_distance(self.sources[0], 1000)
+        cache.get_points_within_distance(self.sources[0], 998)
+        stats = cache.stats()
+        self.assertEqual((stats.evictions, stats.entries), (1, 2))
+        self.assertLessEqual(stats.bytes, cache.max_bytes)
+        # 1000 was used more recently than 999
+        cache.get_points_within_distance(self.sources[0], 1000)
+        self.assertEqual(cache.stats().hits, 2)
+
+        cache = QueryCache(self.targets_random, max_bytes=ENTRY_OVERHEAD)
+        cache.get_points_within_distance(self.sources[0], 1000)
+        self.assertEqual(cache.stats().entries, 0)
+
+    def test_frame(self):
+        frame = pd.DataFrame({'lat': self.targets_random[:, 0], 'lon': self.targets_random[:, 1]},
+                             index=np.arange(len(self.targets_random)) + 100)
+        cache = QueryCache(frame)
+        for _ in range(2):
+            result = cache.get_closest_points(source_paris, 5)
+            expected = get_closest_points(source_paris, frame, 5)
+            np.testing.assert_array_equal(result.index, expected.index)
+            np.testing.assert_array_equal(result['distance'], expected['distance'])
+
+    def test_instrumented(self):
+        cache = QueryCache(self.targets_random)
+        with record_queries() as stats:
+            cache.get_points_within_distance(source_paris, 500)
+            cache.get_points_within_distance(source_paris, 500)
+        self.assertEqual([query.name for query in stats], ['QueryCache.get_points_within_distance'] * 2)
+        self.assertGreater(stats[0].candidates, 0)
+        self.assertEqual(stats[1].candidates, 0)
+
+    def test_validation(self):
+        with self.assertRaises(ValueError):
+            QueryCache([(95, 0)])
+        cache = QueryCache(self.targets_random)
+        with self.assertRaises(ValueError):
+            cache.get_points_within_distance((95, 0), 10)
+        with self.assertRaises(ValueError):
+            cache.get_closest_points(source_paris, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
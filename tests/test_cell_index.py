@@ -0,0 +1,95 @@
+import unittest
+import numpy as np
+
+from boundingbox.boundingbox import BoundingBox
+from boundingbox.cell_index import CellIndex, MAX_LEVEL, cell_keys, bbox_rectangles
+from boundingbox.distances import get_points_within_distance, get_closest_points, count_points_within_distance
+from boundingbox.settings import INDICES, MILES, NORTH, SOUTH, EAST, WEST
+
+from tests.resources.locations import locations_paris, random_targets
+
+
+source_paris = locations_paris['source']
+
+
+def sorted_by_distance_then_index(indices, distances):
+    order = np.lexsort((indices, distances))
+    return indices[order], distances[order]
+
+
+class TestCellIndex(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(29)
+        cities = np.array([source_paris, (51.5, -0.12), (0, 179.95), (89.8, 40), (-89.9, 0), (-33.9, 151.2)])
+        clustered = cities[random.randint(0, len(cities), 30000)] + random.normal(0, 0.2, (30000, 2))
+        clustered[:, 0] = np.clip(clustered[:, 0], -90, 90)
+        clustered[:, 1] = (clustered[:, 1] + 180) % 360 - 180
+        uniform = random_targets(random, 10000)
+        self.targets = np.vstack((clustered, uniform, [(90, 0), (-90, 180), (0, -180), (0, 180)]))
+        self.sources = list(map(tuple, cities)) + [(90, 0), (0, -180), (20, 20)]
+
+    def test_cell_keys(self):
+        # the quadrants of the first level, the row bit before the column bit
+        keys = cell_keys(np.array([-45, -45, 45, 45]), np.array([-90, 90, -90, 90]))
+        np.testing.assert_array_equal(keys >> 2 * (MAX_LEVEL - 1), [0, 1, 2, 3])
+        self.assertEqual(cell_keys(np.array([90]), np.array([180]))[0], 4 ** MAX_LEVEL - 1)
+        self.assertEqual(cell_keys(np.array([-90]), np.array([-180]))[0], 0)
+
+    def test_bbox_rectangles(self):
+        bboxs = {'front': {NORTH: 1, SOUTH: 0, WEST: 179, EAST: -179}}
+        np.testing.assert_array_equal(bbox_rectangles(bboxs), [(0, 1, 179, 180), (0, 1, -180, -179)])
+
+    def test_matches_arrays(self):
+        for leaf_size in [1, 64, 1024]:
+            index = CellIndex(self.targets, leaf_size)
+            np.testing.assert_array_equal(np.asarray(index), self.targets)
+            for source in self.sources:
+                for length in [1, 30, 500, 5000, 20015.2]:
+                    expected = get_points_within_distance(source, self.targets, length, return_format=INDICES)
+                    result = get_points_within_distance(source, index, length, return_format=INDICES)
+                    for array, expected_array in zip(sorted_by_distance_then_index(*result),
+                                                     sorted_by_distance_then_index(*expected)):
+                        np.testing.assert_array_equal(array, expected_array)
+                    self.assertEqual(count_points_within_distance(source, index, length), len(expected[0]))
+
+    def test_closest_points(self):
+        index = CellIndex(self.targets)
+        for source in self.sources:
+            for units in ['km', MILES]:
+                _, expected = get_closest_points(source, self.targets, 25, units=units, return_format=INDICES)
+                _, distances = get_closest_points(source, index, 25, units=units, return_format=INDICES)
+                np.testing.assert_array_equal(distances, expected)
+
+    def test_positions_in_bboxs(self):
+        index = CellIndex(self.targets, leaf_size=64)
+        for source in self.sources:
+            boundingbox = BoundingBox(source, 50)
+            inside, border = index.positions_in_bboxs(boundingbox.bbox)
+            self.assertEqual(len(np.intersect1d(inside, border)), 0)
+            self.assertTrue(boundingbox.mask_in_bounding_boxes(index.latitudes[inside], index.longitudes[inside],
+                                                               boundingbox.bbox).all())
+            in_bbox = np.flatnonzero(boundingbox.mask_in_bounding_boxes(index.latitudes, index.longitudes,
+                                                                        boundingbox.bbox))
+            np.testing.assert_array_equal(np.intersect1d(in_bbox, np.concatenate((inside, border))), in_bbox)
+
+    def test_scans_local_cells(self):
+        # a 10 km box in a city only reads the targets of the city near the box, not the whole latitude band
+        random = np.random.RandomState(31)
+        cities = np.column_stack((np.full(20, source_paris[0]), np.linspace(-170, 170, 20)))
+        targets = cities[random.randint(0, 20, 50000)] + random.normal(0, 0.1, (50000, 2))
+        index = CellIndex(targets, leaf_size=64)
+        boundingbox = BoundingBox((source_paris[0], cities[3, 1]), 10)
+        inside, border = index.positions_in_bboxs(boundingbox.bbox)
+        band = np.count_nonzero(np.abs(targets[:, 0] - source_paris[0]) <= 0.1)
+        self.assertLess(len(inside) + len(border), band / 10)
+
+    def test_validation(self):
+        with self.assertRaises(ValueError):
+            CellIndex([(95, 0)])
+        with self.assertRaises(ValueError):
+            CellIndex([(45, 0)], leaf_size=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,6 +3,7 @@ import numpy as np
 
 from boundingbox.boundingbox import BoundingBox
 from boundingbox.coordinates import convert_latlon_degrees_to_radians
+from boundingbox.validations.coordinates import validate_latlons_array
 
 latlon_degrees_1 = (0,0)
 latlon_degrees_2 = (45, 45)
@@ -18,6 +19,28 @@ class TestCoordinates(unittest.TestCase):
         self.assertEqual(convert_latlon_degrees_to_radians(latlon_degrees_1), (0,0))
         self.assertEqual(convert_latlon_degrees_to_radians(latlon_degrees_2), (np.pi/4, np.pi/4))
         self.assertEqual(convert_latlon_degrees_to_radians(latlon_degrees_3), (-np.pi/4, -np.pi/3))
+        self.assertRaises(ValueError, convert_latlon_degrees_to_radians, (91, 0))
+        self.assertEqual(convert_latlon_degrees_to_radians((180, 0), validate=False), (np.pi, 0))
+
+    def test_validate_latlons_array(self):
+        validate_latlons_array(np.array([latlon_degrees_1, latlon_degrees_2, (90, -180), (-90, 180)]))
+        validate_latlons_array([latlon_degrees_3])
+        validate_latlons_array(np.empty((0, 2)))
+        validate_latlons_array([])
+
+        latlons = np.zeros((30, 2))
+        latlons[[3, 7, 8, 12], :] = [(91, 0), (0, -180.5), (np.nan, 0), (0, np.inf)]
+        with self.assertRaisesRegex(ValueError, r'rows \[3, 7, 8, 12\]$'):
+            validate_latlons_array(latlons)
+        with self.assertRaisesRegex(ValueError, r'rows \[103, 107, 108, 112\]$'):
+            validate_latlons_array(latlons, offset=100)
+        latlons[:, 0] = 100
+        with self.assertRaisesRegex(ValueError, r'rows \[0, 1, 2, 3, 4, 5, 6, 7, 8, 9\] and 20 more$'):
+            validate_latlons_array(latlons)
+
+        self.assertRaises(ValueError, validate_latlons_array, [('a', 'b')])
+        self.assertRaises(ValueError, validate_latlons_array, np.zeros((4, 3)))
+        self.assertRaises(ValueError, validate_latlons_array, [(0, 0), (1,)])
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -1,20 +1,23 @@
 import unittest
 import numpy as np
-from boundingbox.distances import get_points_within_distance, get_closest_points
+from boundingbox.distances import get_points_within_distance, get_closest_points, get_points_within_distance_many, \
+    get_closest_points_many, count_points_within_distance, distance_histogram
 from boundingbox.coordinates import convert_latlon_degrees_to_radians
-from tests.resources.locations import locations_paris, locations_edgecase_1
+from boundingbox.great_circle import haversine_distances
+from boundingbox.target_index import TargetIndex
+from tests.resources.locations import locations_paris, locations_edgecase_1, EDGE_SOURCES, random_targets
 
 
 source_paris = locations_paris['source']
 targets_paris = np.array(locations_paris['targets'])
-paris_distances_7 = np.array([6.698235303709655])
-paris_distances_200 = np.array([6.698235303709655, 7.562627816217736, 8.859287406231937,110.96572196425218])
+paris_distances_7 = np.array([6.698226051725781])
+paris_distances_200 = np.array([6.698226051725781, 7.562617370285722, 8.85927516927989,110.96556869208072])
 
 
 source_edgecase_1 = locations_edgecase_1['source']
 targets_edgecase_1= np.array(locations_edgecase_1['targets'])
-distances_edgecase_1_1 = np.array([1111.950802335329, 1111.950802335329])
-distances_edgecase_1_2 = np.array([1111.950802335329, 1111.950802335329, 1123.0703103586823])
+distances_edgecase_1_1 = np.array([1111.9492664455872, 1111.9492664455872])
+distances_edgecase_1_2 = np.array([1111.9492664455872, 1111.9492664455872, 1123.0687591100434])
 
 class TestDistances(unittest.TestCase):
 
@@ -41,6 +44,69 @@ class TestDistances(unittest.TestCase):
         arrays_equal = np.array_equal(distances, distances_edgecase_1_2)
         self.assertEqual(arrays_equal, True)
 
+    def test_get_closest_points_rescaling(self):
+        targets = random_targets(2, 2000)
+        expected = np.sort(haversine_distances(source_paris, targets))[:10]
+        for length in [0, 1e-9, 1, 100, None]:
+            distances = get_closest_points(source_paris, targets, 10, length)[:, 1].astype(float)
+            self.assertEqual(np.array_equal(distances, expected), True)
+            distances = get_closest_points(source_paris, TargetIndex(targets), 10, length)[:, 1].astype(float)
+            self.assertEqual(np.array_equal(distances, expected), True)
+
+    def test_get_closest_points_zero_length(self):
+        targets = np.vstack((targets_paris, [source_paris]))
+        closest = get_closest_points(source_paris, targets, 2, 0)
+        np.testing.assert_array_equal(closest, get_closest_points(source_paris, targets, 2))
+        self.assertEqual(closest[0][1], 0)
+
+    def test_get_closest_points_near_pole(self):
+        targets = random_targets(3, 2000)
+        expected = np.sort(haversine_distances((89, 170), targets))[:25]
+        distances = get_closest_points((89, 170), targets, 25, 10)[:, 1].astype(float)
+        self.assertEqual(np.array_equal(distances, expected), True)
+
+    def test_count_points_within_distance(self):
+        self.assertEqual(count_points_within_distance(source_paris, targets_paris, 7), 1)
+        np.testing.assert_array_equal(count_points_within_distance(source_paris, targets_paris, [200, 7, 8]),
+                                      [4, 1, 2])
+        targets = random_targets(4, 20000)
+        radii = [5000, 10, 300, 1000, 20000]
+        for source in EDGE_SOURCES:
+            distances = haversine_distances(source, targets)
+            expected = [np.count_nonzero(distances <= radius) for radius in radii]
+            np.testing.assert_array_equal(count_points_within_distance(source, targets, radii), expected)
+            np.testing.assert_array_equal(count_points_within_distance(source, TargetIndex(targets), radii), expected)
+            self.assertEqual(count_points_within_distance(source, targets, 1000),
+                             len(get_points_within_distance(source, targets, 1000)))
+
+    def test_distance_histogram(self):
+        np.testing.assert_array_equal(distance_histogram(source_paris, targets_paris, [0, 7, 8, 200]), [1, 1, 2])
+        targets = random_targets(4, 20000)
+        bins = [100, 500, 1000, 2500, 6000]
+        for source in [source_paris, (89, 170), (0, 179.9)]:
+            expected = np.histogram(haversine_distances(source, targets), bins)[0]
+            np.testing.assert_array_equal(distance_histogram(source, targets, bins), expected)
+        self.assertRaises(ValueError, distance_histogram, source_paris, targets, [10])
+        self.assertRaises(ValueError, distance_histogram, source_paris, targets, [10, 5])
+
+    def test_validate(self):
+        targets = np.concatenate((targets_paris, [(95, 0)]))
+        with self.assertRaisesRegex(ValueError, r'rows \[4\]$'):
+            get_points_within_distance(source_paris, targets, 200)
+        for engine in ['bbox', 'kdtree']:
+            self.assertRaises(ValueError, get_closest_points, source_paris, targets, 3, engine=engine)
+            self.assertRaises(ValueError, get_closest_points, (95, 0), targets_paris, 3, engine=engine)
+            self.assertRaises(ValueError, get_closest_points_many, [source_paris], targets, 3, engine=engine)
+            self.assertRaises(ValueError, get_closest_points_many, [(95, 0)], targets_paris, 3, engine=engine)
+        self.assertRaises(ValueError, get_points_within_distance_many, [source_paris], targets, 200)
+        self.assertRaises(ValueError, TargetIndex, targets)
+
+        # pre-validated targets are not checked again
+        distances = get_points_within_distance(source_paris, targets_paris, 200, validate=False)[:, 1]
+        self.assertEqual(np.array_equal(distances, paris_distances_200), True)
+        index = TargetIndex(targets_paris, validate=False)
+        self.assertEqual(len(get_closest_points(source_paris, index, 4)), 4)
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,113 @@
+import unittest
+import numpy as np
+
+from boundingbox.distances import get_points_within_distance, get_closest_points
+from boundingbox.dynamic import DynamicIndex
+from boundingbox.settings import INDICES
+
+from tests.resources.locations import EDGE_SOURCES, random_targets
+
+
+class TestDynamicIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.targets = random_targets(11, 5000)
+        self.index = DynamicIndex(cell_size=2)
+        self.index.insert_many(range(len(self.targets)), self.targets)
+        self.sources = EDGE_SOURCES
+
+    def assert_queries_match(self, ids, targets):
+        ids = np.asarray(ids)
+        for source in self.sources:
+            for length in [100, 1000]:
+                expected_indices, expected_distances = get_points_within_distance(
+                    source, targets, length, return_format=INDICES)
+                result_ids, distances = self.index.get_points_within_distance(source, length)
+                np.testing.assert_array_equal(distances, expected_distances)
+                self.assertEqual(set(result_ids.tolist()), set(ids[expected_indices].tolist()))
+            for N in [1, 10]:
+                expected_indices, expected_distances = get_closest_points(source, targets, N, return_format=INDICES)
+                result_ids, distances = self.index.get_closest_points(source, N, length=1)
+                np.testing.assert_array_equal(distances, expected_distances)
+                self.assert_ids_match_up_to_ties(source, ids, targets, expected_indices, result_ids, distances)
+
+    def assert_ids_match_up_to_ties(self, source, ids, targets, expected_indices, result_ids, distances):
+        """
+        The ids of each group of equal distances must match, except in the farthest group which the N-th closest
+        point may cut, where they must be among the ids of the targets at that distance.
+        """
+        expected_ids = ids[expected_indices]
+        for distance in np.unique(distances)[:-1]:
+            self.assertEqual(set(result_ids[distances == distance].tolist()),
+                             set(expected_ids[distances == distance].tolist()))
+        if len(distances):
+            farthest = distances[-1]
+            indices, target_distances = get_points_within_distance(source, targets, farthest, return_format=INDICES)
+            self.assertLessEqual(set(result_ids[distances == farthest].tolist()),
+                                 set(ids[indices[target_distances == farthest]].tolist()))
+
+    def test_queries(self):
+        self.assertEqual(len(self.index), 5000)
+        self.assert_queries_match(range(len(self.targets)), self.targets)
+
+    def test_insert_delete_move(self):
+        random = np.random.RandomState(12)
+        positions = {i: tuple(target) for i, target in enumerate(self.targets.tolist())}
+        for i in range(3000):
+            target_id = int(random.randint(5000))
+            if target_id in positions:
+                self.index.delete(target_id)
+                del positions[target_id]
+            moved = int(random.randint(5000))
+            if moved in positions:
+                # small moves usually stay in the same cell, large ones do not
+                delta = random.normal(0, 0.1 if i % 2 else 20, 2)
+                latlon = (float(np.clip(positions[moved][0] + delta[0], -90, 90)),
+                          float((positions[moved][1] + delta[1] + 180) % 360 - 180))
+                self.index.move(moved, latlon)
+                positions[moved] = latlon
+        self.index.insert('new', (48.86, 2.35))
+        positions['new'] = (48.86, 2.35)
+
+        self.assertEqual(len(self.index), len(positions))
+        self.assertEqual(self.index.position('new'), (48.86, 2.35))
+        ids = list(positions)
+        self.assert_queries_match(np.array(ids, dtype=object), np.array([positions[i] for i in ids]))
+        self.index.compact()
+        self.assertEqual(len(self.index._ids), len(positions))
+        self.assert_queries_match(np.array(ids, dtype=object), np.array([positions[i] for i in ids]))
+
+    def test_closest_points_zero_length(self):
+        expected_ids, expected_distances = self.index.get_closest_points((0, 0), 5)
+        for length in [0, 1e-9]:
+            ids, distances = self.index.get_closest_points((0, 0), 5, length=length)
+            np.testing.assert_array_equal(ids, expected_ids)
+            np.testing.assert_array_equal(distances, expected_distances)
+
+    def test_compaction_is_automatic(self):
+        for target_id in range(4000):
+            self.index.delete(target_id)
+        self.assertLess(len(self.index._ids), 2 * 4000)
+        self.assertEqual(sorted(self.index.ids), list(range(4000, 5000)))
+
+    def test_errors(self):
+        self.assertRaises(ValueError, self.index.insert, 0, (0, 0))
+        self.assertRaises(ValueError, self.index.insert, 'x', (95, 0))
+        self.assertRaises(KeyError, self.index.delete, 'x')
+        self.assertRaises(KeyError, self.index.move, 'x', (0, 0))
+        self.assertRaises(ValueError, self.index.insert_many, ['a', 'a'], [(0, 0), (1, 1)])
+        self.assertRaises(ValueError, DynamicIndex, cell_size=0)
+        self.assertRaises(ValueError, DynamicIndex, cell_size=-1)
+        self.assertRaises(ValueError, DynamicIndex, cell_size='abc')
+        self.assertRaises(ValueError, DynamicIndex, cell_size=None)
+
+    def test_empty(self):
+        index = DynamicIndex()
+        self.assertEqual(len(index.get_closest_points((0, 0), 3)[0]), 0)
+        self.assertEqual(len(index.get_points_within_distance((0, 0), 100)[0]), 0)
+        index.insert((1, 2), (0, 0))
+        self.assertEqual(index.get_closest_points((0, 0), 3)[0].tolist(), [(1, 2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
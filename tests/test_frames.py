@@ -0,0 +1,88 @@
+import unittest
+import numpy as np
+import pandas as pd
+
+from boundingbox.coordinates import LatLonColumns
+from boundingbox.distances import get_points_within_distance, get_closest_points, count_points_within_distance, \
+    get_points_within_distance_many
+from boundingbox.frames import frame_columns
+from boundingbox.join import distance_join_arrays
+from boundingbox.settings import INDICES, KDTREE
+from boundingbox.target_index import TargetIndex
+
+from tests.resources.locations import locations_paris
+
+
+source_paris = locations_paris['source']
+targets_paris = np.array(locations_paris['targets'])
+
+
+class TestFrames(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(19)
+        self.targets = np.column_stack((random.uniform(47, 50, 5000), random.uniform(0, 4, 5000)))
+        self.frame = pd.DataFrame({'name': ['t{}'.format(i) for i in range(len(self.targets))],
+                                   'lat': self.targets[:, 0], 'lon': self.targets[:, 1]},
+                                  index=np.arange(len(self.targets)) * 10 + 7)
+
+    def test_frame_columns_are_views(self):
+        columns = frame_columns(self.frame)
+        self.assertTrue(np.shares_memory(columns.lats, self.frame['lat'].to_numpy()))
+        np.testing.assert_array_equal(columns.lons, self.targets[:, 1])
+        with self.assertRaises(ValueError):
+            frame_columns(self.frame.rename(columns={'lon': 'longitude'}))
+
+    def test_get_points_within_distance(self):
+        expected_indices, expected_distances = get_points_within_distance(source_paris, self.targets, 50,
+                                                                          return_format=INDICES)
+        result = get_points_within_distance(source_paris, self.frame, 50)
+        self.assertIsInstance(result, pd.DataFrame)
+        self.assertEqual(list(result.columns), ['name', 'lat', 'lon', 'distance'])
+        np.testing.assert_array_equal(result.index, self.frame.index[expected_indices])
+        np.testing.assert_array_equal(result['distance'], expected_distances)
+        self.assertNotIn('distance', self.frame.columns)
+
+        indices, distances = get_points_within_distance(source_paris, self.frame, 50, return_format=INDICES)
+        np.testing.assert_array_equal(indices, expected_indices)
+
+    def test_get_closest_points(self):
+        expected_indices, expected_distances = get_closest_points(source_paris, self.targets, 20,
+                                                                  return_format=INDICES)
+        for engine in ['bbox', KDTREE]:
+            result = get_closest_points(source_paris, self.frame, 20, engine=engine)
+            np.testing.assert_array_equal(result['name'], self.frame['name'].to_numpy()[expected_indices])
+            np.testing.assert_array_equal(result['distance'], expected_distances)
+
+    def test_columns(self):
+        columns = LatLonColumns(self.targets[:, 0], self.targets[:, 1])
+        self.assertTrue(np.shares_memory(columns.lats, self.targets))
+        expected_indices, expected_distances = get_points_within_distance(source_paris, self.targets, 30,
+                                                                          return_format=INDICES)
+        indices, distances = get_points_within_distance(source_paris, columns, 30, return_format=INDICES)
+        np.testing.assert_array_equal(indices, expected_indices)
+        np.testing.assert_array_equal(distances, expected_distances)
+        self.assertEqual(count_points_within_distance(source_paris, columns, 30), len(indices))
+        index = TargetIndex(columns)
+        np.testing.assert_array_equal(index.targets, TargetIndex(self.targets).targets)
+
+        with self.assertRaises(ValueError):
+            LatLonColumns([1, 2], [3])
+        with self.assertRaises(ValueError):
+            get_points_within_distance(source_paris, LatLonColumns([95, 2], [3, 4]), 30)
+
+    def test_many_and_join(self):
+        sources = pd.DataFrame({'lat': targets_paris[:, 0], 'lon': targets_paris[:, 1]})
+        expected = get_points_within_distance_many(targets_paris, self.targets, 10)
+        result = get_points_within_distance_many(sources, self.frame, 10)
+        np.testing.assert_array_equal(result.indices, expected.indices)
+        np.testing.assert_array_equal(result.offsets, expected.offsets)
+
+        expected = distance_join_arrays(targets_paris, self.targets, 10)
+        result = distance_join_arrays(sources, self.frame, 10)
+        for expected_array, array in zip(expected, result):
+            np.testing.assert_array_equal(array, expected_array)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+import numpy as np
+
+from boundingbox.great_circle import haversine_distances, haversine_distances_columns
+from boundingbox.settings import EARTH_RADIUS, KM, MILES
+
+from tests.resources.locations import locations_paris
+
+
+source_paris = locations_paris['source']
+targets_paris = np.array(locations_paris['targets'])
+paris_distances = np.array([6.698226051725781, 7.562617370285722, 8.85927516927989, 110.96556869208072])
+
+
+class TestGreatCircle(unittest.TestCase):
+
+    def test_haversine_distances(self):
+        distances = haversine_distances(source_paris, targets_paris)
+        self.assertTrue(np.allclose(distances, paris_distances, rtol=1e-12))
+
+    def test_haversine_distances_list_of_tuples(self):
+        distances = haversine_distances(source_paris, locations_paris['targets'])
+        self.assertTrue(np.allclose(distances, paris_distances, rtol=1e-12))
+
+    def test_haversine_distances_units(self):
+        distances = haversine_distances(source_paris, targets_paris, units=MILES)
+        self.assertTrue(np.allclose(distances, paris_distances * EARTH_RADIUS[MILES] / EARTH_RADIUS[KM]))
+
+    def test_haversine_distances_columns(self):
+        distances = haversine_distances_columns(source_paris, targets_paris[:, 0], targets_paris[:, 1])
+        self.assertTrue(np.allclose(distances, paris_distances, rtol=1e-12))
+
+    def test_haversine_distances_antipodal(self):
+        distances = haversine_distances((0, 0), [(0, 180), (90, 0), (-90, 0)])
+        expected = np.pi * EARTH_RADIUS[KM] * np.array([1, 0.5, 0.5])
+        self.assertTrue(np.allclose(distances, expected))
+
+    def test_haversine_distances_empty(self):
+        self.assertEqual(haversine_distances(source_paris, np.empty((0, 2))).shape, (0,))
+
+
+if __name__ == '__main__':
+    unittest.main()
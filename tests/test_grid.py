@@ -0,0 +1,39 @@
+import unittest
+import numpy as np
+
+from boundingbox.boundingbox import BoundingBox
+from boundingbox.grid import grid_shape, cell_ids, cells_in_bbox, cells_in_bboxs
+from boundingbox.settings import FRONT, REVERSE, NORTH, SOUTH, EAST, WEST
+
+from tests.resources.locations import random_targets
+
+
+class TestGrid(unittest.TestCase):
+
+    def test_cell_ids(self):
+        self.assertEqual(grid_shape(1), (180, 360))
+        self.assertEqual(grid_shape(0.7), (258, 515))
+        np.testing.assert_array_equal(cell_ids([-90, -89.5, 0, 90, 90], [-180, -179.5, 0, 179.9, 180], 1),
+                                      [0, 0, 90 * 360 + 180, 179 * 360 + 359, 179 * 360 + 359])
+
+    def test_cells_in_bbox(self):
+        bbox = {NORTH: 1.5, SOUTH: 0.5, WEST: -0.5, EAST: 1.5}
+        np.testing.assert_array_equal(cells_in_bbox(bbox, 1), [90 * 360 + 179, 90 * 360 + 180, 90 * 360 + 181,
+                                                               91 * 360 + 179, 91 * 360 + 180, 91 * 360 + 181])
+        # across the antimeridian
+        bbox = {NORTH: 0.5, SOUTH: 0.5, WEST: 179.5, EAST: -179.5}
+        np.testing.assert_array_equal(cells_in_bbox(bbox, 1), [90 * 360, 90 * 360 + 359])
+
+    def test_cells_cover_targets_in_bbox(self):
+        targets = random_targets(10, 20000)
+        for source, length in [((48.8566, 2.3522), 500), ((89, 170), 300), ((0, 179.9), 800), ((-88, -120), 1000)]:
+            boundingbox = BoundingBox(source, length)
+            self.assertEqual(REVERSE in boundingbox.bbox, abs(source[0]) > 80)
+            in_bbox = boundingbox.filter_targets_in_bboxs(targets, boundingbox.bbox)
+            covered = cells_in_bboxs(boundingbox.bbox, 2.5)
+            self.assertTrue(np.all(np.isin(cell_ids(in_bbox[:, 0], in_bbox[:, 1], 2.5), covered)))
+            self.assertTrue(set(cells_in_bbox(boundingbox.bbox[FRONT], 2.5)) <= set(covered))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import os
+import subprocess
+import sys
+import unittest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_python(code):
+    return subprocess.check_output([sys.executable, '-c', code], cwd=ROOT, universal_newlines=True).split()
+
+
+class TestImports(unittest.TestCase):
+
+    def test_no_optional_dependencies_on_import(self):
+        loaded = run_python(
+            'import sys\n'
+            'import boundingbox.boundingbox, boundingbox.distances\n'
+            'for module in ["scipy", "pandas", "haversine", "multiprocessing", "concurrent.futures.process"]:\n'
+            '    print(module in sys.modules)')
+        self.assertEqual(loaded, ['False'] * 5)
+
+    def test_modules_are_not_reloaded(self):
+        identical = run_python(
+            'import boundingbox.coordinates, boundingbox.validations.coordinates as validations\n'
+            'validate, convert = validations.validate_latlon_degrees, boundingbox.coordinates.as_latlon_array\n'
+            'import boundingbox.boundingbox, boundingbox.distances\n'
+            'print(validations.validate_latlon_degrees is validate)\n'
+            'print(boundingbox.coordinates.as_latlon_array is convert)')
+        self.assertEqual(identical, ['True', 'True'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from boundingbox.boundingbox import BoundingBox
+from boundingbox.distances import get_points_within_distance, get_closest_points, get_closest_points_many
+from boundingbox.instrumentation import add_hook, remove_hook, record_queries, query, stage, count, \
+    MAKE_BOUNDING_BOX, BBOX_FILTER, HAVERSINE, SORT, SHARDS
+from boundingbox.streaming import get_points_within_distance_streaming
+
+from tests.resources.locations import locations_paris
+
+
+source_paris = locations_paris['source']
+targets_paris = np.array(locations_paris['targets'])
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def test_disabled(self):
+        self.assertIs(query('q'), stage(SORT))
+        count('candidates', 1)
+        with query('q') as stats:
+            self.assertIsNone(stats)
+
+    def test_points_within_distance(self):
+        with record_queries() as queries:
+            result = get_points_within_distance(source_paris, targets_paris, 30)
+        self.assertEqual(len(queries), 1)
+        stats = queries[0]
+        self.assertEqual(stats.name, 'get_points_within_distance')
+        for name in [MAKE_BOUNDING_BOX, BBOX_FILTER, HAVERSINE, SORT]:
+            self.assertGreaterEqual(stats.stages[name], 0)
+        self.assertGreaterEqual(stats.duration, sum(stats.stages.values()))
+        self.assertEqual(stats.within_distance, len(result))
+        self.assertGreaterEqual(stats.candidates, stats.within_distance)
+        self.assertAlmostEqual(stats.false_positive_ratio, 1 - len(result) / stats.candidates)
+        self.assertEqual(stats.rescales, 0)
+
+    def test_closest_points_rescales(self):
+        with record_queries() as queries:
+            get_closest_points(source_paris, targets_paris, 3, length=0.01)
+        self.assertEqual(len(queries), 1)
+        self.assertGreater(queries[0].rescales, 0)
+        self.assertGreaterEqual(queries[0].within_distance, 3)
+
+    def test_closest_points_many_rescales(self):
+        with record_queries() as queries:
+            get_closest_points_many([source_paris, (48, 2)], targets_paris, 3, length=0.01)
+        self.assertEqual([stats.name for stats in queries], ['get_closest_points_many'])
+        self.assertGreater(queries[0].rescales, 0)
+
+    def test_bounding_box_queries(self):
+        boundingbox = BoundingBox(source_paris, 30)
+        with record_queries() as queries:
+            boundingbox.get_points_within_bboxs(targets_paris, boundingbox.bbox)
+            boundingbox.get_points_within_bbox(targets_paris, boundingbox.bbox['front'])
+        self.assertEqual([stats.name for stats in queries],
+                         ['BoundingBox.get_points_within_bboxs', 'BoundingBox.get_points_within_bbox'])
+        self.assertIsNone(queries[0].false_positive_ratio)
+        self.assertEqual(queries[0].candidates, queries[1].candidates)
+
+    def test_streaming(self):
+        with record_queries() as queries:
+            result = get_points_within_distance_streaming(source_paris, targets_paris, 30, chunk_size=7)
+        self.assertEqual(queries[0].within_distance, len(result))
+
+    def test_executor(self):
+        with record_queries() as queries, ThreadPoolExecutor(2) as executor:
+            get_points_within_distance(source_paris, targets_paris, 30, executor=executor)
+        self.assertIn(SHARDS, queries[0].stages)
+
+    def test_hooks(self):
+        names = []
+        hook = lambda stats: names.append(stats.name)
+        add_hook(hook)
+        try:
+            get_closest_points(source_paris, targets_paris, 3)
+        finally:
+            remove_hook(hook)
+        get_closest_points(source_paris, targets_paris, 3)
+        self.assertEqual(names, ['get_closest_points'])
+
+
+if __name__ == '__main__':
+    unittest.main()
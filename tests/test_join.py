@@ -0,0 +1,85 @@
+import unittest
+import numpy as np
+
+from boundingbox.great_circle import haversine_distances
+from boundingbox.join import distance_join, distance_join_arrays
+from boundingbox.target_index import TargetIndex
+
+from tests.resources.locations import random_targets
+
+
+def brute_force_join(A, B, length):
+    pairs = []
+    lengths = np.broadcast_to(length, (len(A),))
+    for a, source in enumerate(A):
+        distances = haversine_distances(source, B)
+        for b in np.flatnonzero(distances <= lengths[a]):
+            pairs.append((a, b, distances[b]))
+    return sorted(pairs, key=lambda pair: (pair[0], pair[2], pair[1]))
+
+
+class TestJoin(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(9)
+        self.A = random_targets(random, 300)
+        # points near the poles and the antimeridian exercise the REVERSE boxes and the wrapped longitudes
+        self.A[:4] = [(89.9, 10), (-89.5, -170), (10, 179.99), (-20, -179.99)]
+        self.B = random_targets(random, 2000)
+        self.B[:3] = [(89.95, -170), (-89.9, 20), (10, -179.99)]
+
+    def assert_join_equal(self, result, expected):
+        a_indices, b_indices, distances = result
+        self.assertEqual(list(zip(a_indices.tolist(), b_indices.tolist())), [pair[:2] for pair in expected])
+        np.testing.assert_allclose(distances, [pair[2] for pair in expected], rtol=1e-12)
+
+    def test_distance_join(self):
+        for length in [50, 700, 3000]:
+            expected = brute_force_join(self.A, self.B, length)
+            self.assert_join_equal(distance_join_arrays(self.A, self.B, length), expected)
+            self.assert_join_equal(distance_join_arrays(self.A, TargetIndex(self.B), length), expected)
+
+    def test_chunks(self):
+        expected = brute_force_join(self.A, self.B, 3000)
+        chunks = list(distance_join(self.A, self.B, 3000, max_pairs=5000))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(sum(len(chunk[0]) for chunk in chunks), len(expected))
+        self.assert_join_equal(distance_join_arrays(self.A, self.B, 3000, max_pairs=5000), expected)
+
+    def test_lengths_per_point(self):
+        lengths = np.linspace(10, 2000, len(self.A))
+        a_indices, _, distances = distance_join_arrays(self.A, self.B, lengths)
+        self.assertTrue(np.all(distances <= lengths[a_indices]))
+        self.assertEqual(len(distances), sum(np.count_nonzero(haversine_distances(a, self.B) <= length)
+                                             for a, length in zip(self.A, lengths)))
+
+    def test_mixed_lengths(self):
+        # the rows follow the median length, the long boxes span many rows and across the poles
+        lengths = np.where(np.arange(len(self.A)) % 10 == 0, 6000, 30.0)
+        self.assert_join_equal(distance_join_arrays(self.A, self.B, lengths, max_pairs=1000),
+                               brute_force_join(self.A, self.B, lengths))
+
+    def test_clustered(self):
+        random = np.random.RandomState(10)
+        cities = np.array([(48.8566, 2.3522), (51.5, -0.12), (-33.9, 151.2), (0, 179.99), (89.9, 0)])
+        A = cities[random.randint(0, len(cities), 300)] + random.normal(0, 0.05, (300, 2))
+        B = cities[random.randint(0, len(cities), 3000)] + random.normal(0, 0.05, (3000, 2))
+        for points in [A, B]:
+            points[:, 0] = np.clip(points[:, 0], -90, 90)
+            points[:, 1] = (points[:, 1] + 180) % 360 - 180
+        for length in [1, 10]:
+            self.assert_join_equal(distance_join_arrays(A, B, length), brute_force_join(A, B, length))
+
+    def test_self_join(self):
+        a_indices, b_indices, distances = distance_join_arrays(self.A, self.A, 100)
+        self.assertTrue(set(zip(range(len(self.A)), range(len(self.A)))) <= set(zip(a_indices, b_indices)))
+
+    def test_validation(self):
+        self.assertRaises(ValueError, distance_join_arrays, [(95, 0)], self.B, 10)
+        self.assertRaises(ValueError, distance_join_arrays, self.A, [(0, 190)], 10)
+        self.assertRaises(ValueError, distance_join_arrays, self.A, self.B, -1)
+        self.assertEqual(len(distance_join_arrays(np.empty((0, 2)), self.B, 10)[0]), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import numpy as np
+
+from boundingbox.distances import get_closest_points, get_closest_points_many
+from boundingbox.great_circle import haversine_distances, chord_to_distance, distance_to_chord, \
+    latlon_degrees_to_unit_vectors
+from boundingbox.nearest import UnitVectorTree
+from boundingbox.target_index import TargetIndex
+from boundingbox.settings import KDTREE, MILES
+
+from tests.resources.locations import locations_paris, locations_edgecase_1, random_targets
+
+
+source_paris = locations_paris['source']
+targets_paris = np.array(locations_paris['targets'])
+
+source_edgecase_1 = locations_edgecase_1['source']
+targets_edgecase_1 = np.array(locations_edgecase_1['targets'])
+distances_edgecase_1_2 = np.array([1111.9492664455872, 1111.9492664455872, 1123.0687591100434])
+
+sources_edge = np.array([(0, 0), (18.1248, 178.4501), (60, -179.5), (89, 170), (-88, -120), (-90, 0)])
+
+
+class TestNearest(unittest.TestCase):
+
+    def setUp(self):
+        self.targets_random = random_targets(4, 5000)
+        self.tree_random = UnitVectorTree(self.targets_random)
+
+    def test_unit_vectors(self):
+        vectors = latlon_degrees_to_unit_vectors(np.array([0, 90, 0]), np.array([0, 0, 90]))
+        np.testing.assert_allclose(vectors, np.eye(3)[[0, 2, 1]], atol=1e-15)
+
+    def test_chord_distance_round_trip(self):
+        lengths = np.array([0, 1, 1000, 20000])
+        np.testing.assert_allclose(chord_to_distance(distance_to_chord(lengths)), lengths, atol=1e-8)
+
+    def test_get_closest_points_edge_case_1(self):
+        distances = get_closest_points(source_edgecase_1, targets_edgecase_1, 3, engine=KDTREE)[:, 1]
+        np.testing.assert_allclose(distances.astype(float), distances_edgecase_1_2)
+
+    def test_get_closest_points_matches_bbox(self):
+        for source in sources_edge:
+            expected = get_closest_points(tuple(source), self.targets_random, 20, 100)
+            closest = get_closest_points(tuple(source), self.tree_random, 20)
+            np.testing.assert_array_equal(closest[:, 1], expected[:, 1])
+
+    def test_get_closest_points_more_than_targets(self):
+        closest = get_closest_points(source_paris, targets_paris, 10, engine=KDTREE)
+        self.assertEqual(len(closest), len(targets_paris))
+
+    def test_get_closest_points_many(self):
+        result = get_closest_points_many(sources_edge, self.tree_random, 7, units=MILES)
+        for i, source in enumerate(sources_edge):
+            distances = haversine_distances(source, self.targets_random, MILES)
+            np.testing.assert_allclose(result.distances[7 * i:7 * (i + 1)], np.sort(distances)[:7])
+            np.testing.assert_allclose(distances[result.indices[7 * i:7 * (i + 1)]], np.sort(distances)[:7])
+
+    def test_tree_from_target_index(self):
+        indices, _ = UnitVectorTree(TargetIndex(self.targets_random)).query(sources_edge, 5)
+        expected, _ = self.tree_random.query(sources_edge, 5)
+        np.testing.assert_array_equal(indices, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
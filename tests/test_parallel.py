@@ -0,0 +1,66 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
+
+from boundingbox.boundingbox import BoundingBox
+from boundingbox.distances import get_points_within_distance, get_closest_points
+from boundingbox.parallel import shard_bounds, map_shards
+
+from tests.resources.locations import locations_paris, random_targets
+
+
+source_paris = locations_paris['source']
+targets_paris = np.array(locations_paris['targets'])
+
+
+def count_targets(targets):
+    return len(targets)
+
+
+class TestParallel(unittest.TestCase):
+
+    def setUp(self):
+        self.targets_random = random_targets(6, 20000)
+
+    def test_shard_bounds(self):
+        self.assertEqual(shard_bounds(10, 3), [(0, 3), (3, 6), (6, 10)])
+        self.assertEqual(shard_bounds(2, 4), [(0, 1), (1, 2)])
+        self.assertEqual(shard_bounds(0, 4), [(0, 0)])
+
+    def test_map_shards_threads(self):
+        with ThreadPoolExecutor(4) as executor:
+            self.assertEqual(map_shards(executor, count_targets, self.targets_random, n_shards=4),
+                             [(0, 5000), (5000, 5000), (10000, 5000), (15000, 5000)])
+
+    def test_thread_pool(self):
+        with ThreadPoolExecutor(4) as executor:
+            for source in [source_paris, (89, 170), (0, 179.9)]:
+                np.testing.assert_array_equal(
+                    get_points_within_distance(source, self.targets_random, 2000, executor=executor),
+                    get_points_within_distance(source, self.targets_random, 2000))
+                np.testing.assert_array_equal(
+                    get_closest_points(source, self.targets_random, 20, 10, executor=executor),
+                    get_closest_points(source, self.targets_random, 20, 10))
+            boundingbox = BoundingBox(source_paris, 1500)
+            np.testing.assert_array_equal(
+                boundingbox.get_points_within_bboxs(self.targets_random, boundingbox.bbox, executor=executor),
+                boundingbox.get_points_within_bboxs(self.targets_random, boundingbox.bbox))
+
+    def test_process_pool(self):
+        with ProcessPoolExecutor(2) as executor:
+            self.assertEqual(sum(count for _, count in map_shards(executor, count_targets, self.targets_random)), 20000)
+            np.testing.assert_array_equal(
+                get_points_within_distance(source_paris, self.targets_random, 2000, executor=executor),
+                get_points_within_distance(source_paris, self.targets_random, 2000))
+            np.testing.assert_array_equal(
+                get_closest_points(source_paris, self.targets_random, 20, executor=executor),
+                get_closest_points(source_paris, self.targets_random, 20))
+
+    def test_more_shards_than_targets(self):
+        with ThreadPoolExecutor(4) as executor:
+            closest = get_closest_points(source_paris, targets_paris, 3, 10, executor=executor)
+            np.testing.assert_array_equal(closest, get_closest_points(source_paris, targets_paris, 3, 10))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from boundingbox.boundingbox import BoundingBox
+from boundingbox.distances import get_points_within_distance, get_closest_points
+from boundingbox.results import format_results, RESULT_DTYPE
+from boundingbox.streaming import get_points_within_distance_streaming, get_closest_points_streaming
+from boundingbox.target_index import TargetIndex
+from boundingbox.settings import TUPLES, INDICES, STRUCTURED, KDTREE
+
+from tests.resources.locations import locations_paris, random_targets
+
+
+source_paris = locations_paris['source']
+targets_paris = np.array(locations_paris['targets'])
+paris_distances_200 = np.array([6.698226051725781, 7.562617370285722, 8.85927516927989, 110.96556869208072])
+
+
+class TestResults(unittest.TestCase):
+
+    def setUp(self):
+        self.targets_random = random_targets(7, 5000)
+
+    def test_format_results(self):
+        indices, distances = format_results(np.arange(4), targets_paris, paris_distances_200, INDICES)
+        self.assertEqual(indices.dtype, np.int64)
+        np.testing.assert_array_equal(distances, paris_distances_200)
+
+        results = format_results(np.arange(4), targets_paris, paris_distances_200, STRUCTURED)
+        self.assertEqual(results.dtype, RESULT_DTYPE)
+        np.testing.assert_array_equal(results['lat'], targets_paris[:, 0])
+        np.testing.assert_array_equal(results['lon'], targets_paris[:, 1])
+        np.testing.assert_array_equal(results['dist'], paris_distances_200)
+        np.testing.assert_array_equal(results['index'], np.arange(4))
+
+        tuples = format_results(np.arange(4), targets_paris, paris_distances_200, TUPLES)
+        self.assertEqual(tuples[0, 0], tuple(targets_paris[0]))
+
+    def test_invalid_return_format(self):
+        with self.assertRaises(ValueError):
+            get_points_within_distance(source_paris, targets_paris, 200, return_format='dict')
+
+    def assert_formats_agree(self, query):
+        tuples = query(TUPLES)
+        indices, distances = query(INDICES)
+        structured = query(STRUCTURED)
+        np.testing.assert_array_equal(distances, tuples[:, 1].astype(float))
+        np.testing.assert_array_equal(self.targets_random[indices], np.array(list(tuples[:, 0])).reshape(-1, 2))
+        np.testing.assert_array_equal(structured['index'], indices)
+        np.testing.assert_array_equal(structured['dist'], distances)
+        np.testing.assert_array_equal(structured['lat'], self.targets_random[indices, 0])
+
+    def test_get_points_within_distance(self):
+        index = TargetIndex(self.targets_random)
+        with ThreadPoolExecutor(3) as executor:
+            for targets, kwargs in [(self.targets_random, {}), (index, {}), (self.targets_random, {'executor': executor})]:
+                self.assert_formats_agree(lambda return_format: get_points_within_distance(
+                    (89, 170), targets, 2000, return_format=return_format, **kwargs))
+
+    def test_get_closest_points(self):
+        index = TargetIndex(self.targets_random)
+        with ThreadPoolExecutor(3) as executor:
+            for targets, kwargs in [(self.targets_random, {}), (index, {}), (self.targets_random, {'engine': KDTREE}),
+                                    (self.targets_random, {'executor': executor})]:
+                self.assert_formats_agree(lambda return_format: get_closest_points(
+                    source_paris, targets, 10, 10, return_format=return_format, **kwargs))
+
+    def test_get_points_within_bboxs(self):
+        boundingbox = BoundingBox(source_paris, 1000)
+        self.assert_formats_agree(lambda return_format: boundingbox.get_points_within_bboxs(
+            self.targets_random, boundingbox.bbox, return_format=return_format))
+
+    def test_streaming(self):
+        self.assert_formats_agree(lambda return_format: get_points_within_distance_streaming(
+            source_paris, self.targets_random, 2000, chunk_size=700, return_format=return_format))
+        self.assert_formats_agree(lambda return_format: get_closest_points_streaming(
+            source_paris, self.targets_random, 10, chunk_size=700, return_format=return_format))
+
+
+if __name__ == '__main__':
+    unittest.main()
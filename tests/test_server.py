@@ -0,0 +1,97 @@
+import asyncio
+import json
+import unittest
+import numpy as np
+
+from boundingbox.distances import get_points_within_distance, get_closest_points
+from boundingbox.server import BatchingQueryServer
+from boundingbox.settings import INDICES, STRUCTURED
+
+from tests.resources.locations import locations_paris, EDGE_SOURCES, random_targets
+
+
+source_paris = locations_paris['source']
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+class TestServer(unittest.TestCase):
+
+    def setUp(self):
+        self.targets_random = random_targets(8, 5000)
+        self.sources = EDGE_SOURCES + [(-45, -60)]
+
+    def test_batched_queries_match_single_queries(self):
+        async def query_all(server):
+            within = [server.get_points_within_distance(source, 1000) for source in self.sources]
+            closest = [server.get_closest_points(source, N) for N, source in enumerate(self.sources, 1)]
+            return await asyncio.gather(*within), await asyncio.gather(*closest)
+
+        for engine in ['bbox', 'kdtree']:
+            server = BatchingQueryServer(self.targets_random, engine=engine, window=0.05)
+            within, closest = run(query_all(server))
+            for N, (source, points, closest_points) in enumerate(zip(self.sources, within, closest), 1):
+                expected = get_points_within_distance(source, self.targets_random, 1000)
+                np.testing.assert_array_equal(points[:, 1].astype(float), expected[:, 1].astype(float))
+                expected = get_closest_points(source, self.targets_random, N)
+                np.testing.assert_array_equal(closest_points[:, 1].astype(float), expected[:, 1].astype(float))
+
+            stats = server.stats()
+            self.assertEqual(stats.requests, 10)
+            self.assertEqual(stats.batches, 2)
+            self.assertEqual(stats.mean_batch_size, 5)
+            self.assertGreater(stats.max_latency, 0)
+            self.assertGreater(stats.throughput, 0)
+
+    def test_max_batch_size_close_and_return_formats(self):
+        async def query_all():
+            server = BatchingQueryServer(self.targets_random, window=60, max_batch_size=2)
+            within = await asyncio.gather(server.get_points_within_distance(source_paris, 2000, INDICES),
+                                          server.get_points_within_distance(source_paris, 2000, STRUCTURED))
+            # a lone request would wait for the window, close() runs it at once
+            closest = asyncio.ensure_future(server.get_closest_points(source_paris, 3))
+            await asyncio.sleep(0)
+            await server.close()
+            return within, await closest, server.stats()
+
+        ((indices, distances), structured), closest, stats = run(query_all())
+        np.testing.assert_array_equal(indices, structured['index'])
+        np.testing.assert_array_equal(distances, structured['dist'])
+        self.assertEqual(len(closest), 3)
+        self.assertEqual(stats.batches, 2)
+
+    def test_validation(self):
+        server = BatchingQueryServer(self.targets_random)
+        self.assertRaises(ValueError, run, server.get_points_within_distance((95, 0), 10))
+        self.assertRaises(ValueError, run, server.get_closest_points(source_paris, 0))
+        self.assertRaises(ValueError, BatchingQueryServer, [(95, 0)])
+
+    def test_socket(self):
+        async def query_socket():
+            server = BatchingQueryServer(self.targets_random)
+            listener = await server.start_server()
+            host, port = listener.sockets[0].getsockname()[:2]
+            reader, writer = await asyncio.open_connection(host, port)
+            requests = [{'id': 1, 'type': 'within', 'source': list(source_paris), 'length': 1000},
+                        {'id': 2, 'type': 'closest', 'source': [0, 179.9], 'N': 4},
+                        {'id': 3, 'type': 'closest', 'source': [95, 0], 'N': 4}]
+            for request in requests:
+                writer.write((json.dumps(request) + '\n').encode())
+            await writer.drain()
+            responses = [json.loads(await reader.readline()) for _ in requests]
+            writer.close()
+            listener.close()
+            await listener.wait_closed()
+            return {response['id']: response for response in responses}
+
+        responses = run(query_socket())
+        indices, distances = get_points_within_distance(source_paris, self.targets_random, 1000, return_format=INDICES)
+        self.assertEqual(responses[1]['indices'], indices.tolist())
+        self.assertEqual(len(responses[2]['distances']), 4)
+        self.assertIn('error', responses[3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+
+from boundingbox.distances import get_points_within_distance, get_closest_points
+from boundingbox.streaming import iter_target_chunks, get_points_within_distance_streaming, \
+    get_closest_points_streaming
+
+from tests.resources.locations import locations_paris, locations_edgecase_1, random_targets
+
+
+source_paris = locations_paris['source']
+targets_paris = np.array(locations_paris['targets'])
+
+source_edgecase_1 = locations_edgecase_1['source']
+targets_edgecase_1 = np.array(locations_edgecase_1['targets'])
+distances_edgecase_1_2 = np.array([1111.9492664455872, 1111.9492664455872, 1123.0687591100434])
+
+
+class TestStreaming(unittest.TestCase):
+
+    def setUp(self):
+        self.targets_random = random_targets(5, 10000)
+
+    def test_iter_target_chunks(self):
+        chunks = list(iter_target_chunks(self.targets_random, 3000))
+        self.assertEqual([len(chunk) for chunk in chunks], [3000, 3000, 3000, 1000])
+        np.testing.assert_array_equal(np.concatenate(chunks), self.targets_random)
+
+    def test_iter_target_chunks_validate(self):
+        targets = self.targets_random.copy()
+        targets[4500] = (0, 200)
+        list(iter_target_chunks(targets, 3000))
+        with self.assertRaisesRegex(ValueError, r'rows \[4500\]$'):
+            list(iter_target_chunks(targets, 3000, validate=True))
+        self.assertRaises(ValueError, get_points_within_distance_streaming, source_paris, targets, 100)
+
+    def test_get_points_within_distance_streaming(self):
+        for source, length in [(source_paris, 1500), ((89, 170), 2000), ((0, 179.9), 800)]:
+            expected = get_points_within_distance(source, self.targets_random, length)
+            points = get_points_within_distance_streaming(source, self.targets_random, length, chunk_size=999)
+            np.testing.assert_array_equal(points, expected)
+
+    def test_get_closest_points_streaming(self):
+        for source in [source_paris, (89, 170), (-90, 0), (0, -180)]:
+            expected = get_closest_points(source, self.targets_random, 15, 100)
+            points = get_closest_points_streaming(source, self.targets_random, 15, chunk_size=777)
+            np.testing.assert_array_equal(points, expected)
+
+    def test_get_closest_points_streaming_edge_case_1(self):
+        chunks = [targets_edgecase_1[:1], targets_edgecase_1[1:3], targets_edgecase_1[3:]]
+        distances = get_closest_points_streaming(source_edgecase_1, iter(chunks), 3)[:, 1]
+        self.assertEqual(np.array_equal(distances, distances_edgecase_1_2), True)
+
+    def test_get_closest_points_streaming_pole_in_first_chunk(self):
+        # the bounding box of the first chunk just reaches the north pole
+        for targets in [[(90, 0), (60.1, 10)], [(-90, 0), (90, 0), (60.1, 10), (59.9, 10.2)]]:
+            expected = get_closest_points((60, 10), targets, 1)
+            for chunk_size in [1, 2]:
+                points = get_closest_points_streaming((60, 10), targets, 1, chunk_size=chunk_size)
+                np.testing.assert_array_equal(points, expected)
+
+    def test_get_closest_points_streaming_more_than_targets(self):
+        self.assertEqual(len(get_closest_points_streaming(source_paris, targets_paris, 10)), len(targets_paris))
+
+    def test_npy_file(self):
+        with tempfile.TemporaryDirectory() as path:
+            filename = os.path.join(path, 'targets.npy')
+            np.save(filename, self.targets_random)
+            points = get_points_within_distance_streaming(source_paris, filename, 1500, chunk_size=1000)
+            np.testing.assert_array_equal(points, get_points_within_distance(source_paris, self.targets_random, 1500))
+            points = get_closest_points_streaming(source_paris, filename, 5, chunk_size=1000)
+            np.testing.assert_array_equal(points, get_closest_points(source_paris, self.targets_random, 5))
+
+
+if __name__ == '__main__':
+    unittest.main()
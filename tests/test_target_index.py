@@ -0,0 +1,79 @@
+import tempfile
+import unittest
+import numpy as np
+
+from boundingbox.boundingbox import BoundingBox
+from boundingbox.distances import get_points_within_distance, get_closest_points
+from boundingbox.target_index import TargetIndex
+from boundingbox.settings import FRONT
+
+from tests.resources.locations import locations_paris, locations_edgecase_1, random_targets
+
+
+source_paris = locations_paris['source']
+targets_paris = np.array(locations_paris['targets'])
+
+source_edgecase_1 = locations_edgecase_1['source']
+targets_edgecase_1 = np.array(locations_edgecase_1['targets'])
+
+# crosses the 180th meridian
+suva = (18.1248, 178.4501)
+targets_fiji = np.array([(13.2959, -176.2057), (18.2356, -178.8107), (16.4308, 179.3630), (18.2, 10.)])
+
+
+def sorted_rows(targets):
+    targets = np.asarray(targets).reshape(-1, 2)
+    return targets[np.lexsort((targets[:, 1], targets[:, 0]))]
+
+
+class TestTargetIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.targets_random = random_targets(0, 5000)
+        self.index_random = TargetIndex(self.targets_random)
+
+    def test_sorted_by_latitude(self):
+        self.assertTrue(np.all(np.diff(self.index_random.latitudes) >= 0))
+        np.testing.assert_array_equal(self.index_random.targets, self.targets_random[self.index_random.order])
+
+    def test_latitude_band(self):
+        band = self.index_random.latitude_band(10, 20)
+        lats = self.index_random.latitudes
+        self.assertTrue(np.all((lats[band] >= 10) & (lats[band] <= 20)))
+        self.assertEqual(band.stop - band.start, np.sum((lats >= 10) & (lats <= 20)))
+
+    def test_filter_targets_in_bbox_matches_array(self):
+        for source, length in [(source_paris, 1000), (suva, 2000), ((85, 30), 1000)]:
+            boundingbox = BoundingBox(source, length)
+            for bbox in boundingbox.bbox.values():
+                np.testing.assert_array_equal(
+                    sorted_rows(self.index_random.filter_targets_in_bbox(bbox)),
+                    sorted_rows(boundingbox.filter_targets_in_bbox(self.targets_random, bbox)))
+
+    def test_filter_across_antimeridian(self):
+        boundingbox = BoundingBox(suva, 1000)
+        filtered = TargetIndex(targets_fiji).filter_targets_in_bbox(boundingbox.bbox[FRONT])
+        np.testing.assert_array_equal(sorted_rows(filtered), sorted_rows(targets_fiji[:3]))
+
+    def test_get_points_within_distance(self):
+        points = get_points_within_distance(source_paris, TargetIndex(targets_paris), 200)
+        np.testing.assert_array_equal(points, get_points_within_distance(source_paris, targets_paris, 200))
+
+    def test_get_closest_points(self):
+        points = get_closest_points(source_edgecase_1, TargetIndex(targets_edgecase_1), 3, 1100)
+        np.testing.assert_array_equal(points[:, 1], get_closest_points(source_edgecase_1, targets_edgecase_1, 3, 1100)[:, 1])
+
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as path:
+            self.index_random.save(path)
+            index = TargetIndex.load(path)
+            self.assertIsInstance(index.latitudes, np.memmap)
+            np.testing.assert_array_equal(index.targets, self.index_random.targets)
+            np.testing.assert_array_equal(index.order, self.index_random.order)
+            points = get_points_within_distance(source_paris, index, 500)
+            np.testing.assert_array_equal(points, get_points_within_distance(source_paris, self.targets_random, 500))
+            del index, points
+
+
+if __name__ == '__main__':
+    unittest.main()
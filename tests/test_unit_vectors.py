@@ -0,0 +1,83 @@
+import tempfile
+import unittest
+import numpy as np
+
+from boundingbox.distances import get_points_within_distance, get_closest_points
+from boundingbox.settings import INDICES, MILES
+from boundingbox.target_index import TargetIndex
+from boundingbox.unit_vectors import UnitVectorIndex
+
+from tests.resources.locations import locations_paris, EDGE_SOURCES, random_targets
+
+
+source_paris = locations_paris['source']
+targets_paris = np.array(locations_paris['targets'])
+
+
+class TestUnitVectorIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.targets_random = random_targets(13, 20000)
+        # duplicates and targets exactly on the radius
+        self.targets_random[:3] = [(0, 0), (0, 0), (0, 1)]
+        self.sources = EDGE_SOURCES + [(0, 0)]
+
+    def test_matches_arrays(self):
+        for dtype in [np.float64, np.float32]:
+            index = UnitVectorIndex(self.targets_random, dtype)
+            self.assertEqual(index.vectors.dtype, dtype)
+            for source in self.sources:
+                for length in [0.5, 10, 111.2, 1000, 20015.2]:
+                    expected_indices, expected_distances = get_points_within_distance(
+                        source, self.targets_random, length, return_format=INDICES)
+                    indices, distances = get_points_within_distance(source, index, length, return_format=INDICES)
+                    np.testing.assert_array_equal(indices, expected_indices)
+                    np.testing.assert_array_equal(distances, expected_distances)
+
+    def test_target_on_radius(self):
+        # (0, 1) is exactly 111.19492664455873 km from (0, 0)
+        for dtype in [np.float64, np.float32]:
+            index = UnitVectorIndex(self.targets_random, dtype)
+            indices, distances = get_points_within_distance((0, 0), index, 111.19492664455873, return_format=INDICES)
+            self.assertEqual(indices[:3].tolist(), [0, 1, 10388])
+            self.assertIn(2, indices.tolist())
+
+    def test_paris(self):
+        index = UnitVectorIndex(targets_paris, np.float32)
+        expected = get_points_within_distance(source_paris, targets_paris, 200, units=MILES)
+        np.testing.assert_array_equal(get_points_within_distance(source_paris, index, 200, units=MILES), expected)
+        # the other queries use it as a TargetIndex
+        self.assertEqual(len(get_closest_points(source_paris, index, 2)), 2)
+
+    def test_save_load(self):
+        for dtype in [np.float64, np.float32]:
+            index = UnitVectorIndex(self.targets_random, dtype)
+            with tempfile.TemporaryDirectory() as path:
+                index.save(path)
+                loaded = UnitVectorIndex.load(path)
+                self.assertEqual(loaded.dtype, dtype)
+                self.assertEqual(loaded.vectors.dtype, dtype)
+                np.testing.assert_array_equal(loaded.vectors, index.vectors)
+                np.testing.assert_array_equal(get_points_within_distance(source_paris, loaded, 1000),
+                                              get_points_within_distance(source_paris, index, 1000))
+                self.assertEqual(UnitVectorIndex.load(path, dtype=np.float32).vectors.dtype, np.float32)
+                del loaded
+
+    def test_load_target_index(self):
+        with tempfile.TemporaryDirectory() as path:
+            TargetIndex(self.targets_random).save(path)
+            loaded = UnitVectorIndex.load(path, dtype=np.float32)
+            self.assertEqual(loaded.vectors.dtype, np.float32)
+            np.testing.assert_array_equal(loaded.vectors, UnitVectorIndex(self.targets_random, np.float32).vectors)
+            del loaded
+
+    def test_errors(self):
+        self.assertRaises(ValueError, UnitVectorIndex, self.targets_random, np.int32)
+        self.assertRaises(ValueError, UnitVectorIndex, [(95, 0)])
+        index = UnitVectorIndex(self.targets_random)
+        self.assertRaises(ValueError, get_points_within_distance, (95, 0), index, 10)
+        self.assertRaises(ValueError, get_points_within_distance, source_paris, index, 10, units='m')
+
+
+if __name__ == '__main__':
+    unittest.main()